@@ -30,17 +30,30 @@ Functional Coverage features.
 
 Classes:
 
+* :class:`CoverageDB` - coverage database (singleton), available as 
+  :data:`coverage_db`.
 * :class:`CoverItem` - base class for coverage, corresponds to a covergroup, 
   created automatically.
 * :class:`CoverPoint` - a cover point with bins.
 * :class:`CoverCross` - a cover cross of cover points.
 * :class:`CoverCheck` - a cover point which checks only a pass/fail condition.
+* :class:`SharedTransform` - a transformation function shared by multiple 
+  coverage items.
+* :class:`ChangeTracker` - tracks bins hit since the last check, created by
+  :meth:`CoverageDB.track_changes`.
+
+Both :class:`CoverPoint` and :class:`CoverCross` may also be sampled with 
+batches of values using ``sample_many()`` (vectorized with NumPy if available).
 
 Functions:
 
 * :func:`~.reportCoverage` - prints coverage.
+* :func:`~.reportProfile` - prints sampling statistics (if profiling enabled).
+* :func:`~.split_range` - splits a range of values into equal range bins.
 * :func:`~.coverageSection` - allows for convenient definition of multiple
   coverage items and combines them into a single decorator.
+* :func:`~.flush_at_timestep` - flushes deferred sampling at each simulator 
+  timestep.
 """
 
 from functools import wraps
@@ -48,10 +61,400 @@ from collections import OrderedDict
 import inspect
 import operator
 import itertools
+import array
+import bisect
+import random
+import time
+from collections import Counter
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+class CoverageDB(dict):
+    """Class (singleton) containing coverage database.
+
+    This is a map of all coverage objects with name string as a key (using 
+    dot as a stage separator). It also holds global coverage settings.
+
+    Items are also indexed in a prefix tree (each cover group links its 
+    members, sorted by names), so :meth:`walk`, :meth:`find` and 
+    :meth:`subtree_coverage` visit only the requested subtree. Deleting a 
+    cover group (also by ``pop()`` or ``popitem()``) deletes its members too.
+
+    Attributes:
+        lazy_aggregation (bool): if ``True``, coverage of the cover groups is 
+            not updated at each sampling. Sampled coverage primitives only 
+            mark their parents as out of date and coverage of the cover group 
+            is recomputed from its children when read. Cover groups with 
+            threshold callbacks not reached yet are still updated at each 
+            sampling, so that callbacks fire promptly (default ``False``).
+        saturation (str): defines sampling of the saturated coverage 
+            primitives, i.e. fully covered :class:`CoverPoints <CoverPoint>` 
+            and :class:`CoverCrosses <CoverCross>` or failed 
+            :class:`CoverChecks <CoverCheck>`. A cover point is saturated 
+            only if all crosses of this cover point are saturated too. If 
+            ``"stop"``, saturated primitives are not sampled anymore. If 
+            ``"sample"``, only one of ``saturation_rate`` samples is taken, 
+            counted as ``saturation_rate`` hits, so number of hits is 
+            approximated. If ``None``, all samples are taken (default).
+        saturation_rate (int): sampling rate of the saturated coverage 
+            primitives if ``saturation`` is ``"sample"`` (default ``100``).
+        deferred (bool): if ``True``, calls of the decorated functions only 
+            record their arguments in a preallocated buffer and sampling is 
+            done later, in the order of calls, by :meth:`flush`. The buffer is
+            flushed automatically when full, when the deferred mode is 
+            switched off and by :func:`~.reportCoverage`. Arguments are 
+            stored by reference, so they must not be modified before the 
+            flush (default ``False``). See also :func:`~.flush_at_timestep`.
+        deferred_size (int): size of the buffer of the deferred sampling 
+            (default ``1024``).
+        profiling (bool): if ``True``, coverage primitives existing at the 
+            moment of switching it on are instrumented to collect sampling 
+            statistics: number of samples, time spent in sampling, in 
+            transformation, relation and check functions, in callbacks and 
+            number of bins compared per sample. Statistics are printed by 
+            :func:`~.reportProfile`. Switching it off removes the 
+            instrumentation, so there is no overhead (default ``False``).
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if CoverageDB._instance is None:
+            CoverageDB._instance = super(CoverageDB, cls).__new__(cls)
+            CoverageDB._instance._lazy_aggregation = False
+            CoverageDB._instance._saturation = None
+            CoverageDB._instance.saturation_rate = 100
+            CoverageDB._instance._deferred = False
+            # sampling events are recorded in one buffer while the other one
+            # is flushed
+            CoverageDB._instance._buffer = [None] * 1024
+            CoverageDB._instance._spare_buffer = [None] * 1024
+            CoverageDB._instance._pending = 0
+            CoverageDB._instance._profiling = False
+            CoverageDB._instance._trackers = []
+            CoverageDB._instance._changed_items = []
+            CoverageDB._instance._added_items = []
+            # top level items, the prefix tree is continued by children of 
+            # the items, siblings are kept sorted (case-insensitive)
+            CoverageDB._instance._roots = []
+        return CoverageDB._instance
+
+    def __setitem__(self, name, item):
+        if name in self:
+            self._unlink(name)
+        dict.__setitem__(self, name, item)
+        if self._trackers:
+            self._added_items.append(item)
+        siblings = self._siblings(item)
+        key = name.lower()
+        lo, hi = 0, len(siblings)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if siblings[mid]._name.lower() <= key:
+                lo = mid + 1
+            else:
+                hi = mid
+        siblings.insert(lo, item)
+
+    def __delitem__(self, name):
+        # members of a cover group are deleted with the group
+        for member_name, _ in list(self.walk(name))[:0:-1]:
+            self._unlink(member_name)
+        self._unlink(name)
+
+    def _unlink(self, name):
+        """Remove a single item from the map and from the prefix tree."""
+        item = self[name]
+        dict.__delitem__(self, name)
+        self._siblings(item).remove(item)
+
+    # other dict methods modifying the map keep the prefix tree up to date
+
+    def clear(self):
+        for item in self.values():
+            item._children = []
+        dict.clear(self)
+        self._roots = []
+
+    def pop(self, name, *default):
+        if name not in self:
+            if default:
+                return default[0]
+            raise KeyError(name)
+        item = self[name]
+        del self[name]
+        return item
+
+    def popitem(self):
+        if not self:
+            raise KeyError("popitem(): coverage database is empty")
+        name = next(reversed(self.keys()))
+        return name, self.pop(name)
+
+    def setdefault(self, name, item=None):
+        if name not in self:
+            self[name] = item
+        return self[name]
+
+    def update(self, *args, **kwargs):
+        for name, item in dict(*args, **kwargs).items():
+            self[name] = item
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    @classmethod
+    def fromkeys(cls, iterable, value=None):
+        raise TypeError("coverage database is a singleton, items are added "
+                        "by creating coverage objects")
+
+    def _siblings(self, item):
+        if item._parent is not None:
+            return item._parent._children
+        return self._roots
+
+    def find(self, prefix):
+        """Return the top-most coverage items with names starting with a 
+        prefix, e.g. ``"top.d"`` gives ``top.dma`` and ``top.dsp`` (but not 
+        their children). Only siblings of the matching items are checked.
+
+        Args:
+            prefix (str): a name prefix (``None`` or ``""`` for the top level
+                items).
+
+        Returns:
+            list: coverage items sorted by names (case-insensitive).
+        """
+        if not prefix:
+            return list(self._roots)
+        if prefix in self:
+            return [self[prefix]]
+        if "." in prefix:
+            parent_name, partial = prefix.rsplit(".", 1)
+            parent = self.get(parent_name)
+            if parent is None:
+                return []
+            siblings = parent._children
+        else:
+            partial, siblings = prefix, self._roots
+        return [item for item in siblings 
+                if item._name.rsplit(".", 1)[-1].startswith(partial)]
+
+    def walk(self, prefix=None):
+        """Iterate over the coverage items (cover groups before their 
+        members), without sorting or visiting items out of the subtree.
+
+        Args:
+            prefix (str, optional): iterate only over subtrees of the items
+                found by :meth:`find`.
+
+        Yields:
+            tuple: ``(name, item)`` pairs, siblings sorted by names 
+            (case-insensitive).
+        """
+        stack = self.find(prefix)[::-1]
+        while stack:
+            item = stack.pop()
+            yield item._name, item
+            stack.extend(reversed(item._children))
+
+    def subtree_coverage(self, prefix):
+        """Return the total coverage of the items found by :meth:`find` (the
+        coverage of cover groups is already aggregated from their members).
+
+        Args:
+            prefix (str): a name prefix.
+
+        Returns:
+            tuple: ``(coverage, size)`` of the found items.
+        """
+        items = self.find(prefix)
+        return (sum(item.coverage for item in items), 
+                sum(item.size for item in items))
+
+    @property
+    def lazy_aggregation(self):
+        return self._lazy_aggregation
+
+    @lazy_aggregation.setter
+    def lazy_aggregation(self, value):
+        # bring all cover groups up to date before switching back to updates 
+        # at each sampling
+        if not value:
+            for item in self.values():
+                item.coverage
+        self._lazy_aggregation = value
+
+    @property
+    def saturation(self):
+        return self._saturation
+
+    @saturation.setter
+    def saturation(self, value):
+        if value not in (None, "stop", "sample"):
+            raise Exception("Saturation must be None, 'stop' or 'sample'")
+        self._saturation = value
+        for item in self.values():
+            item._hits_per_sample = 1
+            if value is None:
+                item._saturated = False
+            else:
+                item._check_saturated()
+
+    @property
+    def deferred(self):
+        return self._deferred
+
+    @deferred.setter
+    def deferred(self, value):
+        if not value:
+            self.flush()
+        self._deferred = value
+
+    @property
+    def deferred_size(self):
+        return len(self._buffer)
+
+    @deferred_size.setter
+    def deferred_size(self, value):
+        if value < 1:
+            raise Exception("Deferred buffer size must be positive")
+        self.flush()
+        self._buffer = [None] * value
+        self._spare_buffer = [None] * value
+
+    @property
+    def profiling(self):
+        return self._profiling
+
+    @profiling.setter
+    def profiling(self, value):
+        for item in self.values():
+            if value:
+                item._instrument()
+            else:
+                item._uninstrument()
+        self._profiling = value
+
+    def track_changes(self):
+        """Start tracking bins hit in the coverage primitives.
+
+        Tracking adds a little overhead to sampling, so it is switched off 
+        when all the trackers are closed.
+
+        Returns:
+            :class:`ChangeTracker`: a new tracker.
+        """
+        if not self._trackers:
+            for item in self.values():
+                item._changed_bins = set()
+        tracker = ChangeTracker(self)
+        self._trackers.append(tracker)
+        return tracker
+
+    def _collect_changes(self):
+        """Pass bins changed and items added since the last collection to all
+        the trackers.
+        """
+        for tracker in self._trackers:
+            tracker._added.extend(self._added_items)
+        self._added_items = []
+        for item in self._changed_items:
+            positions = item._changed_bins
+            item._changed_bins = set()
+            for tracker in self._trackers:
+                tracker._pending.setdefault(item, set()).update(positions)
+        self._changed_items = []
+
+    def _defer(self, samplers, cb_args):
+        """Record a sampling event, flush the buffer if full."""
+        self._buffer[self._pending] = (samplers, cb_args)
+        self._pending += 1
+        if self._pending == len(self._buffer):
+            self.flush()
+
+    def flush(self):
+        """Sample all the recorded (deferred) sampling events.
+
+        Should be called before reading coverage if the deferred mode is used.
+        """
+        global _sampling_event
+        # events recorded while flushing (e.g. sampled by callbacks) go to the
+        # spare buffer, flushed next; a flush called while flushing (when the 
+        # spare buffer is in use) needs a new one
+        while self._pending:
+            buffer, pending = self._buffer, self._pending
+            spare = self._spare_buffer
+            if spare is None:
+                spare = [None] * len(buffer)
+            self._buffer, self._spare_buffer, self._pending = spare, None, 0
+            for ii in range(pending):
+                samplers, cb_args = buffer[ii]
+                buffer[ii] = None
+                _sampling_event += 1
+                for sampler in samplers:
+                    sampler(cb_args)
+            self._spare_buffer = buffer
+
+
+class ChangeTracker(object):
+    """Class tracking bins of the coverage primitives hit since the last call 
+    of :meth:`changes` (and coverage items added since the last call of 
+    :meth:`added_items`), created by :meth:`CoverageDB.track_changes`. Multiple
+    trackers may be used at the same time (e.g. by a checkpoint log and a 
+    coverage streamer), each one returns its own changes.
+
+    Bins are identified by positions: bins positions of a 
+    :class:`CoverPoint`, cross-bins indices of a :class:`CoverCross` and 
+    ``0`` (*PASS*) or ``1`` (*FAIL*) of a :class:`CoverCheck`, as stored in 
+    coverage files (see :mod:`~cocotb_coverage.coverage_file`).
+    """
+
+    def __init__(self, db):
+        self._db = db
+        self._pending = {}  # item: set of changed bins positions
+        self._added = []  # items added to the database
+
+    def changes(self):
+        """Return bins hit since the last call.
+
+        Returns:
+            dict: maps of the changed bins positions to their current hit 
+            counts, by the coverage primitives names.
+        """
+        self._db._collect_changes()
+        pending, self._pending = self._pending, {}
+        return {item._name: {pos: item._hits_at(pos) for pos in 
+                             sorted(positions)} 
+                for item, positions in pending.items()}
+
+    def added_items(self):
+        """Return coverage items added to the database since the last call 
+        (and still in the database).
+
+        Returns:
+            list: coverage items, in the order of adding.
+        """
+        self._db._collect_changes()
+        added, self._added = self._added, []
+        return [item for item in added if self._db.get(item._name) is item]
+
+    def close(self):
+        """Stop tracking."""
+        if self in self._db._trackers:
+            self._db._collect_changes()
+            self._db._trackers.remove(self)
+            if not self._db._trackers:
+                for item in self._db.values():
+                    item._changed_bins = None
+
 
 # global variable collecting coverage in a prefix tree (trie)
-#TODO make it a singletone class
-coverage_db = {}  
+coverage_db = CoverageDB()
 """
 : a coverage prefix tree (map) containing all coverage objects with name string
 as a key (using dot as a stage separator).
@@ -77,6 +480,22 @@ class CoverItem(object):
 
         self._threshold_callbacks = {}
         self._bins_callbacks = {}
+        # coverage level is out of date (see CoverageDB.lazy_aggregation)
+        self._dirty = False
+        # number of sampling events
+        self._samples = 0
+        # primitive is saturated (see CoverageDB.saturation)
+        self._saturated = False
+        # number of hits counted per sample
+        self._hits_per_sample = 1
+        # sorted thresholds, the ones from _next_threshold are not reached yet
+        self._thresholds = []
+        self._next_threshold = 0
+        # sampling statistics (see CoverageDB.profiling)
+        self._profile = None
+        self._unprofiled = None
+        # bins hit since the last collection (see CoverageDB.track_changes)
+        self._changed_bins = set() if coverage_db._trackers else None
 
         # check if parent exists
         if "." in name:
@@ -85,23 +504,205 @@ class CoverItem(object):
                 CoverItem(name=parent_name)
 
             self._parent = coverage_db[parent_name]
-            self._parent._children.append(self)
 
+        # also links the item to its parent
         coverage_db[name] = self
 
+    def __call__(self, f):
+        return _sampling_wrapper(f, [self._sampler(f)])
+
+    def _sampler(self, f):
+        """Return a function sampling arguments of the decorated function f, 
+        built by _bound_sampler of the derived classes. 
+
+        If it cannot be told when decorating whether f is a method, binding is
+        resolved at the first call.
+        """
+        decorates_method = _is_method(f)
+        if decorates_method is not None:
+            return self._bound_sampler(f, decorates_method)
+
+        bound_sampler = []
+        def sampler(cb_args):
+            if not bound_sampler:
+                bound_sampler.append(
+                    self._bound_sampler(f, _is_bound(f, cb_args)))
+            bound_sampler[0](cb_args)
+        return sampler
+
     def _update_coverage(self, coverage):
         """Update the parent coverage level as requested by derived classes. 
         """
-        current_coverage = self._coverage
+        if coverage == 0:
+            return
         self._coverage += coverage
         if self._parent is not None:
             self._parent._update_coverage(coverage)
 
         # notify callbacks
-        for ii in self._threshold_callbacks:
-            if (ii > 100 * current_coverage / self.size and
-                ii <= self.cover_percentage):
-                self._threshold_callbacks[ii]()
+        self._check_thresholds()
+
+    def _notify_coverage(self, current_coverage):
+        """Notify parent and threshold callbacks about a new coverage level of
+        the coverage primitive (changed from current_coverage).
+        """
+        if self.coverage == current_coverage:
+            return
+
+        # notify parent about new coverage level
+        if coverage_db._lazy_aggregation:
+            self._parent._invalidate()
+        else:
+            self._parent._update_coverage(self.coverage - current_coverage)
+
+        # check threshold callbacks
+        self._check_thresholds()
+
+        if coverage_db._saturation is not None:
+            self._check_saturated()
+
+    def _guarded(self, sampler, decorates_method):
+        """Return the sampler called only if the guard function (iff) of the
+        coverage primitive is true for the arguments of the decorated function.
+        """
+        guard = getattr(self, "_guard", None)
+        if guard is None:
+            return sampler
+
+        # if function is bound then remove "self" from the arguments list
+        first = 1 if decorates_method ^ _has_self(guard) else 0
+
+        def guarded_sampler(cb_args):
+            if guard(*cb_args[first:]):
+                sampler(cb_args)
+            else:
+                self._new_pos = []  # nothing hit in this sampling event
+        return guarded_sampler
+
+    # functions timed when profiling: {attribute: statistics field}
+    _profiled_functions = {}
+
+    def _instrument(self):
+        """Replace sampling functions and callbacks with timed wrappers, 
+        collecting statistics in self._profile.
+        """
+        if self._unprofiled is not None or type(self) is CoverItem:
+            return
+        stats = self._profile = _ProfileStats()
+        # replaced instance attributes, methods are not in __dict__
+        self._unprofiled = {
+            attr : self.__dict__.get(attr, _unprofiled_method) for attr in 
+            ["_sample", "_match"] + list(self._profiled_functions)
+        }
+        for attr, field in self._profiled_functions.items():
+            if getattr(self, attr, None) is not None:
+                setattr(self, attr, _timed(getattr(self, attr), stats, field))
+        self._bins_callbacks = {bins : _timed(cb, stats, "callback") for 
+                                bins, cb in self._bins_callbacks.items()}
+        self._threshold_callbacks = {th : _timed(cb, stats, "callback") for 
+                                     th, cb in 
+                                     self._threshold_callbacks.items()}
+
+        sample = self._sample
+        def timed_sample(*args):
+            start = time.perf_counter()
+            sample(*args)
+            stats.sample_time += time.perf_counter() - start
+            stats.samples += 1
+        self._sample = timed_sample
+
+        match = getattr(self, "_match", None)
+        if match is not None:
+            def counted_match(result):
+                # a match without comparisons is a single index lookup
+                calls = stats.rel_calls
+                matched = match(result)
+                if stats.rel_calls == calls:
+                    stats.lookups += 1
+                return matched
+            self._match = counted_match
+
+    def _uninstrument(self):
+        """Restore functions replaced by _instrument.
+        """
+        if self._unprofiled is None:
+            return
+        for attr, value in self._unprofiled.items():
+            if value is _unprofiled_method:
+                self.__dict__.pop(attr, None)
+            else:
+                self.__dict__[attr] = value
+        # callbacks added during profiling are kept
+        self._bins_callbacks = {bins : _untimed(cb) for 
+                                bins, cb in self._bins_callbacks.items()}
+        self._threshold_callbacks = {th : _untimed(cb) for th, cb in 
+                                     self._threshold_callbacks.items()}
+        self._unprofiled = None
+
+    def _mark_changed(self, pos):
+        """Record a bin at position pos as changed for the trackers.
+        """
+        if not self._changed_bins:
+            coverage_db._changed_items.append(self)
+        self._changed_bins.add(pos)
+
+    def _hits_at(self, pos):
+        """Return number of hits of the bin at position pos.
+        """
+        return self._hits[pos]
+
+    def _check_saturated(self):
+        """Update the saturation flag (only coverage primitives saturate).
+        """
+        self._saturated = False
+
+    def _skip_saturated(self):
+        """Check if a sample of the saturated coverage primitive is skipped, 
+        according to CoverageDB.saturation.
+        """
+        if coverage_db._saturation is None:
+            return False
+        if coverage_db._saturation == "sample":
+            rate = coverage_db.saturation_rate
+            if self._samples % rate == 0:
+                self._hits_per_sample = rate
+                return False
+        self._new_pos = []
+        return True
+
+    def _invalidate(self):
+        """Mark the cover group coverage level (and its parents) as out of 
+        date. Cover groups waiting for threshold callbacks are updated.
+        """
+        waiting = []
+        item = self
+        # parents of the cover group already out of date are out of date too
+        while item is not None and not item._dirty:
+            item._dirty = True
+            if item._next_threshold < len(item._thresholds):
+                waiting.append(item)
+            item = item._parent
+
+        for item in reversed(waiting):
+            item._check_thresholds()
+
+    def _check_thresholds(self):
+        """Call callbacks of the thresholds crossed by the coverage level. 
+        
+        Thresholds not reached yet are sorted, so only the next one is 
+        compared with the coverage level. Thresholds the coverage level 
+        dropped below (e.g. when the size grows) are not reached again.
+        """
+        while (self._next_threshold > 0 and 
+               100 * self.coverage < 
+               self._thresholds[self._next_threshold - 1] * self.size):
+            self._next_threshold -= 1
+        while (self._next_threshold < len(self._thresholds) and 
+               100 * self.coverage >= 
+               self._thresholds[self._next_threshold] * self.size):
+            threshold = self._thresholds[self._next_threshold]
+            self._next_threshold += 1
+            self._threshold_callbacks[threshold]()
 
     def _update_size(self, size):
         """Update the parent size as requested by derived classes. 
@@ -110,13 +711,19 @@ class CoverItem(object):
         if self._parent is not None:
             self._parent._update_size(size)
 
+        # coverage level decreased
+        if self._next_threshold > 0:
+            self._check_thresholds()
+
     def add_threshold_callback(self, callback, threshold):
         """Add a threshold callback to the :class:`CoverItem` or any its 
         derived class. 
 
-        A callback is called (once) when the threshold is crossed, so that 
+        A callback is called when the threshold is crossed, so that 
         coverage level of this particular cover group (or other object) exceeds 
-        defined % value. 
+        defined % value. It is called again if the coverage level drops below
+        the threshold (e.g. when new items are added to the cover group) and 
+        then crosses it again. 
 
         Args:
             callback (func): a callback function.
@@ -136,6 +743,11 @@ class CoverItem(object):
         >>>   notify_threshold, 50
         >>> )
         """
+        if threshold not in self._threshold_callbacks:
+            bisect.insort(self._thresholds, threshold)
+            # threshold already exceeded is crossed only after a drop
+            if self.size > 0 and 100 * self.coverage >= threshold * self.size:
+                self._next_threshold += 1
         self._threshold_callbacks[threshold] = callback
 
     def add_bins_callback(self, callback, bins):
@@ -181,6 +793,9 @@ class CoverItem(object):
         Returns:
             int: size of the covered bins.
         """
+        if self._dirty:
+            self._coverage = sum(child.coverage for child in self._children)
+            self._dirty = False
         return self._coverage
 
     @property
@@ -223,6 +838,421 @@ class CoverItem(object):
         return self._new_hits
 
 
+class _ProfileStats(object):
+    """Sampling statistics of a coverage primitive (see 
+    CoverageDB.profiling).
+    """
+
+    def __init__(self):
+        self.samples = 0
+        self.sample_time = 0.0
+        self.xf_time = 0.0
+        self.rel_time = 0.0
+        self.rel_calls = 0
+        self.lookups = 0
+        self.callback_time = 0.0
+
+    @property
+    def total_time(self):
+        return self.sample_time + self.xf_time
+
+    @property
+    def bins_per_sample(self):
+        if self.samples == 0:
+            return 0.0
+        return float(self.rel_calls + self.lookups) / self.samples
+
+
+# marks a method (not an instance attribute) replaced when profiling
+_unprofiled_method = object()
+
+
+def _timed(f, stats, field):
+    """Return a wrapper of f, adding its execution time to stats.<field>_time.
+    Relation calls are counted as well.
+    """
+    attr = field + "_time"
+    @wraps(f)
+    def timed_function(*args):
+        start = time.perf_counter()
+        result = f(*args)
+        setattr(stats, attr, getattr(stats, attr) + 
+                time.perf_counter() - start)
+        if field == "rel":
+            stats.rel_calls += 1
+        return result
+    # the wrapper is identified by itself, as attributes are copied by other
+    # decorators (functools.wraps)
+    timed_function._timed_wrapper = timed_function
+    timed_function._timed_function = f
+    return timed_function
+
+
+def _untimed(f):
+    """Return the function wrapped by _timed, or f if it is not a wrapper."""
+    if getattr(f, "_timed_wrapper", None) is f:
+        return f._timed_function
+    return f
+
+
+# counter of sampling events (calls of decorated functions)
+_sampling_event = 0
+
+
+def _sampling_wrapper(f, samplers):
+    """Return a wrapper of the decorated function f, which calls the samplers 
+    with the function arguments and then calls f.
+    """
+    # stacked decorators are merged, so that a call is a single sampling 
+    # event (the outer decorator samples first); attributes are copied by 
+    # other decorators (functools.wraps), so the wrapper is identified by 
+    # itself
+    if getattr(f, "_coverage_wrapper", None) is f:
+        samplers = samplers + f._coverage_samplers
+        f = f._coverage_function
+
+    @wraps(f)
+    def _wrapped_function(*cb_args, **cb_kwargs):
+        global _sampling_event
+        if coverage_db._deferred:
+            coverage_db._defer(samplers, cb_args)
+        else:
+            _sampling_event += 1
+            for sampler in samplers:
+                sampler(cb_args)
+        return f(*cb_args, **cb_kwargs)
+    _wrapped_function._coverage_wrapper = _wrapped_function
+    _wrapped_function._coverage_samplers = samplers
+    _wrapped_function._coverage_function = f
+    return _wrapped_function
+
+
+def _is_method(f):
+    """Check if function f is called as a bound method: defined in a class 
+    body and taking the instance (or class) as the first argument. 
+
+    Returns ``None`` if it cannot be told when decorating: a function 
+    defined in a class body with the first argument named other than 
+    ``self`` or ``cls`` may be a method or a static method (see 
+    :func:`_is_bound`).
+    """
+    scopes = getattr(f, "__qualname__", "").split(".")
+    if len(scopes) < 2 or scopes[-2] == "<locals>":
+        return False
+    try:
+        params = list(inspect.signature(f).parameters.values())
+    except (TypeError, ValueError):
+        return False
+    if not params or params[0].kind not in (
+            params[0].POSITIONAL_ONLY, params[0].POSITIONAL_OR_KEYWORD, 
+            params[0].VAR_POSITIONAL):
+        return False
+    if params[0].name in ("self", "cls"):
+        return True
+    return None
+
+
+def _is_bound(f, cb_args):
+    """Check if function f, defined in a class body, was called as a bound 
+    method with the arguments cb_args: the first argument is an instance 
+    (or a subclass) of a class with f as a method, not a static method.
+    """
+    if not cb_args:
+        return False
+    # stacked coverage decorators are merged, so f may be a coverage wrapper
+    # replaced by a single wrapper of the decorated function
+    if getattr(f, "_coverage_wrapper", None) is f:
+        f = f._coverage_function
+    obj = cb_args[0]
+    for cls in inspect.getmro(obj if isinstance(obj, type) else type(obj)):
+        attr = cls.__dict__.get(f.__name__)
+        if attr is None:
+            continue
+        # f is wrapped by the coverage wrapper and maybe other decorators
+        function = getattr(attr, "__func__", attr)
+        if inspect.unwrap(function, stop=lambda w: w is f) is not f:
+            return False
+        return not isinstance(attr, staticmethod)
+    return False
+
+
+def _has_self(fun):
+    """Check if function takes "self" argument.
+    """
+    return fun is not None and "self" in inspect.signature(fun).parameters
+
+
+def _count_values(values, merge):
+    """Return pairs of distinct values and their number of occurrences (or 
+    each value with count 1 if values are not hashable or not merged). 
+
+    Equal values are merged (e.g. ``1``, ``1.0`` and ``True``), so merging 
+    is allowed only if bins are matched by equality.
+    """
+    if merge:
+        try:
+            return Counter(values).items()
+        except TypeError:
+            pass
+    return [(value, 1) for value in values]
+
+
+def _exact_array(values):
+    """Return values as a NumPy array, or None if the conversion may change 
+    them (e.g. integers mixed with floats are converted to floats). Arrays 
+    passed by the caller are used as they are.
+    """
+    if isinstance(values, np.ndarray):
+        return values
+    try:
+        array_values = np.asarray(values)
+    except (OverflowError, ValueError):
+        return None
+    # only integers (and booleans) are converted exactly from Python objects
+    if array_values.dtype.kind not in "biu":
+        return None
+    return array_values
+
+
+def _exact_comparison(values, low, high):
+    """Check if NumPy compares values with the range boundaries exactly: 
+    integers of the same kind (mixing signed and unsigned 64-bit integers 
+    converts them to floats) or floats with boundaries exact in floats.
+    """
+    kinds = set([low.dtype.kind, high.dtype.kind])
+    if values.dtype.kind in "iu":
+        return kinds == set([values.dtype.kind])
+    if values.dtype.kind == "f" and kinds <= set("iuf"):
+        return all(bounds.dtype.kind == "f" or len(bounds) == 0 or 
+                   (bounds.min() >= -2**53 and bounds.max() <= 2**53)
+                   for bounds in (low, high))
+    return False
+
+
+def _compact_array(values):
+    """Pack integers into a signed or unsigned 64-bit array, or return them as 
+    a list if they do not fit.
+    """
+    values = list(values)
+    for typecode in ('q', 'Q'):
+        try:
+            return array.array(typecode, values)
+        except (OverflowError, TypeError):
+            pass
+    return values
+
+
+class _SparseHits(dict):
+    """Map of bins indices to number of hits, holding only bins which have 
+    been hit (missing bins have 0 hits).
+    """
+
+    def __missing__(self, index):
+        return 0
+
+
+def _patterns_union_size(patterns, sizes):
+    """Return number of cross-bins matching any of the ignore bins patterns.
+
+    A pattern is a tuple of sets of bins positions (or None matching all 
+    bins) of each item. The union size is computed using inclusion-exclusion 
+    principle, skipping empty intersections, so it does not depend on the 
+    cross size.
+    """
+    def intersect(pattern_a, pattern_b):
+        pattern = []
+        for ign_a, ign_b in zip(pattern_a, pattern_b):
+            if ign_a is None or ign_b is None:
+                ign = ign_b if ign_a is None else ign_a
+            else:
+                ign = ign_a & ign_b
+                if not ign:
+                    return None
+            pattern.append(ign)
+        return tuple(pattern)
+
+    union_size = 0
+    # stack of (intersection, index of the next pattern to intersect, sign)
+    stack = [(tuple(None for size in sizes), 0, 1)]
+    while stack:
+        current, start, sign = stack.pop()
+        for jj in range(start, len(patterns)):
+            pattern = intersect(current, patterns[jj])
+            if pattern is not None:
+                pattern_size = 1
+                for ign, size in zip(pattern, sizes):
+                    pattern_size *= size if ign is None else len(ign)
+                union_size += sign * pattern_size
+                stack.append((pattern, jj + 1, -sign))
+    return union_size
+
+
+class _RangeBins(object):
+    """Sequence of the ``(low, high)`` range bins of a :class:`CoverPoint`. 
+
+    Range boundaries are stored in compact arrays and a value is matched with 
+    a range using a binary search over the sorted lower boundaries.
+    """
+
+    def __init__(self, bins):
+        ranges = [(low, high) for (low, high) in bins]
+        if any(low > high for (low, high) in ranges):
+            raise Exception("Range bins must be defined as (low, high) pairs")
+        self._low = _compact_array(low for (low, high) in ranges)
+        self._high = _compact_array(high for (low, high) in ranges)
+
+        # order of ranges sorted by lower boundaries (None if already sorted)
+        order = sorted(range(len(ranges)), key=lambda ii: ranges[ii][0])
+        if order == list(range(len(ranges))):
+            self._order = None
+            self._sorted_low = self._low
+        else:
+            self._order = _compact_array(order)
+            self._sorted_low = _compact_array(ranges[ii][0] for ii in order)
+
+        for prev, ii in zip(order, order[1:]):
+            if ranges[prev][1] >= ranges[ii][0]:
+                raise Exception("Range bins %s and %s overlap" % (
+                    ranges[prev], ranges[ii]))
+
+    def find(self, value):
+        """Return position of the range containing value (or None).
+        """
+        try:
+            ii = bisect.bisect_right(self._sorted_low, value) - 1
+            if ii < 0:
+                return None
+            idx = ii if self._order is None else self._order[ii]
+            return idx if value <= self._high[idx] else None
+        except TypeError:  # value not comparable with range boundaries
+            return None
+
+    def __len__(self):
+        return len(self._low)
+
+    def __getitem__(self, idx):
+        return (self._low[idx], self._high[idx])
+
+    def __iter__(self):
+        return zip(self._low, self._high)
+
+
+# crosses with more cross-bins keep only covered cross-bins as holes
+_DENSE_HOLES_LIMIT = 2**20
+
+
+class _DenseHoles(object):
+    """Set of the uncovered bins of a coverage primitive, returned by
+    :attr:`CoverPoint.holes` and :attr:`CoverCross.holes`.
+
+    Bins positions are kept in an array (a removed position is replaced by 
+    the last one) together with the array slot of each position, so counting 
+    (``len()``), removing a covered bin and picking a random bin take 
+    constant time.
+    """
+
+    def __init__(self, positions, size, bins_at):
+        self._positions = array.array('q', positions)
+        self._slots = array.array('q', [-1]) * size
+        for slot, pos in enumerate(self._positions):
+            self._slots[pos] = slot
+        self._bins_at = bins_at
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __iter__(self):
+        # a copy, so that bins may be sampled while iterating
+        for pos in self._positions.tolist():
+            yield self._bins_at(pos)
+
+    def _discard(self, pos):
+        slot = self._slots[pos]
+        if slot < 0:
+            return
+        last = self._positions.pop()
+        if last != pos:
+            self._positions[slot] = last
+            self._slots[last] = slot
+        self._slots[pos] = -1
+
+    def random(self, rng=random):
+        """Return a random uncovered bin.
+
+        Args:
+            rng (optional): a source of random numbers (e.g. a seeded 
+                ``random.Random`` instance, by default the ``random`` 
+                module).
+        """
+        if not self._positions:
+            raise IndexError("No uncovered bins")
+        return self._bins_at(self._positions[rng.randrange(
+            len(self._positions))])
+
+
+class _SparseHoles(object):
+    """Set of the uncovered cross-bins of a large :class:`CoverCross`, kept 
+    as a complement of the covered cross-bins (so it does not depend on the
+    cross size). Random cross-bins are drawn until an uncovered one is found,
+    so picking takes constant time while a fixed fraction of the cross is 
+    uncovered. Iteration scans all the cross-bins, so it takes time 
+    proportional to the cross size.
+    """
+
+    # random cross-bins drawn before scanning for an uncovered one
+    _attempts = 64
+
+    def __init__(self, cross):
+        self._cross = cross
+        self._covered = set(index for index, count in cross._hits.items() 
+                            if count >= cross._at_least)
+        self._count = cross._x_size - cross._ignored
+
+    def __len__(self):
+        return self._count - len(self._covered)
+
+    def __iter__(self):
+        return self._scan(0)
+
+    def _scan(self, start):
+        """Yield uncovered cross-bins from the index start (wrapping 
+        around).
+        """
+        cross = self._cross
+        for index in itertools.chain(range(start, cross._x_size), 
+                                     range(start)):
+            if self._is_hole(index):
+                yield cross._bins_at(index)
+
+    def _is_hole(self, index):
+        return (index not in self._covered and 
+                not self._cross._is_ignored(
+                    index, self._cross._positions(index)))
+
+    def _discard(self, index):
+        self._covered.add(index)
+
+    def random(self, rng=random):
+        """Return a random uncovered cross-bin.
+
+        If no uncovered cross-bin is drawn in a few attempts (the cross is 
+        almost covered), the cross-bins are scanned from a random one, which
+        takes time proportional to the cross size.
+
+        Args:
+            rng (optional): a source of random numbers (by default the 
+                ``random`` module).
+        """
+        if len(self) == 0:
+            raise IndexError("No uncovered bins")
+        cross = self._cross
+        for _ in range(self._attempts):
+            index = rng.randrange(cross._x_size)
+            if self._is_hole(index):
+                return cross._bins_at(index)
+        return next(self._scan(rng.randrange(cross._x_size)))
+
+
 class CoverPoint(CoverItem):
     """Class used to create coverage points as decorators. 
 
@@ -245,12 +1275,23 @@ class CoverPoint(CoverItem):
             non-trivial types, a ``rel`` must always be defined (or equality 
             operator must be overloaded).
         rel (func, optional): a relation function which defines bins matching 
-            relation (by default, the equality operator ``==``).
+            relation (by default, the equality operator ``==``). Bins matched 
+            with the equality operator are found by a hash lookup, so the 
+            sampling time does not depend on the number of bins.
         weight (int, optional): a ``CoverPoint`` weight (by default ``1``).
         at_least (int, optional): the number of hits per bins to be considered 
             as covered (by default ``1``).
         inj (bool, optional): "injection" feature, defines if more than single 
             bin can be matched at one sampling (default ``False``).
+        ranges (bool, optional): defines if bins are ``(low, high)`` ranges 
+            of values (boundaries included). Range bins must not overlap and 
+            are matched using a binary search (default ``False``). See also 
+            :func:`~.split_range`.
+        iff (func, optional): a guard function, taking the same arguments as
+            the transformation function. If defined, the ``CoverPoint`` is 
+            sampled only when the guard returns ``True``. It is evaluated 
+            before the transformation function, so irrelevant samples (e.g. 
+            during reset) are cheap.
 
     Example:
 
@@ -274,19 +1315,39 @@ class CoverPoint(CoverItem):
     ... )
     >>> def decorated_fun2(self, arg1, arg2):
     ...     ...
+
+    >>> @coverage.CoverPoint( # cover arg in ranges 0...9 and 10...99 (2 bins)
+    ...     name = "top.parent.coverpoint4", 
+    ...     vname = "arg",
+    ...     bins = [(0, 9), (10, 99)],
+    ...     ranges = True
+    ... )
+    >>> def decorated_fun3(self, arg):
+    ...     ...
     """
 
+    _profiled_functions = {"_transformation" : "xf", "_relation" : "rel"}
+
     # conditional Object creation, only if name not already registered
     def __new__(cls, name, vname = None, xf=None, rel=None, bins=[], weight=1, 
-                at_least=1, inj=False):
+                at_least=1, inj=False, ranges=False, iff=None):
         if name in coverage_db:
             return coverage_db[name]
         else:
             return super(CoverPoint, cls).__new__(CoverPoint)
 
     def __init__(self, name, vname = None, xf=None, rel=None, bins=[], 
-                 weight=1, at_least=1, inj=False):
+                 weight=1, at_least=1, inj=False, ranges=False, iff=None):
         if not name in coverage_db:
+            # range bins are checked before the CoverPoint is registered
+            if ranges:
+                if rel is not None:
+                    raise Exception("CoverPoint range bins are matched with \
+                                     the range relation only")
+                bins = _RangeBins(bins)
+                if len(bins) == 0:
+                    raise Exception("CoverPoint range bins must not be empty")
+
             CoverItem.__init__(self, name)
             if self._parent is None:
                 raise Exception("CoverPoint must have a parent \
@@ -294,6 +1355,7 @@ class CoverPoint(CoverItem):
 
             self._transformation = xf
             self._vname = vname
+            self._guard = iff
 
             # equality operator is the default bins matching relation
             self._relation = rel if rel is not None else operator.eq
@@ -302,104 +1364,243 @@ class CoverPoint(CoverItem):
             self._injection = inj
 
 
-            if (len(bins) != 0):
-                self._size = self._weight * len(bins)
-                self._hits = OrderedDict.fromkeys(bins, 0)
+            if ranges:
+                self._bins = bins
+            elif (len(bins) != 0):
+                self._bins = list(OrderedDict.fromkeys(bins))
             else:  # if no bins specified, add one bin equal True
-                self._size = self._weight
-                self._hits = OrderedDict.fromkeys([True], 0)
+                self._bins = [True]
+            self._size = self._weight * len(self._bins)
+
+            # number of hits of each bin, in the bins order
+            self._hits = array.array('Q', bytes(8 * len(self._bins)))
+
+            # bins positions, used for a hash lookup if bins are matched with
+            # the equality operator (otherwise the linear scan is needed)
+            if not ranges and self._relation is operator.eq:
+                self._bins_index = {
+                    bins: idx for idx, bins in enumerate(self._bins)
+                }
+            else:
+                self._bins_index = None
 
-            # determines whether decorated a bound method
-            self._decorates_method = None
             # determines whether transformation function is a bound method
-            self._trans_is_method = None
+            self._trans_is_method = _has_self(xf)
             self._parent._update_size(self._size)
 
-            self._new_hits = []  # list of bins hit per single function call
+            # bins are considered covered from the beginning if at_least is 0
+            if self._at_least <= 0:
+                self._parent._update_coverage(self._size)
+                self._coverage = self._size
+
+            self._new_pos = []  # positions of bins hit per single function call
+            self._crosses = []  # crosses of this cover point
+            self._holes = None  # uncovered bins, built on request
+            # bins to hits map, built on request and then updated with hits
+            self._detailed_coverage = None
+
+    def _bound_sampler(self, f, decorates_method):
+        """Return a function sampling arguments of the decorated function f. 
+        
+        Binding of the functions and mapping of the arguments are resolved 
+        once, when decorating (or at the first call).
+        """
 
-    def __call__(self, f):
-        @wraps(f)
-        def _wrapped_function(*cb_args, **cb_kwargs):
-
-            # if transformation function not defined, simply return arguments
-            if self._transformation is None:
-                if self._vname is None:
-                    def dummy_f(*cb_args):  # return a tuple or single object
-                        if len(cb_args) > 1:
-                            return cb_args
-                        else:
-                            return cb_args[0]
-                # if vname defined, match it to the decroated function args
-                else: 
-                    arg_names = list(inspect.signature(f).parameters)
-                    idx = arg_names.index(self._vname)
-                    def dummy_f(*cb_args):
-                        return cb_args[idx]                        
- 
-                self._transformation = dummy_f
-
-            # for the first time only check if decorates method in the class
-            if self._decorates_method is None:
-                self._decorates_method = False
-                for x in inspect.getmembers(cb_args[0]):
-                    if '__func__' in dir(x[1]):
-                        # compare decorated function name with class functions
-                        self._decorates_method = \
-                          f.__name__ == x[1].__func__.__name__
-                        if self._decorates_method:
-                            break
-
-            # for the first time only check if a transformation function is a
-            # method
-            if self._trans_is_method is None:
-                self._trans_is_method = "self" in inspect.signature(
-                    self._transformation).parameters
-
-            current_coverage = self.coverage
-            self._new_hits = []
-
-            # if function is bound then remove "self" from the arguments list
-            if self._decorates_method ^ self._trans_is_method:
-                result = self._transformation(*cb_args[1:])
+        # if transformation function not defined, simply return arguments
+        if self._transformation is None:
+            # if vname defined, match it to the decorated function args
+            if self._vname is not None:
+                idx = list(inspect.signature(f).parameters).index(self._vname)
+                def sampler(cb_args):
+                    self._samples += 1
+                    if self._saturated and self._skip_saturated():
+                        return
+                    self._sample(cb_args[idx])
             else:
-                result = self._transformation(*cb_args)
-
-            # compare function result using relation function with matching
-            # bins
-            for bins in self._hits:
-                if self._relation(result, bins):
-                    self._hits[bins] += 1
-                    self._new_hits.append(bins)
-                    # check bins callbacks
-                    if bins in self._bins_callbacks:
-                        self._bins_callbacks[bins]()
-                    # if injective function, continue through all bins
-                    if not self._injection:
-                        break
-
-            # notify parent about new coverage level
-            self._parent._update_coverage(self.coverage - current_coverage)
+                # "self" is removed from the arguments list
+                first = 1 if decorates_method else 0
+                def sampler(cb_args):  # match a tuple or single object
+                    self._samples += 1
+                    if self._saturated and self._skip_saturated():
+                        return
+                    args = cb_args[first:]
+                    self._sample(args if len(args) > 1 else args[0])
+
+        # if function is bound then remove "self" from the arguments list
+        elif decorates_method ^ self._trans_is_method:
+            def sampler(cb_args):
+                self._samples += 1
+                if self._saturated and self._skip_saturated():
+                    return
+                self._sample(self._transformation(*cb_args[1:]))
+        else:
+            def sampler(cb_args):
+                self._samples += 1
+                if self._saturated and self._skip_saturated():
+                    return
+                self._sample(self._transformation(*cb_args))
+        return self._guarded(sampler, decorates_method)
+
+    def _sample(self, result):
+        """Match the sampled (transformed) value with bins.
+        """
+        current_coverage = self.coverage
+        self._new_pos = []
 
-            # check threshold callbacks
-            for ii in self._threshold_callbacks:
-                if (ii > 100 * current_coverage / self.size and 
-                    ii <= 100 * self.coverage / self.size):
-                    self._threshold_callbacks[ii]()
+        # compare function result using relation function with matching
+        # bins
+        for pos in self._match(result):
+            self._add_hits(pos, self._hits_per_sample)
 
-            return f(*cb_args, **cb_kwargs)
-        return _wrapped_function
+        self._notify_coverage(current_coverage)
 
-    @property
-    def coverage(self):
-        coverage = self._size
-        for ii in self._hits:
-            if self._hits[ii] < self._at_least:
-                coverage -= self._weight
-        return coverage
+    def _check_saturated(self):
+        self._saturated = (self._coverage >= self._size and 
+                           all(cross._saturated for cross in self._crosses))
+
+    def _add_hits(self, pos, hits):
+        """Add number of hits to the bin at position pos.
+        """
+        count = self._hits[pos]
+        self._hits[pos] = count + hits
+        # bin just became covered, update covered bins counter
+        if count < self._at_least <= count + hits:
+            self._coverage += self._weight
+            if self._holes is not None:
+                self._holes._discard(pos)
+        if self._detailed_coverage is not None:
+            self._detailed_coverage[self._bins[pos]] = count + hits
+        self._new_pos.append(pos)
+        if self._changed_bins is not None:
+            self._mark_changed(pos)
+        # check bins callbacks
+        if self._bins_callbacks and self._bins[pos] in self._bins_callbacks:
+            self._bins_callbacks[self._bins[pos]]()
+
+    def sample_many(self, values):
+        """Sample a batch of values at once.
+
+        Values are matched with bins directly (the transformation function is 
+        not applied). Coverage level, parent coverage and callbacks are updated
+        once per batch. Equality and range bins of numeric values are matched 
+        in bulk if NumPy is available.
+
+        Args:
+            values: a sequence or a NumPy array of values.
+
+        Example:
+
+        >>> coverage_db["top.parent.coverpoint2"].sample_many([1, 2, 2, 4])
+        """
+        current_coverage = self.coverage
+        self._new_pos = []
+
+        hits = Counter()
+        positions = None
+        if np is not None and len(values) > 0:
+            array_values = _exact_array(values)
+            if array_values is not None:
+                positions = self._match_each(array_values)
+        if positions is not None:
+            positions, counts = np.unique(
+                positions[positions >= 0], return_counts=True)
+            hits.update(dict(zip(positions.tolist(), counts.tolist())))
+        else:
+            merge = self._bins_index is not None
+            for value, count in _count_values(values, merge):
+                for pos in self._match(value):
+                    hits[pos] += count
+
+        for pos in sorted(hits):
+            self._add_hits(pos, hits[pos])
+
+        self._notify_coverage(current_coverage)
+
+    def _match_each(self, values):
+        """Return an array of bins positions matching each value of the NumPy 
+        array (-1 if no bin matched), or None if values cannot be matched in 
+        bulk.
+        """
+        # only numbers are matched in bulk (NumPy converts mixed types)
+        if values.ndim != 1 or values.dtype.kind not in "biuf":
+            return None
+
+        if isinstance(self._bins, _RangeBins):
+            low = np.asarray(self._bins._sorted_low)
+            high = np.asarray(self._bins._high)
+            if not _exact_comparison(values, low, high):
+                return None
+            found = np.searchsorted(low, values, side='right') - 1
+            pos = np.maximum(found, 0)
+            if self._bins._order is not None:
+                pos = np.asarray(self._bins._order)[pos]
+            return np.where((found >= 0) & (values <= high[pos]), pos, -1)
+
+        if self._bins_index is not None:
+            unique, inverse = np.unique(values, return_inverse=True)
+            unique_pos = np.array(
+                [self._bins_index.get(x, -1) for x in unique.tolist()], 
+                dtype=np.int64)
+            return unique_pos[inverse.reshape(-1)]
+
+        return None  # custom relation, bins must be matched one by one
+
+    def _match(self, result):
+        """Return a list of bins positions matching the sampled (transformed) 
+        value.
+        """
+        # range bins are resolved by a binary search
+        if isinstance(self._bins, _RangeBins):
+            idx = self._bins.find(result)
+            return [] if idx is None else [idx]
+
+        # equality bins are resolved by a direct hash lookup
+        if self._bins_index is not None:
+            try:
+                idx = self._bins_index.get(result)
+                return [] if idx is None else [idx]
+            except TypeError:
+                pass  # unhashable value, use the linear scan below
+
+        matched = []
+        for idx, bins in enumerate(self._bins):
+            if self._relation(result, bins):
+                matched.append(idx)
+                # if injective function, continue through all bins
+                if not self._injection:
+                    break
+        return matched
 
     @property
     def detailed_coverage(self):
-        return self._hits
+        if self._detailed_coverage is None:
+            self._detailed_coverage = OrderedDict(zip(self._bins, self._hits))
+        return self._detailed_coverage
+
+    @property
+    def new_hits(self):
+        return [self._bins[pos] for pos in self._new_pos]
+
+    @property
+    def holes(self):
+        """Return uncovered bins (hit less than ``at_least`` times).
+
+        The set is built at the first call and then updated when bins become
+        covered, so counting holes (``len()``), picking a random hole
+        (``random()``) and iterating over holes do not scan the bins.
+
+        Example:
+
+        >>> holes = coverage_db["top.dma.burst"].holes
+        >>> while len(holes) > 0:
+        ...     yield drive_burst(holes.random())
+        """
+        if self._holes is None:
+            self._holes = _DenseHoles(
+                [pos for pos, count in enumerate(self._hits)
+                 if count < self._at_least],
+                len(self._bins), self._bins.__getitem__)
+        return self._holes
 
 class CoverCross(CoverItem):
     """Class used to create coverage crosses as decorators.
@@ -413,10 +1614,14 @@ class CoverCross(CoverItem):
             coverage trie.
         items (list): a list of :class:`CoverPoints <CoverPoint>` by names, 
             to create a Cartesian product of cross-bins.
-        ign_bins (list, optional): a list of bins to be ignored.
+        ign_bins (list, optional): a list of bins to be ignored. ``None`` in 
+            the ignore bins tuple matches any bin of the item. 
         weight (int, optional): a ``CoverCross`` weight (by default ``1``).
         at_least (int, optional): the number of hits per bins to be considered 
             as covered (by default ``1``).
+        iff (func, optional): a guard function, taking arguments of the 
+            decorated function. If defined, the ``CoverCross`` is sampled only
+            when the guard returns ``True``.
 
     Example:
 
@@ -439,17 +1644,31 @@ class CoverCross(CoverItem):
     >>> # bin from the bins list [(1, 2), (1, 3)...(5, 4)] will be matched 
     >>> # when a tuple (x=arg_a, y=arg_b) sampled at this function call.
     ...     ...
+
+    Cross size is computed from the items sizes and ignore bins, and only 
+    cross-bins which have been hit are stored, so large crosses are cheap as 
+    long as not many distinct cross-bins are sampled.
     """
 
+    _profiled_functions = {"_is_ignored" : "rel"}
+
     # conditional Object creation, only if name not already registered
-    def __new__(cls, name, items=[], ign_bins=[], weight=1, at_least=1):
+    def __new__(cls, name, items=[], ign_bins=[], weight=1, at_least=1, 
+                iff=None):
         if name in coverage_db:
             return coverage_db[name]
         else:
             return super(CoverCross, cls).__new__(CoverCross)
 
-    def __init__(self, name, items=[], ign_bins=[], weight=1, at_least=1):
+    def __init__(self, name, items=[], ign_bins=[], weight=1, at_least=1, 
+                 iff=None):
         if not name in coverage_db:
+            # ignore bins are checked before the CoverCross is registered
+            for ignore_bins in ign_bins:
+                if len(ignore_bins) != len(items):
+                    raise Exception("Ignore bins %r of CoverCross %s must "
+                                    "have a bins (or None) per item" % 
+                                    (ignore_bins, name))
             CoverItem.__init__(self, name)
             if self._parent is None:
                 raise Exception("CoverCross must have a parent \
@@ -457,73 +1676,271 @@ class CoverCross(CoverItem):
 
             self._weight = weight
             self._at_least = at_least
-            # equality operator is the defult ignore bins matching relation
+            self._guard = iff
             self._items = items
-
-            bins_lists = []
-            for cp_names in self._items:
-                bins_lists.append(
-                    coverage_db[cp_names].detailed_coverage.keys())
-
-            # a map of cross-bins, key is a tuple of bins Cartesian product
-            self._hits = dict.fromkeys(itertools.product(*bins_lists), 0)
-
-            # remove ignore bins from _hits map if relation is true
-            for x_bins in list(self._hits.keys()):
-                for ignore_bins in ign_bins:
-                    remove = True
-                    for ii in range(0, len(x_bins)):
-                        if ignore_bins[ii] is not None:
-                            if (ignore_bins[ii] != x_bins[ii]):
-                                remove = False
-                    if remove and (x_bins in self._hits):
-                        del self._hits[x_bins]
-
-            self._size = self._weight * len(self._hits)
+            self._items_db = [coverage_db[cp_name] for cp_name in items]
+            for cp in self._items_db:
+                cp._crosses.append(self)
+
+            # cross-bins are identified by a mixed-radix index, which digits 
+            # are positions of bins in the items (in itertools.product order)
+            self._strides = []
+            self._x_size = 1
+            for cp in reversed(self._items_db):
+                self._strides.insert(0, self._x_size)
+                self._x_size *= len(cp._bins)
+
+            # equality operator is the defult ignore bins matching relation,
+            # None in the ignore bins tuple matches any bin of the item; 
+            # ignore bins are kept as patterns of bins positions and checked
+            # when a cross-bin is hit
+            patterns = set()
+            for ignore_bins in ign_bins:
+                pattern = []
+                for cp, ign in zip(self._items_db, ignore_bins):
+                    if ign is None:
+                        pattern.append(None)
+                    else:
+                        pattern.append(frozenset(pos for pos, bins in 
+                                                 enumerate(cp._bins) 
+                                                 if ign == bins))
+                if all(ign is None or ign for ign in pattern):
+                    patterns.add(tuple(pattern))
+
+            # patterns without wildcards are expanded to cross-bins indices
+            self._ign_index = set()
+            self._ign_patterns = []
+            for pattern in patterns:
+                if None in pattern:
+                    self._ign_patterns.append(pattern)
+                else:
+                    for x_pos in itertools.product(*pattern):
+                        self._ign_index.add(self._index(x_pos))
+
+            # number of hits of the cross-bins which have been hit, indexed by
+            # the cross-bin index
+            self._hits = _SparseHits()
+            self._new_pos = []  # indices of cross-bins hit per function call
+
+            ignored = _patterns_union_size(
+                list(patterns), [len(cp._bins) for cp in self._items_db])
+            self._ignored = ignored
+            self._size = self._weight * (self._x_size - ignored)
             self._parent._update_size(self._size)
+            self._holes = None  # uncovered cross-bins, built on request
+            # cross-bins to hits map, built on request and then updated with
+            # hits
+            self._detailed_coverage = None
+
+            # bins are considered covered from the beginning if at_least is 0
+            if self._at_least <= 0:
+                self._parent._update_coverage(self._size)
+                self._coverage = self._size
+
+            # saturated items are not saturated with a new cross
+            if coverage_db._saturation is not None:
+                self._check_saturated()
+                for cp in self._items_db:
+                    cp._check_saturated()
+
+    def _bound_sampler(self, f, decorates_method):
+        """Return a function sampling the decorated function f (the cross 
+        does not use arguments, only bins hit by the items).
+        """
+        def sampler(cb_args):
+            self._samples += 1
+            if self._saturated and self._skip_saturated():
+                return
+            self._sample()
+        return self._guarded(sampler, decorates_method)
+
+    def _sample(self):
+        """Match bins hit by the items with cross-bins.
+        """
+        current_coverage = self.coverage
+        self._new_pos = []
 
-    def __call__(self, f):
-        @wraps(f)
-        def _wrapped_function(*cb_args, **cb_kwargs):
+        # a list of hit cross-bins, a Cartesian product of bins hit by the 
+        # items
+        pos_lists = [cp._new_pos for cp in self._items_db]
+        for x_pos in itertools.product(*pos_lists):
+            index = self._index(x_pos)
+            if not self._is_ignored(index, x_pos):
+                self._add_hits(index, self._hits_per_sample)
 
-            current_coverage = self.coverage
+        self._notify_coverage(current_coverage)
 
-            hit_lists = []
-            for cp_name in self._items:
-                hit_lists.append(coverage_db[cp_name]._new_hits)
+    def _index(self, x_pos):
+        """Return index of the cross-bin given by positions of items bins.
+        """
+        index = 0
+        for pos, stride in zip(x_pos, self._strides):
+            index += pos * stride
+        return index
 
-            # a list of hit cross-bins, key is a tuple of bins Cartesian
-            # product
-            for x_bins_hit in list(itertools.product(*hit_lists)):
-                if x_bins_hit in self._hits:
-                    self._hits[x_bins_hit] += 1
-                    # check bins callbacks
-                    if x_bins_hit in self._bins_callbacks:
-                        self._bins_callbacks[x_bins_hit]()
+    def _positions(self, index):
+        """Return positions of items bins of the cross-bin at index.
+        """
+        x_pos = []
+        for stride in self._strides:
+            pos, index = divmod(index, stride)
+            x_pos.append(pos)
+        return x_pos
+
+    def _bins_at(self, index):
+        """Return the cross-bin (tuple of items bins) at index.
+        """
+        return tuple(cp._bins[pos] for cp, pos in 
+                     zip(self._items_db, self._positions(index)))
 
-            # notify parent about new coverage level
-            self._parent._update_coverage(self.coverage - current_coverage)
+    def _is_ignored(self, index, x_pos):
+        """Check if the cross-bin (given by index and positions of items bins)
+        matches any ignore bins pattern.
+        """
+        if index in self._ign_index:
+            return True
+        for pattern in self._ign_patterns:
+            if all(ign is None or pos in ign for pos, ign in 
+                   zip(x_pos, pattern)):
+                return True
+        return False
+
+    def _check_saturated(self):
+        self._saturated = self._coverage >= self._size
+        # cover points may be saturated with all their crosses
+        if self._saturated:
+            for cp in self._items_db:
+                cp._check_saturated()
+
+    def _add_hits(self, index, hits):
+        """Add number of hits to the cross-bin at index.
+        """
+        count = self._hits[index]
+        self._hits[index] = count + hits
+        # cross-bin just became covered, update covered bins counter
+        if count < self._at_least <= count + hits:
+            self._coverage += self._weight
+            if self._holes is not None:
+                self._holes._discard(index)
+        self._new_pos.append(index)
+        if self._changed_bins is not None:
+            self._mark_changed(index)
+        if self._detailed_coverage is not None:
+            self._detailed_coverage[self._bins_at(index)] = count + hits
+        # check bins callbacks
+        if self._bins_callbacks:
+            x_bins = self._bins_at(index)
+            if x_bins in self._bins_callbacks:
+                self._bins_callbacks[x_bins]()
+
+    def sample_many(self, values):
+        """Sample a batch of values at once.
+
+        Each value is a tuple of values matched with bins of the cross items 
+        (in the items order), as sampled by these :class:`CoverPoints 
+        <CoverPoint>`. Transformation functions of the items are not applied.
+        Coverage level, parent coverage and callbacks are updated once per 
+        batch. Note that this method does not sample the cross items.
 
-            # check threshold callbacks
-            for ii in self._threshold_callbacks:
-                if (ii > 100 * current_coverage / self.size and 
-                    ii <= 100 * self.coverage / self.size):
-                    self._threshold_callbacks[ii]()
+        Args:
+            values: a sequence of tuples or a 2-dimensional NumPy array (one 
+                column per item).
 
-            return f(*cb_args, **cb_kwargs)
-        return _wrapped_function
+        Example:
 
-    @property
-    def coverage(self):
-        coverage = self._size
-        for ii in self._hits:
-            if self._hits[ii] < self._at_least:
-                coverage -= self._weight
-        return coverage
+        >>> coverage_db["top.parent.covercross"].sample_many(
+        ...     [(1, 2), (1, 3), (2, 5)]
+        ... )
+        """
+        current_coverage = self.coverage
+        self._new_pos = []
+
+        hits = None
+        if np is not None and len(values) > 0:
+            columns = _exact_array(values)
+            if (columns is not None and columns.ndim == 2 and 
+                    columns.shape[1] == len(self._items)):
+                hits = self._count_hits_vectorized(columns)
+        if hits is None:
+            hits = Counter()
+            merge = all(cp._bins_index is not None for cp in self._items_db)
+            for value, count in _count_values(values, merge):
+                pos_lists = [
+                    cp._match(x) for cp, x in zip(self._items_db, value)
+                ]
+                for x_pos in itertools.product(*pos_lists):
+                    hits[self._index(x_pos)] += count
+
+        for index in sorted(hits):
+            if not self._is_ignored(index, self._positions(index)):
+                self._add_hits(index, hits[index])
+
+        self._notify_coverage(current_coverage)
+
+    def _count_hits_vectorized(self, columns):
+        """Return a map of the cross-bins indices to number of hits in columns
+        of values, or None if bins cannot be matched in bulk.
+        """
+        if self._x_size >= 2**63:
+            return None
+
+        positions = []
+        for ii, cp in enumerate(self._items_db):
+            pos = cp._match_each(columns[:, ii])
+            if pos is None:
+                return None
+            positions.append(pos)
+
+        # only rows matched by all the items hit a cross-bin
+        matched = np.logical_and.reduce([pos >= 0 for pos in positions])
+        x_index = np.zeros(np.count_nonzero(matched), dtype=np.int64)
+        for pos, stride in zip(positions, self._strides):
+            x_index += pos[matched] * stride
+
+        x_index, counts = np.unique(x_index, return_counts=True)
+        return dict(zip(x_index.tolist(), counts.tolist()))
 
     @property
     def detailed_coverage(self):
-        return self._hits
+        if self._detailed_coverage is None:
+            pos_lists = [range(len(cp._bins)) for cp in self._items_db]
+            coverage = OrderedDict()
+            for index, x_pos in enumerate(itertools.product(*pos_lists)):
+                if not self._is_ignored(index, x_pos):
+                    x_bins = tuple(cp._bins[pos] for cp, pos in 
+                                   zip(self._items_db, x_pos))
+                    coverage[x_bins] = self._hits[index]
+            self._detailed_coverage = coverage
+        return self._detailed_coverage
+
+    @property
+    def new_hits(self):
+        return [self._bins_at(index) for index in self._new_pos]
+
+    @property
+    def holes(self):
+        """Return uncovered cross-bins (hit less than ``at_least`` times, 
+        ignored cross-bins excluded), see :attr:`CoverPoint.holes`.
+
+        Crosses larger than 2**20 cross-bins keep only the covered cross-bins,
+        so a random pick draws cross-bins until an uncovered one is found 
+        (scanning the cross if the cross is almost covered) and iteration 
+        takes time proportional to the cross size.
+        """
+        if self._holes is None:
+            if self._at_least <= 0:
+                self._holes = _DenseHoles([], 0, self._bins_at)
+            elif self._x_size > _DENSE_HOLES_LIMIT:
+                self._holes = _SparseHoles(self)
+            else:
+                pos_lists = [range(len(cp._bins)) for cp in self._items_db]
+                self._holes = _DenseHoles(
+                    [index for index, x_pos in 
+                     enumerate(itertools.product(*pos_lists)) 
+                     if self._hits[index] < self._at_least and
+                     not self._is_ignored(index, x_pos)], 
+                    self._x_size, self._bins_at)
+        return self._holes
 
 
 class CoverCheck(CoverItem):
@@ -543,6 +1960,9 @@ class CoverCheck(CoverItem):
         weight (int, optional): a ``CoverCheck`` weight (by default ``1``).
         at_least (int, optional): the number of hits of the ``f_pass`` function 
             to consider a particular ``CoverCheck`` as covered. 
+        iff (func, optional): a guard function, taking the same arguments as
+            ``f_pass`` and ``f_fail``. If defined, the ``CoverCheck`` is 
+            sampled only when the guard returns ``True``.
 
     Example:
 
@@ -558,14 +1978,18 @@ class CoverCheck(CoverItem):
 
     """
     
+    _profiled_functions = {"_f_pass" : "rel", "_f_fail" : "rel"}
+
     # conditional Object creation, only if name not already registered
-    def __new__(cls, name, f_fail, f_pass=None, weight=1, at_least=1):
+    def __new__(cls, name, f_fail, f_pass=None, weight=1, at_least=1, 
+                iff=None):
         if name in coverage_db:
             return coverage_db[name]
         else:
             return super(CoverCheck, cls).__new__(CoverCheck)
 
-    def __init__(self, name, f_fail, f_pass=None, weight=1, at_least=1):
+    def __init__(self, name, f_fail, f_pass=None, weight=1, at_least=1, 
+                 iff=None):
         if not name in coverage_db:
             CoverItem.__init__(self, name)
             if self._parent is None:
@@ -575,86 +1999,69 @@ class CoverCheck(CoverItem):
             self._at_least = at_least
             self._f_pass = f_pass
             self._f_fail = f_fail
+            self._guard = iff
             self._size = weight
             self._hits = dict.fromkeys(["PASS", "FAIL"], 0)
 
-            # determines whether decorated a bound method
-            self._decorates_method = None
             # determines whether pass function is a bound method
-            self._f_pass_is_method = None
+            self._f_pass_is_method = _has_self(f_pass)
             # determines whether fail function is a bound method
-            self._f_fail_is_method = None
+            self._f_fail_is_method = _has_self(f_fail)
             self._parent._update_size(self._size)
 
-    def __call__(self, f):
-        @wraps(f)
-        def _wrapped_function(*cb_args, **cb_kwargs):
-
-            # if pass function not defined always return True
-            if self._f_pass is None:
-                def dummy_f(*cb_args):
-                    return True
-                self._f_pass = dummy_f
-
-            # for the first time only check if decorates method in the class
-            if self._decorates_method is None:
-                self._decorates_method = False
-                for x in inspect.getmembers(cb_args[0]):
-                    if '__func__' in dir(x[1]):
-                        # compare decorated function name with class functions
-                        self._decorates_method = f.__name__ == x[
-                            1].__func__.__name__
-                        if self._decorates_method:
-                            break
-
-            # for the first time only check if a pass/fail function is a method
-            if self._f_pass_is_method is None and self._f_pass:
-                self._f_pass_is_method = "self" in inspect.signature(
-                    self._f_pass).parameters
-            if self._f_fail_is_method is None:
-                self._f_fail_is_method = "self" in inspect.signature(
-                    self._f_fail).parameters
-
-            current_coverage = self.coverage
-
-            # may be False (failed), True (passed) or None (undetermined)
-            passed = None
-
-            # if function is bound then remove "self" from the arguments list
-            if self._decorates_method ^ self._f_pass_is_method:
-                passed = True if self._f_pass(*cb_args[1:]) else None
-            else:
-                passed = True if self._f_pass(*cb_args) else None
+    def _bound_sampler(self, f, decorates_method):
+        """Return a function sampling arguments of the decorated function f. 
+        
+        Binding of the functions and mapping of the arguments are resolved 
+        once, when decorating (or at the first call).
+        """
 
-            if self._decorates_method ^ self._f_fail_is_method:
-                passed = False if self._f_fail(*cb_args[1:]) else passed
-            else:
-                passed = False if self._f_fail(*cb_args) else passed
+        # if function is bound then remove "self" from the arguments list
+        pass_first = 1 if decorates_method ^ self._f_pass_is_method else 0
+        fail_first = 1 if decorates_method ^ self._f_fail_is_method else 0
 
-            if passed:
-                self._hits["PASS"] += 1
-            elif not passed:
-                self._hits["FAIL"] += 1
+        def sampler(cb_args):
+            self._samples += 1
+            if self._saturated and self._skip_saturated():
+                return
+            self._sample(cb_args[pass_first:], cb_args[fail_first:])
+        return self._guarded(sampler, decorates_method)
 
-            if passed is not None:
+    def _sample(self, pass_args, fail_args):
+        """Check pass and fail conditions.
+        """
+        current_coverage = self.coverage
 
-                # notify parent about new coverage level
-                self._parent._update_coverage(self.coverage - current_coverage)
+        # may be False (failed), True (passed) or None (undetermined)
+        passed = None
 
-                # check threshold callbacks
-                for ii in self._threshold_callbacks:
-                    if (ii > 100 * current_coverage / self.size and 
-                        ii <= 100 * self.coverage / self.size):
-                        self._threshold_callbacks[ii]()
+        # if pass function not defined always pass
+        if self._f_pass is None or self._f_pass(*pass_args):
+            passed = True
+        if self._f_fail(*fail_args):
+            passed = False
 
-                # check bins callbacks
-                if "PASS" in self._bins_callbacks and passed:
-                    self._bins_callbacks["PASS"]()
-                elif "FAIL" in self._bins_callbacks and not passed:
-                    self._bins_callbacks["FAIL"]()
+        if passed is not None:
+            self._hits["PASS" if passed else "FAIL"] += self._hits_per_sample
+            if self._changed_bins is not None:
+                self._mark_changed(0 if passed else 1)
+            # failed check is never covered again
+            if not passed and coverage_db._saturation is not None:
+                self._check_saturated()
 
-            return f(*cb_args, **cb_kwargs)
-        return _wrapped_function
+            self._notify_coverage(current_coverage)
+
+            # check bins callbacks
+            if "PASS" in self._bins_callbacks and passed:
+                self._bins_callbacks["PASS"]()
+            elif "FAIL" in self._bins_callbacks and not passed:
+                self._bins_callbacks["FAIL"]()
+
+    def _hits_at(self, pos):
+        return self._hits[("PASS", "FAIL")[pos]]
+
+    def _check_saturated(self):
+        self._saturated = self._hits["FAIL"] > 0
 
     @property
     def coverage(self):
@@ -676,8 +2083,8 @@ def reportCoverage(logger, bins=False):
         bins (bool): print bins details.
 
     """
-    sorted_cov = sorted(coverage_db, key=str.lower)
-    for ii in sorted_cov:
+    coverage_db.flush()
+    for ii, _ in coverage_db.walk():
         logger("   " * ii.count('.') + "%s : %s, coverage=%d, size=%d " % (
             ii,
             coverage_db[ii],
@@ -686,17 +2093,146 @@ def reportCoverage(logger, bins=False):
         )
         )
         if (type(coverage_db[ii]) is not CoverItem) & (bins):
-            for jj in coverage_db[ii].detailed_coverage:
+            # detailed coverage is built on request, so get it once
+            detailed_coverage = coverage_db[ii].detailed_coverage
+            for jj in detailed_coverage:
                 logger("   " * ii.count('.') + "   BIN %s : %s" % (
                     jj,
-                    coverage_db[ii].detailed_coverage[jj]
+                    detailed_coverage[jj]
                 )
                 )
 
 
+def reportProfile(logger, top=None):
+    """Print sampling statistics of the coverage primitives (see 
+    :attr:`CoverageDB.profiling`), sorted by the time spent in sampling.
+
+    Args:
+        logger (func): a logger object.
+        top (int, optional): print only a number of the most expensive 
+            primitives.
+
+    """
+    coverage_db.flush()
+    profiled = [item for item in coverage_db.values() 
+                if item._profile is not None]
+    profiled.sort(key=lambda item: item._profile.total_time, reverse=True)
+    logger("%-40s %10s %10s %10s %10s %10s %10s" % (
+        "name", "samples", "total[ms]", "xf[ms]", "rel[ms]", "cb[ms]", 
+        "bins/smpl"))
+    for item in profiled[:top]:
+        stats = item._profile
+        logger("%-40s %10d %10.3f %10.3f %10.3f %10.3f %10.1f" % (
+            item._name,
+            stats.samples,
+            1000 * stats.total_time,
+            1000 * stats.xf_time,
+            1000 * stats.rel_time,
+            1000 * stats.callback_time,
+            stats.bins_per_sample
+        )
+        )
+
+
+class SharedTransform(object):
+    """Class used to create transformation functions shared by multiple 
+    coverage items.
+
+    A ``SharedTransform`` is called like the wrapped transformation function, 
+    but the function is computed only once per sampling event (a call of the 
+    decorated function) and arguments, and the result is returned to all the
+    callers with the same arguments. This way, an expensive transformation 
+    (e.g. decoding a packet) may be used by many :class:`CoverPoints 
+    <CoverPoint>` or :class:`CoverChecks <CoverCheck>` decorating the same 
+    function (combined by :func:`~.coverageSection` or stacked). Arguments 
+    are compared by identity, the last result is kept.
+
+    Args:
+        name (str): a name of the transformation (used in its ``repr()``).
+        xf (func): a transformation function, taking the same arguments as
+            transformation functions of the coverage items.
+
+    Example:
+
+    >>> decode = coverage.SharedTransform(
+    ...     "decode", lambda data, rw, status : Packet(data)
+    ... )
+    >>> packet_coverage = coverage.coverageSection(
+    ...     coverage.CoverPoint("top.packet.type", bins = ["A", "B"], 
+    ...         xf = lambda data, rw, status : decode(data, rw, status).type),
+    ...     coverage.CoverPoint("top.packet.length", bins = list(range(8)), 
+    ...         xf = lambda data, rw, status : decode(data, rw, status).len),
+    ...     ...
+    ... )
+    """
+
+    def __init__(self, name, xf):
+        self.name = name
+        self._transformation = xf
+        # allows to check signature of the transformation function
+        self.__wrapped__ = xf
+        self._event = None
+        self._args = None
+        self._result = None
+
+    def __repr__(self):
+        return "SharedTransform(%r)" % self.name
+
+    def __call__(self, *args):
+        if (self._event != _sampling_event or len(args) != len(self._args) or
+                any(arg is not cached for arg, cached in 
+                    zip(args, self._args))):
+            self._result = self._transformation(*args)
+            self._event = _sampling_event
+            self._args = args
+        return self._result
+
+
+def split_range(low, high, count):
+    """Split a range of values into equal range bins.
+
+    The range ``[low, high]`` is split into ``count`` ranges of equal size 
+    (the last one gets the remainder). Returned bins may be used with a 
+    :class:`CoverPoint` defined with ``ranges=True``.
+
+    Args:
+        low (int): lower boundary of the range (inclusive).
+        high (int): upper boundary of the range (inclusive).
+        count (int): number of range bins.
+
+    Returns:
+        list: a list of ``(low, high)`` ranges.
+
+    Example:
+
+    >>> @coverage.CoverPoint( # 256 equal bins of a 32-bit address
+    ...     name = "top.parent.address", 
+    ...     vname = "address",
+    ...     bins = coverage.split_range(0, 2**32 - 1, 256),
+    ...     ranges = True
+    ... )
+    >>> def decorated_fun(self, address):
+    ...     ...
+    """
+    span = high - low + 1
+    if not 0 < count <= span:
+        raise Exception("Cannot split %d values into %d range bins" % (
+            span, count))
+    step = span // count
+    bins = [(low + ii * step, low + (ii + 1) * step - 1) 
+            for ii in range(count)]
+    bins[-1] = (bins[-1][0], high)
+    return bins
+
+
 def coverageSection(*coverItems):
     """Combine multiple coverage items into a single decorator.
 
+    All the coverage items are sampled by a single wrapper of the decorated 
+    function, in the order of definition, except :class:`CoverCrosses 
+    <CoverCross>` which are sampled after all other items, so that they match
+    bins just hit by the cover points.
+
     Args:
         *coverItems ((multiple) :class:`CoverItem`): coverage primitives to be
             combined.
@@ -714,11 +2250,38 @@ def coverageSection(*coverItems):
     >>> def decorated_fun(self, arg):
     ...     ...
     """
-    def _nested(*decorators):
-        def _decorator(f):
-            for dec in reversed(*decorators):
-                f = dec(f)
-            return f
-        return _decorator
-
-    return _nested(coverItems)
+    # crosses depend on the items, so are sampled last
+    items = [item for item in coverItems if not isinstance(item, CoverCross)]
+    items += [item for item in coverItems if isinstance(item, CoverCross)]
+
+    def _decorator(f):
+        return _sampling_wrapper(f, [item._sampler(f) for item in items])
+
+    return _decorator
+
+
+def flush_at_timestep():
+    """Create a cocotb coroutine flushing the deferred sampling buffer (see 
+    :attr:`CoverageDB.deferred`) in the read-only phase of each simulator 
+    timestep, so that sampling is done off the critical path of the 
+    testbench coroutines.
+
+    Returns:
+        a coroutine to be forked.
+
+    Example:
+
+    >>> coverage.coverage_db.deferred = True
+    >>> cocotb.fork(coverage.flush_at_timestep())
+    """
+    import cocotb
+    from cocotb.triggers import ReadOnly, NextTimeStep
+
+    @cocotb.coroutine
+    def _flush_loop():
+        while True:
+            yield ReadOnly()
+            coverage_db.flush()
+            yield NextTimeStep()
+
+    return _flush_loop()
@@ -0,0 +1,231 @@
+# Copyright (c) 2016-2019, TDK Electronics
+# All rights reserved.
+#
+# Author: Marek Cieplucha, https://github.com/mciepluc
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met
+# (The BSD 2-Clause License):
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL POTENTIAL VENTURES LTD BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Crash-safe coverage checkpoint log.
+
+A :class:`CoverageCheckpoint` appends checkpoints to a log file: the first
+one contains description of the coverage items and all the bins hit so far,
+next ones only the bins hit since the previous checkpoint (with their
+current hit counts), so the write cost depends on the sampling activity, not
+on the database size. Each checkpoint is a single record ended with a CRC,
+so a checkpoint interrupted by a crash is detected and ignored when loading.
+
+Record layout: length of the record body and CRC32 of the body (two 4-byte
+little-endian integers), followed by the body: length of a JSON header (4
+bytes) and the header (checkpoint type, new coverage items description,
+number of changed bins per item) followed by packed 64-bit positions and
+hit counts of the changed bins.
+
+Classes:
+
+* :class:`CoverageCheckpoint` - writes checkpoints of the coverage database.
+
+Functions:
+
+* :func:`~.load` - rebuilds coverage from the last complete checkpoint.
+"""
+
+from cocotb_coverage import coverage
+from cocotb_coverage import coverage_file
+from cocotb_coverage.coverage_merge import _update_coverage
+
+from collections import OrderedDict
+import array
+import json
+import os
+import struct
+import sys
+import time
+import zlib
+
+MAGIC = b"COCOLOG1"
+_RECORD = struct.Struct("<II")
+_HEADER = struct.Struct("<I")
+
+
+def _packed(values):
+    values = array.array('Q', values)
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values.tobytes()
+
+
+def _unpacked(data):
+    values = array.array('Q', bytes(data))
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values
+
+
+class CoverageCheckpoint(object):
+    """Class writing checkpoints of the coverage database to a log file.
+
+    Checkpoints are written by :meth:`poll` (when due) or :meth:`checkpoint`.
+    In a cocotb testbench, :meth:`run` polls at each simulator timestep.
+
+    Args:
+        filename (str): a name of the log file (overwritten).
+        interval (float, optional): minimum time between checkpoints in
+            seconds (by default ``60.0``).
+        samples (int, optional): write a checkpoint also after a number of
+            sampling events, even if the interval has not elapsed.
+        sync (bool, optional): flush checkpoints to the disk (``fsync``) (by
+            default ``True``).
+        db (:class:`.CoverageDB`, optional): a coverage database (by default
+            :data:`~.coverage_db`).
+
+    Example:
+
+    >>> log = coverage_checkpoint.CoverageCheckpoint("coverage.log",
+    ...                                              interval=300)
+    >>> cocotb.fork(log.run())
+    >>> ...
+    >>> log.close()
+    """
+
+    def __init__(self, filename, interval=60.0, samples=None, sync=True,
+                 db=None):
+        self._db = db if db is not None else coverage.coverage_db
+        self.filename = filename
+        self.interval = interval
+        self.samples = samples
+        self.sync = sync
+        self._db.flush()
+        self._tracker = self._db.track_changes()
+        self._file = open(filename, "wb")
+        self._file.write(MAGIC)
+        self._write("base", [coverage_file._schema(item) for item in
+                             self._db.values()],
+                    coverage_file._hits_of(self._db))
+
+    def _write(self, kind, schemas, hits):
+        header = {"type": kind, "schema": schemas,
+                  "items": [[name, len(counts)] for name, counts in
+                            hits.items()]}
+        chunks = [json.dumps(header).encode()]
+        chunks.insert(0, _HEADER.pack(len(chunks[0])))
+        for counts in hits.values():
+            positions = sorted(counts)
+            chunks.append(_packed(positions))
+            chunks.append(_packed(counts[pos] for pos in positions))
+        body = b"".join(chunks)
+        self._file.write(_RECORD.pack(len(body), zlib.crc32(body)) + body)
+        self._file.flush()
+        if self.sync:
+            os.fsync(self._file.fileno())
+        self._last_time = time.monotonic()
+        self._last_event = coverage._sampling_event
+
+    def poll(self):
+        """Write a checkpoint if the interval (or number of samples)
+        elapsed.
+        """
+        if (time.monotonic() - self._last_time >= self.interval or
+                (self.samples is not None and coverage._sampling_event -
+                 self._last_event >= self.samples)):
+            self.checkpoint()
+
+    def checkpoint(self):
+        """Write bins changed since the last checkpoint."""
+        self._db.flush()
+        hits = self._tracker.changes()
+        new = [coverage_file._schema(item) for item in
+               self._tracker.added_items()]
+        self._write("delta", new, hits)
+
+    def run(self):
+        """Create a cocotb coroutine writing checkpoints (when due) in the
+        read-only phase of each simulator timestep.
+
+        Returns:
+            a coroutine to be forked.
+        """
+        import cocotb
+        from cocotb.triggers import ReadOnly, NextTimeStep
+
+        @cocotb.coroutine
+        def _checkpoint_loop():
+            while self._tracker is not None:
+                yield ReadOnly()
+                self.poll()
+                yield NextTimeStep()
+
+        return _checkpoint_loop()
+
+    def close(self):
+        """Write the last checkpoint and close the log."""
+        if self._tracker is None:
+            return
+        self.checkpoint()
+        self._file.close()
+        self._tracker.close()
+        self._tracker = None
+
+
+def load(filename):
+    """Rebuild coverage from the last complete checkpoint of a log.
+
+    Args:
+        filename (str): a name of the log file.
+
+    Returns:
+        OrderedDict: :class:`~.CoverageRecord` objects by names (may be
+        written to a coverage file by :func:`.coverage_file.write`).
+
+    Example:
+
+    >>> records = coverage_checkpoint.load("coverage.log")
+    >>> coverage_file.write("coverage.cov", list(records.values()))
+    """
+    schemas = OrderedDict()
+    hits = {}
+    with open(filename, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise Exception("%s is not a coverage log file" % filename)
+        while True:
+            record = f.read(_RECORD.size)
+            if len(record) < _RECORD.size:
+                break
+            length, crc = _RECORD.unpack(record)
+            body = f.read(length)
+            if len(body) < length or zlib.crc32(body) != crc:
+                break  # incomplete checkpoint
+            header_length = _HEADER.unpack_from(body)[0]
+            offset = _HEADER.size + header_length
+            header = json.loads(body[_HEADER.size:offset].decode())
+            for schema in header["schema"]:
+                schemas[schema["name"]] = schema
+            for name, count in header["items"]:
+                positions = _unpacked(body[offset:offset + 8 * count])
+                offset += 8 * count
+                counts = _unpacked(body[offset:offset + 8 * count])
+                offset += 8 * count
+                hits.setdefault(name, {}).update(zip(positions, counts))
+    records = coverage_file._build_records(schemas.values(), hits)
+    _update_coverage(records)
+    return records
@@ -0,0 +1,335 @@
+# Copyright (c) 2016-2019, TDK Electronics
+# All rights reserved.
+#
+# Author: Marek Cieplucha, https://github.com/mciepluc
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met
+# (The BSD 2-Clause License):
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL POTENTIAL VENTURES LTD BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Streaming export of the coverage to interchange formats.
+
+The coverage hierarchy is walked depth-first (cover groups before their
+members, siblings sorted by names, case-insensitive) and bins are written
+one by one, so the memory used does not depend on the size of the exported
+coverage (only hit counts of a single coverage item are copied at a time).
+Filters are applied during the walk.
+
+Supported formats:
+
+* ``"json"`` - nested JSON objects (``name``, ``kind``, ``size``,
+  ``coverage``, ``bins`` and ``children``),
+* ``"xml"`` - nested ``<group>``, ``<point>``, ``<cross>`` and ``<check>``
+  elements with ``<bin>`` elements,
+* ``"ucis-like"`` - an XML document following the structure of the UCIS
+  (Unified Coverage Interoperability Standard) XML interchange format:
+  ``instanceCoverages`` per top level cover group, ``covergroupCoverage``
+  per cover group with ``coverpoint`` and ``cross`` elements. Cover checks
+  are exported as cover points with ``PASS`` and ``FAIL`` bins. The
+  document is not validated against the UCIS schema (e.g. the source file
+  and scope information required by the schema is missing), so it is meant
+  for reading the coverage, not for importing it to UCIS compliant tools.
+
+Bins of cover crosses larger than 2**20 cross-bins are not all listed: only
+the hit cross-bins are written, with the number of the other ones
+(``unlisted`` in JSON and XML, the UCIS-like format lists the hit cross-bins
+only).
+
+Functions:
+
+* :func:`~.export` - exports coverage.
+"""
+
+from cocotb_coverage import coverage
+from cocotb_coverage.coverage_report import (_snapshot_record, _iter_bins,
+                                             _unlisted)
+
+from xml.sax.saxutils import quoteattr
+import datetime
+import json
+
+FORMATS = ["json", "xml", "ucis-like"]
+
+
+class _LiveRecords(object):
+    """Records of the coverage database items, created when requested."""
+
+    def __init__(self, db):
+        self._db = db
+        self._last = (None, None)
+
+    def __getitem__(self, name):
+        # the walk looks up an item several times in a row, so the last
+        # snapshot is kept (not to copy its hit counts again)
+        if self._last[0] != name:
+            record = _snapshot_record(self._db[name])
+            if record.kind == "cross":
+                # bins of the cross items, taken once for the cross
+                record._file = dict((item_name, _snapshot_record(
+                    self._db[item_name])) for item_name in record.items)
+            else:
+                record._file = self
+            self._last = (name, record)
+        return self._last[1]
+
+    def __contains__(self, name):
+        return name in self._db
+
+    def __iter__(self):
+        return iter(self._db)
+
+
+class _LiveChildren(object):
+    """Children names of the coverage database items, taken from the prefix
+    tree of the database (so that items out of the exported subtree are not
+    visited).
+    """
+
+    def __init__(self, db):
+        self._db = db
+
+    def get(self, name, default=None):
+        if name is None:
+            return [item._name for item in self._db.find(None)]
+        return [item._name for item in self._db[name]._children]
+
+
+class _Walk(object):
+    """Hierarchy of the exported coverage items and bins filters."""
+
+    def __init__(self, records, prefix, uncovered_only, min_hits):
+        self.records = records
+        if isinstance(records, _LiveRecords):
+            self.children = _LiveChildren(records._db)
+        else:
+            self.children = {}
+            for name in records:
+                parent = name.rsplit(".", 1)[0] if "." in name else None
+                self.children.setdefault(parent, []).append(name)
+            # in the order of the database prefix tree
+            for names in self.children.values():
+                names.sort(key=str.lower)
+        if prefix is None:
+            self.roots = self.children.get(None, [])
+        elif prefix in records:
+            self.roots = [prefix]
+        else:
+            raise Exception("No coverage item %s" % prefix)
+        self.uncovered_only = uncovered_only
+        self.min_hits = min_hits
+
+    def bins(self, record):
+        """Yield (bin, hits) pairs of the record passing the filters."""
+        # bins not hit are listed only if they may pass the filters
+        all_bins = not self.min_hits or self.min_hits <= 0
+        for bin_value, hits in _iter_bins(record, all_bins):
+            if self.uncovered_only and hits >= record.at_least:
+                continue
+            if self.min_hits is not None and hits < self.min_hits:
+                continue
+            yield bin_value, hits
+
+    def unlisted(self, record):
+        """Return number of the bins passing the filters which are not listed
+        (not hit cross-bins of large crosses).
+        """
+        if self.min_hits is not None and self.min_hits > 0:
+            return 0
+        if self.uncovered_only and record.at_least <= 0:
+            return 0
+        return _unlisted(record)
+
+
+def _export_json(f, walk, bins):
+    def item(name, indent):
+        record = walk.records[name]
+        f.write("%s{\"name\": %s, \"kind\": %s, \"size\": %d, "
+                "\"coverage\": %d" % (indent, json.dumps(name),
+                                      json.dumps(record.kind), record.size,
+                                      record.coverage))
+        if bins and record.kind != "group":
+            f.write(", \"bins\": [")
+            for ii, (bin_value, hits) in enumerate(walk.bins(record)):
+                f.write("%s[%s, %d]" % (", " if ii else "",
+                                        json.dumps(repr(bin_value)), hits))
+            f.write("]")
+            if walk.unlisted(record):
+                f.write(", \"unlisted\": %d" % walk.unlisted(record))
+        children = walk.children.get(name, [])
+        if children:
+            f.write(", \"children\": [\n")
+            for ii, child in enumerate(children):
+                if ii:
+                    f.write(",\n")
+                item(child, indent + "  ")
+            f.write("]")
+        f.write("}")
+
+    f.write("[\n")
+    for ii, root in enumerate(walk.roots):
+        if ii:
+            f.write(",\n")
+        item(root, "  ")
+    f.write("\n]\n")
+
+
+def _export_xml(f, walk, bins):
+    def item(name, indent):
+        record = walk.records[name]
+        unlisted = walk.unlisted(record) if bins else 0
+        f.write("%s<%s name=%s size=\"%d\" coverage=\"%d\"%s>\n" % (
+            indent, record.kind, quoteattr(name), record.size,
+            record.coverage,
+            " unlisted=\"%d\"" % unlisted if unlisted else ""))
+        if bins and record.kind != "group":
+            for bin_value, hits in walk.bins(record):
+                f.write("%s  <bin value=%s hits=\"%d\"/>\n" % (
+                    indent, quoteattr(repr(bin_value)), hits))
+        for child in walk.children.get(name, []):
+            item(child, indent + "  ")
+        f.write("%s</%s>\n" % (indent, record.kind))
+
+    f.write("<?xml version=\"1.0\" encoding=\"UTF-8\"?>\n<coverage>\n")
+    for root in walk.roots:
+        item(root, "  ")
+    f.write("</coverage>\n")
+
+
+def _export_ucis_like(f, walk, bins):
+    keys = iter(range(2**63))
+
+    def primitive(record, indent):
+        name = quoteattr(record.name.rsplit(".", 1)[-1])
+        options = "%s  <options weight=\"%d\" at_least=\"%d\"/>\n" % (
+            indent, record.weight, record.at_least)
+        if record.kind == "cross":
+            f.write("%s<cross name=%s key=\"%d\">\n" % (indent, name,
+                                                       next(keys)))
+            f.write(options)
+            for item_name in record.items:
+                f.write("%s  <crossExpr>%s</crossExpr>\n" % (
+                    indent, _escape(item_name.rsplit(".", 1)[-1])))
+            for bin_value, hits in (walk.bins(record) if bins else []):
+                f.write("%s  <crossBin key=\"%d\">\n" % (indent, next(keys)))
+                for value in bin_value:
+                    f.write("%s    <index>%s</index>\n" % (
+                        indent, _escape(repr(value))))
+                f.write("%s    <contents coverageCount=\"%d\"/>\n" % (
+                    indent, hits))
+                f.write("%s  </crossBin>\n" % indent)
+            f.write("%s</cross>\n" % indent)
+            return
+        f.write("%s<coverpoint name=%s key=\"%d\">\n" % (indent, name,
+                                                        next(keys)))
+        f.write(options)
+        for bin_value, hits in (walk.bins(record) if bins else []):
+            f.write("%s  <coverpointBin name=%s type=\"default\" "
+                    "key=\"%d\">\n" % (indent, quoteattr(repr(bin_value)),
+                                       next(keys)))
+            f.write("%s    <contents coverageCount=\"%d\"/>\n" % (indent,
+                                                                 hits))
+            f.write("%s  </coverpointBin>\n" % indent)
+        f.write("%s</coverpoint>\n" % indent)
+
+    def group(name, indent):
+        record = walk.records[name]
+        children = walk.children.get(name, [])
+        f.write("%s<covergroupCoverage name=%s key=\"%d\" size=\"%d\" "
+                "coverage=\"%d\">\n" % (indent, quoteattr(name), next(keys),
+                                        record.size, record.coverage))
+        f.write("%s  <cgInstance name=%s key=\"%d\">\n" % (
+            indent, quoteattr(name), next(keys)))
+        groups = []
+        for child in children:
+            child_record = walk.records[child]
+            if child_record.kind == "group":
+                groups.append(child)
+            else:
+                primitive(child_record, indent + "    ")
+        f.write("%s  </cgInstance>\n" % indent)
+        f.write("%s</covergroupCoverage>\n" % indent)
+        for child in groups:
+            group(child, indent)
+
+    f.write("<?xml version=\"1.0\" encoding=\"UTF-8\"?>\n")
+    f.write("<UCIS ucisVersion=\"1.0\" writtenBy=\"cocotb-coverage\" "
+            "writtenTime=%s>\n" % quoteattr(
+                datetime.datetime.now().replace(microsecond=0).isoformat()))
+    for root in walk.roots:
+        record = walk.records[root]
+        f.write("  <instanceCoverages name=%s key=\"%d\">\n" % (
+            quoteattr(root), next(keys)))
+        if record.kind == "group":
+            group(root, "    ")
+        else:
+            primitive(record, "    ")
+        f.write("  </instanceCoverages>\n")
+    f.write("</UCIS>\n")
+
+
+def _escape(text):
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+_EXPORTERS = {"json": _export_json, "xml": _export_xml,
+              "ucis-like": _export_ucis_like}
+
+
+def export(filename, format="json", source=None, prefix=None, bins=True,
+           uncovered_only=False, min_hits=None):
+    """Export coverage to a file, writing it incrementally.
+
+    Args:
+        filename (str): a name of the file (or a file object).
+        format (str, optional): ``"json"``, ``"xml"`` or ``"ucis-like"``
+            (by default ``"json"``).
+        source (optional): a :class:`.CoverageDB`, an opened coverage file
+            (:class:`.CoverageFile`) or a map of :class:`.CoverageRecord`
+            objects (by default :data:`~.coverage_db`).
+        prefix (str, optional): export only a subtree of this coverage item.
+        bins (bool, optional): export bins (by default ``True``).
+        uncovered_only (bool, optional): export only bins not covered (hit
+            less than ``at_least`` times) (by default ``False``).
+        min_hits (int, optional): export only bins hit at least this number
+            of times.
+
+    Note that ignored cross-bins are known for the coverage database only,
+    cross-bins of the saved coverage are all exported.
+
+    Example:
+
+    >>> coverage_export.export("holes.xml", format="ucis-like",
+    ...                        prefix="top.dma", uncovered_only=True)
+    """
+    if format not in _EXPORTERS:
+        raise Exception("Export format must be one of %s" % FORMATS)
+    if source is None:
+        source = coverage.coverage_db
+    if isinstance(source, coverage.CoverageDB):
+        source.flush()
+        source = _LiveRecords(source)
+    walk = _Walk(source, prefix, uncovered_only, min_hits)
+    if hasattr(filename, "write"):
+        _EXPORTERS[format](filename, walk, bins)
+    else:
+        with open(filename, "w") as f:
+            _EXPORTERS[format](f, walk, bins)
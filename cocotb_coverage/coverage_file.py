@@ -0,0 +1,426 @@
+# Copyright (c) 2016-2019, TDK Electronics
+# All rights reserved.
+#
+# Author: Marek Cieplucha, https://github.com/mciepluc
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met
+# (The BSD 2-Clause License):
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL POTENTIAL VENTURES LTD BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Binary coverage database files.
+
+The coverage database is saved as a header with the coverage items
+description, followed by (page aligned) data: bins of the
+:class:`~.CoverPoint` objects (stored once per cover point, cross-bins are
+derived from the items) and hit counts as packed 64-bit integer arrays
+(``index`` and ``counts`` arrays of the hit cross-bins only for a
+:class:`~.CoverCross`). Bins are decoded only when requested, so opening a
+file (optionally memory-mapped) does not depend on the database size.
+
+Classes:
+
+* :class:`CoverageRecord` - a saved coverage item.
+* :class:`CoverageFile` - an opened coverage database file.
+
+Functions:
+
+* :func:`~.save` - saves the coverage database to a file.
+* :func:`~.load` - opens a coverage database file.
+* :func:`~.write` - writes coverage records to a file.
+"""
+
+from cocotb_coverage import coverage
+
+from collections import OrderedDict
+import array
+import ast
+import json
+import mmap
+import sys
+import weakref
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+MAGIC = b"COCOCOV1"
+PAGE_SIZE = 4096
+
+# encoded bins of the cover points, bins do not change after creation
+_bins_blobs = weakref.WeakKeyDictionary()
+
+
+def _align(offset, alignment):
+    return (offset + alignment - 1) // alignment * alignment
+
+
+def _encode_bins(bins):
+    return json.dumps([repr(b) for b in bins]).encode()
+
+
+def _decode_bin(text):
+    try:
+        return ast.literal_eval(text)
+    except (ValueError, SyntaxError):
+        return text  # not a literal, keep the representation
+
+
+class CoverageRecord(object):
+    """A coverage item saved in (or to be written to) a coverage file.
+
+    Attributes:
+        name (str): a name of the coverage item.
+        kind (str): ``"group"``, ``"point"``, ``"cross"`` or ``"check"``.
+        weight (int): a weight of the coverage primitive.
+        at_least (int): the number of hits per bin to be considered covered.
+        size (int): size of the coverage item.
+        coverage (int): size of the covered bins of the coverage item.
+        bins_count (int): number of bins of a cover point.
+        items (list): names of the cover points of a cover cross.
+        hits: hit counts of the cover point bins or ``[PASS, FAIL]`` counts
+            of a cover check, a sequence of integers.
+        index: indices of the hit cross-bins (sorted) of a cover cross.
+        counts: hit counts of the hit cross-bins of a cover cross.
+    """
+
+    def __init__(self, name, kind, weight=1, at_least=1, size=0, coverage=0,
+                 bins_count=0, items=None, hits=None, index=None, counts=None,
+                 bins_blob=None):
+        self.name = name
+        self.kind = kind
+        self.weight = weight
+        self.at_least = at_least
+        self.size = size
+        self.coverage = coverage
+        self.bins_count = bins_count
+        self.items = items
+        self.hits = hits
+        self.index = index
+        self.counts = counts
+        self._bins_blob = bins_blob
+        self._bins = None
+        self._file = None
+
+    @property
+    def cover_percentage(self):
+        return 100.0 * self.coverage / self.size if self.size else 100.0
+
+    @property
+    def bins(self):
+        """Bins of a cover point (decoded on the first request)."""
+        if self._bins is None and self._bins_blob is not None:
+            self._bins = [_decode_bin(text) for text in
+                          json.loads(bytes(self._bins_blob).decode())]
+        return self._bins
+
+    @property
+    def detailed_coverage(self):
+        """Bins with their hit counts (only the hit cross-bins of a cover
+        cross).
+        """
+        if self.kind == "point":
+            return OrderedDict(zip(self.bins, self.hits))
+        if self.kind == "check":
+            return OrderedDict(zip(["PASS", "FAIL"], self.hits))
+        if self.kind == "cross" and self._file is not None:
+            items = [self._file[name] for name in self.items]
+            strides = [1] * len(items)
+            for ii in range(len(items) - 1, 0, -1):
+                strides[ii - 1] = strides[ii] * items[ii].bins_count
+            detailed = OrderedDict()
+            for index, count in zip(self.index, self.counts):
+                detailed[tuple(item.bins[index // stride % item.bins_count]
+                               for item, stride in zip(items, strides))
+                        ] = count
+            return detailed
+        return OrderedDict()
+
+
+def _record(item):
+    """Return a CoverageRecord of a coverage item of the database."""
+    record = CoverageRecord(item._name, "group", getattr(item, "_weight", 1),
+                            getattr(item, "_at_least", 1), item.size,
+                            item.coverage)
+    if isinstance(item, coverage.CoverPoint):
+        record.kind = "point"
+        record.bins_count = len(item._bins)
+        record.hits = item._hits
+        if item not in _bins_blobs:
+            _bins_blobs[item] = _encode_bins(item._bins)
+        record._bins_blob = _bins_blobs[item]
+    elif isinstance(item, coverage.CoverCross):
+        record.kind = "cross"
+        record.items = list(item._items)
+        record.index = array.array('Q', sorted(item._hits))
+        record.counts = array.array('Q',
+                                    [item._hits[ii] for ii in record.index])
+    elif isinstance(item, coverage.CoverCheck):
+        record.kind = "check"
+        record.hits = array.array('Q', [item._hits["PASS"],
+                                        item._hits["FAIL"]])
+    return record
+
+
+def _schema(item):
+    """Return a description of a coverage item (without hits) as a dict."""
+    record = _record(item)
+    schema = OrderedDict([
+        ("name", record.name), ("kind", record.kind),
+        ("weight", record.weight), ("at_least", record.at_least),
+        ("size", record.size), ("bins_count", record.bins_count),
+        ("items", record.items)
+    ])
+    if record._bins_blob is not None:
+        schema["bins"] = bytes(record._bins_blob).decode()
+    return schema
+
+
+def _hits_of(db):
+    """Return hit counts of the bins hit so far by positions, by names of the 
+    coverage primitives.
+    """
+    hits = {}
+    for name, item in db.items():
+        if isinstance(item, coverage.CoverCross):
+            hits[name] = dict(item._hits)
+        elif isinstance(item, (coverage.CoverPoint, coverage.CoverCheck)):
+            hits[name] = {pos: item._hits_at(pos) for pos in 
+                          range(2 if isinstance(item, coverage.CoverCheck) 
+                                else len(item._hits)) 
+                          if item._hits_at(pos)}
+    return hits
+
+
+def _build_records(schemas, hits):
+    """Return records (coverage not computed) of the items described by
+    schemas, with hit counts given by positions, by names.
+    """
+    records = OrderedDict()
+    for schema in schemas:
+        record = CoverageRecord(
+            schema["name"], schema["kind"], schema["weight"],
+            schema["at_least"], schema["size"], 0, schema["bins_count"],
+            schema["items"])
+        record._file = records
+        if "bins" in schema:
+            record._bins_blob = schema["bins"].encode()
+        counts = hits.get(record.name, {})
+        if record.kind == "point":
+            record.hits = array.array('Q', bytes(8 * record.bins_count))
+        elif record.kind == "check":
+            record.hits = array.array('Q', [0, 0])
+        if record.kind == "cross":
+            record.index = array.array('Q', sorted(counts))
+            record.counts = array.array('Q', [counts[ii] for ii in 
+                                              record.index])
+        else:
+            for pos, count in counts.items():
+                record.hits[pos] = count
+        records[record.name] = record
+    return records
+
+
+def _packed(values):
+    """Return values as bytes of little-endian uint64 integers."""
+    if np is not None and isinstance(values, np.ndarray):
+        return values.astype("<u8", copy=False).tobytes()
+    if not isinstance(values, array.array) or values.typecode != 'Q':
+        values = array.array('Q', values)
+    if sys.byteorder != "little":
+        values = array.array('Q', values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def write(filename, records):
+    """Write coverage records to a file.
+
+    Args:
+        filename (str): a name of the file.
+        records (list): a list of :class:`CoverageRecord` objects.
+    """
+    header = []
+    chunks = []
+    offset = 0
+    for record in records:
+        entry = OrderedDict([
+            ("name", record.name), ("kind", record.kind),
+            ("weight", record.weight), ("at_least", record.at_least),
+            ("size", record.size), ("coverage", record.coverage)
+        ])
+        data = []
+        if record.kind == "point":
+            entry["bins_count"] = record.bins_count
+            data += [("bins", record._bins_blob),
+                     ("hits", _packed(record.hits))]
+        elif record.kind == "check":
+            data += [("hits", _packed(record.hits))]
+        elif record.kind == "cross":
+            entry["items"] = record.items
+            data += [("index", _packed(record.index)),
+                     ("counts", _packed(record.counts))]
+        for key, chunk in data:
+            entry[key] = [offset, len(chunk)]
+            chunks.append(chunk)
+            offset += _align(len(chunk), 8)
+        header.append(entry)
+
+    header = json.dumps({"version": 1, "items": header}).encode()
+    with open(filename, "wb") as f:
+        f.write(MAGIC)
+        f.write(_packed([len(header)]))
+        f.write(header)
+        f.write(bytes(_align(f.tell(), PAGE_SIZE) - f.tell()))
+        for chunk in chunks:
+            f.write(chunk)
+            f.write(bytes(_align(len(chunk), 8) - len(chunk)))
+
+
+def save(filename, db=None):
+    """Save the coverage database to a file.
+
+    Deferred samples are flushed first (see :attr:`.CoverageDB.deferred`).
+
+    Args:
+        filename (str): a name of the file.
+        db (:class:`.CoverageDB`, optional): a coverage database (by default
+            :data:`~.coverage_db`).
+
+    Example:
+
+    >>> coverage_file.save("coverage.cov")
+    """
+    if db is None:
+        db = coverage.coverage_db
+    db.flush()
+    write(filename, [_record(db[name]) for name in db])
+
+
+class CoverageFile(object):
+    """An opened coverage database file, a read-only map of the
+    :class:`CoverageRecord` objects with item name string as a key.
+
+    Hit counts are exposed as ``memoryview`` objects over the file contents
+    (byte order permitting), so they are not copied.
+
+    Args:
+        filename (str): a name of the file.
+        memory_map (bool, optional): map the file into memory instead of
+            reading it (by default ``False``).
+    """
+
+    def __init__(self, filename, memory_map=False):
+        self.filename = filename
+        self._mmap = None
+        with open(filename, "rb") as f:
+            if memory_map:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                buffer = memoryview(self._mmap)
+            else:
+                buffer = memoryview(f.read())
+        if bytes(buffer[:len(MAGIC)]) != MAGIC:
+            raise Exception("%s is not a coverage database file" % filename)
+        length = self._array(buffer[8:16])[0]
+        header = json.loads(bytes(buffer[16:16 + length]).decode())
+        data = buffer[_align(16 + length, PAGE_SIZE):]
+
+        self._records = OrderedDict()
+        for entry in header["items"]:
+            chunks = {key: data[entry[key][0]:entry[key][0] + entry[key][1]]
+                      for key in ["bins", "hits", "index", "counts"]
+                      if key in entry}
+            record = CoverageRecord(
+                entry["name"], entry["kind"], entry["weight"],
+                entry["at_least"], entry["size"], entry["coverage"],
+                entry.get("bins_count", 0), entry.get("items"),
+                *[self._array(chunks[key]) if key in chunks else None
+                  for key in ["hits", "index", "counts"]],
+                bins_blob=chunks.get("bins"))
+            record._file = self
+            self._records[record.name] = record
+
+    @staticmethod
+    def _array(chunk):
+        if sys.byteorder == "little":
+            return chunk.cast('Q')
+        values = array.array('Q', bytes(chunk))
+        values.byteswap()
+        return values
+
+    def __getitem__(self, name):
+        return self._records[name]
+
+    def __contains__(self, name):
+        return name in self._records
+
+    def __iter__(self):
+        return iter(self._records)
+
+    def __len__(self):
+        return len(self._records)
+
+    def keys(self):
+        return self._records.keys()
+
+    def values(self):
+        return self._records.values()
+
+    def items(self):
+        return self._records.items()
+
+    def close(self):
+        """Release the file contents (memory-mapped file is closed, records
+        should not be used afterwards).
+        """
+        self._records = OrderedDict()
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                pass  # still exported, closed when released
+            self._mmap = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def load(filename, memory_map=False):
+    """Open a coverage database file saved by :func:`~.save`.
+
+    Args:
+        filename (str): a name of the file.
+        memory_map (bool, optional): map the file into memory instead of
+            reading it (by default ``False``).
+
+    Returns:
+        :class:`CoverageFile`: the opened file.
+
+    Example:
+
+    >>> with coverage_file.load("coverage.cov", memory_map=True) as cov:
+    ...     print(cov["top.parent.coverpoint1"].detailed_coverage)
+    """
+    return CoverageFile(filename, memory_map)
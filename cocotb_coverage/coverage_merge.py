@@ -0,0 +1,248 @@
+# Copyright (c) 2016-2019, TDK Electronics
+# All rights reserved.
+#
+# Author: Marek Cieplucha, https://github.com/mciepluc
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met
+# (The BSD 2-Clause License):
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL POTENTIAL VENTURES LTD BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Merging of coverage database files.
+
+Coverage files saved by :func:`.coverage_file.save` (e.g. by multiple runs
+of the same testbench with different seeds) are merged by summing hit counts
+of the same bins. Items existing in some of the files only are merged as
+well (sizes of the cover groups are recomputed), but items with the same
+name must have the same bins (and weight, ``at_least`` and size). Hit arrays
+are added with NumPy if available. Many files are merged in a tree over a
+pool of processes.
+
+Functions:
+
+* :func:`~.merge_files` - merges coverage files into records.
+* :func:`~.merge` - merges coverage files into a new file, in parallel.
+
+May be called as a command line tool::
+
+    python -m cocotb_coverage.coverage_merge -o merged.cov run1.cov run2.cov
+"""
+
+from cocotb_coverage import coverage_file
+
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import array
+import operator
+import os
+import shutil
+import tempfile
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def _check_compatible(merged, record):
+    """Raise an exception if the bins schema of the records is different."""
+    attrs = ["kind", "weight", "at_least", "size", "bins_count", "items"]
+    if merged.kind == "group":
+        # cover groups may have different members in the files, their sizes
+        # are recomputed after merging
+        attrs.remove("size")
+    for attr in attrs:
+        if getattr(merged, attr) != getattr(record, attr):
+            raise Exception("Cannot merge %s, different %s: %s and %s" % (
+                record.name, attr, getattr(merged, attr),
+                getattr(record, attr)))
+    if (merged._bins_blob is not None and
+            bytes(merged._bins_blob) != bytes(record._bins_blob)):
+        raise Exception("Cannot merge %s, different bins" % record.name)
+
+
+def _copy(values):
+    if np is not None:
+        return np.array(values, dtype=np.uint64)
+    return array.array('Q', values)
+
+
+def _add(values, other):
+    if np is not None:
+        values += np.frombuffer(other, dtype=np.uint64)
+        return values
+    return array.array('Q', map(operator.add, values, other))
+
+
+def _add_sparse(index, counts, other_index, other_counts):
+    """Sum hit counts of the sorted cross-bins indices."""
+    if np is not None:
+        index = np.concatenate(
+            [index, np.frombuffer(other_index, dtype=np.uint64)])
+        counts = np.concatenate(
+            [counts, np.frombuffer(other_counts, dtype=np.uint64)])
+        merged_index, inverse = np.unique(index, return_inverse=True)
+        merged_counts = np.zeros(len(merged_index), dtype=np.uint64)
+        np.add.at(merged_counts, inverse.reshape(-1), counts)
+        return merged_index, merged_counts
+    hits = dict(zip(index, counts))
+    for ii, count in zip(other_index, other_counts):
+        hits[ii] = hits.get(ii, 0) + count
+    merged_index = array.array('Q', sorted(hits))
+    return merged_index, array.array('Q', [hits[ii] for ii in merged_index])
+
+
+def _accumulate(merged, cov):
+    """Add records of the opened coverage file to the merged records."""
+    for name, record in cov.items():
+        if name not in merged:
+            copy = coverage_file.CoverageRecord(
+                name, record.kind, record.weight, record.at_least,
+                record.size, record.coverage, record.bins_count,
+                record.items)
+            copy._file = merged  # cross-bins are resolved by merged items
+            if record._bins_blob is not None:
+                copy._bins_blob = bytes(record._bins_blob)
+            if record.hits is not None:
+                copy.hits = _copy(record.hits)
+            if record.index is not None:
+                copy.index = _copy(record.index)
+                copy.counts = _copy(record.counts)
+            merged[name] = copy
+            continue
+        acc = merged[name]
+        _check_compatible(acc, record)
+        if record.hits is not None:
+            acc.hits = _add(acc.hits, record.hits)
+        if record.index is not None:
+            acc.index, acc.counts = _add_sparse(acc.index, acc.counts,
+                                                record.index, record.counts)
+
+
+def _update_coverage(merged):
+    """Recompute coverage of the merged records, sizes and coverage of the
+    cover groups are sums of their primitives.
+    """
+    for record in merged.values():
+        if record.kind == "group":
+            record.size = record.coverage = 0
+    for record in merged.values():
+        if record.kind == "group":
+            continue
+        if record.kind == "check":
+            passed, failed = record.hits[0], record.hits[1]
+            covered = failed == 0 and passed > record.at_least
+            record.coverage = record.weight if covered else 0
+        elif record.at_least <= 0:
+            record.coverage = record.size
+        else:
+            hits = record.hits if record.kind == "point" else record.counts
+            if np is not None:
+                covered = int(np.count_nonzero(
+                    np.asarray(hits) >= record.at_least))
+            else:
+                covered = sum(1 for count in hits if count >= record.at_least)
+            record.coverage = record.weight * covered
+        # update parents
+        name = record.name
+        while "." in name:
+            name = name.rsplit(".", 1)[0]
+            if name in merged and merged[name].kind == "group":
+                merged[name].size += record.size
+                merged[name].coverage += record.coverage
+
+
+def merge_files(filenames):
+    """Merge coverage files (serially).
+
+    Args:
+        filenames (list): names of the coverage files.
+
+    Returns:
+        OrderedDict: merged :class:`~.CoverageRecord` objects by names.
+    """
+    merged = OrderedDict()
+    for filename in filenames:
+        with coverage_file.load(filename, memory_map=True) as cov:
+            _accumulate(merged, cov)
+    _update_coverage(merged)
+    return merged
+
+
+def _merge_to_file(filenames, output):
+    coverage_file.write(output, list(merge_files(filenames).values()))
+    return output
+
+
+def merge(filenames, output, processes=None, fan_in=8):
+    """Merge coverage files into a new coverage file.
+
+    Groups of ``fan_in`` files are merged in parallel into temporary files,
+    which are merged further in the same way, until a single file remains.
+
+    Args:
+        filenames (list): names of the coverage files.
+        output (str): a name of the merged coverage file.
+        processes (int, optional): number of processes (by default number of
+            CPUs).
+        fan_in (int, optional): number of files merged by a single task (by
+            default ``8``).
+
+    Example:
+
+    >>> coverage_merge.merge(glob.glob("runs/*.cov"), "merged.cov")
+    """
+    if len(filenames) == 0:
+        raise Exception("No coverage files to merge")
+    fan_in = max(fan_in, 2)
+    tmp = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(output)))
+    try:
+        with ProcessPoolExecutor(processes) as pool:
+            level = 0
+            while len(filenames) > fan_in:
+                groups = [filenames[ii:ii + fan_in] for ii in
+                          range(0, len(filenames), fan_in)]
+                outputs = [os.path.join(tmp, "%d_%d.cov" % (level, ii))
+                           for ii in range(len(groups))]
+                filenames = list(pool.map(_merge_to_file, groups, outputs))
+                level += 1
+        _merge_to_file(filenames, output)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Merge cocotb-coverage database files")
+    parser.add_argument("files", nargs="+", help="coverage files to merge")
+    parser.add_argument("-o", "--output", required=True,
+                        help="merged coverage file")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="number of processes (default: number of CPUs)")
+    parser.add_argument("--fan-in", type=int, default=8,
+                        help="number of files merged by a single task")
+    args = parser.parse_args(argv)
+    merge(args.files, args.output, args.jobs, args.fan_in)
+
+
+if __name__ == '__main__':
+    main()
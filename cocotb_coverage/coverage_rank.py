@@ -0,0 +1,274 @@
+# Copyright (c) 2016-2019, TDK Electronics
+# All rights reserved.
+#
+# Author: Marek Cieplucha, https://github.com/mciepluc
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met
+# (The BSD 2-Clause License):
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL POTENTIAL VENTURES LTD BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Ranking of coverage database files (test runs).
+
+Finds a small subset of runs reaching the same coverage as all the runs
+together, using a greedy set cover: the run covering most of the bins not
+covered yet is selected at each step. A bin is covered by a run if it has
+been hit at least ``at_least`` times in that run. Covered bins of each run
+are kept as integer bitsets (one per bins weight, cross-bins are numbered
+when covered in any run, so large sparse crosses take only a bit per
+covered cross-bin), gains are re-evaluated lazily (a gain of a run may only
+decrease when other runs are selected).
+Bitsets exceeding the memory limit are not cached, but rebuilt from the
+(memory-mapped) file when needed.
+
+Cover checks are ranked as they are merged (see :mod:`.coverage_merge`): a
+check failed in any of the ranked runs is not covered, so no run gains it.
+
+Functions:
+
+* :func:`~.rank` - ranks coverage files.
+
+May be called as a command line tool::
+
+    python -m cocotb_coverage.coverage_rank runs/*.cov
+"""
+
+from cocotb_coverage import coverage_file
+from cocotb_coverage.coverage_merge import _check_compatible
+
+import argparse
+import heapq
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+if hasattr(int, "bit_count"):
+    _popcount = int.bit_count
+else:
+    def _popcount(bits):
+        return bin(bits).count("1")
+
+
+class _BinsLayout(object):
+    """Assigns bitset positions to bins of the coverage items, so that bins
+    of all the runs are numbered in the same way.
+
+    Bins of the cover points and checks get consecutive positions. Cross-bins
+    get positions when covered in any run, so bitsets do not depend on the
+    cross sizes.
+    """
+
+    def __init__(self):
+        self.records = {}  # item name: (first record, bitset offset)
+        self.cross_positions = {}  # cross name: {cross-bin index: position}
+        self.sizes = {}  # weight: number of bins
+        self.total = 0  # total (weighted) size of the primitives
+        self.failed = {}  # weight: bitset of the checks failed in any run
+
+    def _register(self, record):
+        if record.name in self.records:
+            first, offset = self.records[record.name]
+            _check_compatible(first, record)
+            return offset
+        if record.kind == "cross":
+            offset = None
+            self.cross_positions[record.name] = {}
+        else:
+            count = record.bins_count if record.kind == "point" else 1
+            offset = self.sizes.get(record.weight, 0)
+            self.sizes[record.weight] = offset + count
+        self.total += record.size
+        # keep the schema only, not the hit counts
+        first = coverage_file.CoverageRecord(
+            record.name, record.kind, record.weight, record.at_least,
+            record.size, 0, record.bins_count, record.items,
+            bins_blob=(bytes(record._bins_blob) if
+                       record._bins_blob is not None else None))
+        self.records[record.name] = (first, offset)
+        return offset
+
+    def positions(self, record, covered):
+        """Return bitset positions of the covered bins of the record."""
+        offset = self._register(record)
+        if offset is not None:
+            if np is not None:
+                return np.asarray(covered, dtype=np.int64) + offset
+            return [offset + pos for pos in covered]
+        cross_positions = self.cross_positions[record.name]
+        positions = []
+        for index in (covered.tolist() if hasattr(covered, "tolist") else
+                      covered):
+            pos = cross_positions.get(index)
+            if pos is None:
+                pos = self.sizes.get(record.weight, 0)
+                self.sizes[record.weight] = pos + 1
+                cross_positions[index] = pos
+            positions.append(pos)
+        return (np.asarray(positions, dtype=np.int64) if np is not None else
+                positions)
+
+    def fail(self, record):
+        """Mark the check as failed (not covered by any run)."""
+        offset = self._register(record)
+        self.failed[record.weight] = (self.failed.get(record.weight, 0) |
+                                      1 << offset)
+
+
+def _positions(record):
+    """Return positions of the bins covered in the record."""
+    if record.kind == "check":
+        passed, failed = record.hits[0], record.hits[1]
+        return [0] if failed == 0 and passed > record.at_least else []
+    if record.kind == "point":
+        hits, positions = record.hits, None
+    else:
+        hits, positions = record.counts, record.index
+    if record.at_least <= 0:
+        # all bins covered from the beginning, no run contributes
+        return []
+    if np is not None:
+        covered = np.flatnonzero(
+            np.frombuffer(hits, dtype=np.uint64) >= record.at_least)
+        if positions is not None:
+            covered = np.frombuffer(positions, dtype=np.uint64)[covered]
+        return covered.astype(np.int64)
+    covered = [ii for ii, count in enumerate(hits) if count >= record.at_least]
+    if positions is not None:
+        covered = [positions[ii] for ii in covered]
+    return covered
+
+
+def _bitset(positions, size):
+    """Return an integer bitset of the bins positions."""
+    if np is not None:
+        bits = np.zeros(size, dtype=np.uint8)
+        bits[np.asarray(positions, dtype=np.int64)] = 1
+        return int.from_bytes(np.packbits(bits, bitorder="little").tobytes(),
+                              "little")
+    bits = bytearray((size + 7) // 8)
+    for pos in positions:
+        bits[pos >> 3] |= 1 << (pos & 7)
+    return int.from_bytes(bytes(bits), "little")
+
+
+def _run_bitsets(filename, layout):
+    """Return bitsets of the covered bins of the run by bins weights."""
+    positions = {}
+    with coverage_file.load(filename, memory_map=True) as cov:
+        for record in cov.values():
+            if record.kind == "group":
+                continue
+            if record.kind == "check" and record.hits[1] > 0:
+                layout.fail(record)
+            covered = layout.positions(record, _positions(record))
+            if len(covered) > 0:
+                positions.setdefault(record.weight, []).append(covered)
+    return {weight: _bitset(np.concatenate(pos) if np is not None else
+                            [p for part in pos for p in part],
+                            layout.sizes[weight])
+            for weight, pos in positions.items()}
+
+
+def _gain(bitsets, covered):
+    return sum(weight * _popcount(bits & ~covered.get(weight, 0))
+               for weight, bits in bitsets.items())
+
+
+def rank(filenames, memory_limit=256 * 2**20):
+    """Rank coverage files by their contribution to the total coverage.
+
+    Args:
+        filenames (list): names of the coverage files.
+        memory_limit (int, optional): memory (in bytes) for cached bitsets of
+            the runs (by default 256 MB).
+
+    Returns:
+        tuple: a list of the selected ``(filename, gain)`` pairs in order of
+        selection, where gain is the coverage added by the run (in weighted
+        bins), and the total size of the coverage primitives.
+
+    Example:
+
+    >>> selected, size = coverage_rank.rank(glob.glob("runs/*.cov"))
+    >>> for filename, gain in selected:
+    ...     print(filename, gain)
+    """
+    layout = _BinsLayout()
+    cache = {}
+    cached_size = 0
+    heap = []
+    for ii, filename in enumerate(filenames):
+        bitsets = _run_bitsets(filename, layout)
+        gain = _gain(bitsets, {})
+        if gain == 0:
+            continue
+        size = sum((bits.bit_length() + 7) // 8 for bits in bitsets.values())
+        if cached_size + size <= memory_limit:
+            cache[ii] = bitsets
+            cached_size += size
+        heapq.heappush(heap, (-gain, ii))
+
+    # checks failed in any run count as covered, so that no run gains them
+    covered = dict(layout.failed)
+    selected = []
+    while heap:
+        _, ii = heapq.heappop(heap)
+        bitsets = cache.get(ii)
+        if bitsets is None:
+            bitsets = _run_bitsets(filenames[ii], layout)
+        gain = _gain(bitsets, covered)
+        if gain == 0:
+            cache.pop(ii, None)
+            continue
+        # gains only decrease, so the run is the best if not worse than the
+        # upper bound of the next one
+        if heap and gain < -heap[0][0]:
+            heapq.heappush(heap, (-gain, ii))
+            continue
+        for weight, bits in bitsets.items():
+            covered[weight] = covered.get(weight, 0) | bits
+        selected.append((filenames[ii], gain))
+        cache.pop(ii, None)
+    return selected, layout.total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Rank cocotb-coverage database files")
+    parser.add_argument("files", nargs="+", help="coverage files to rank")
+    parser.add_argument("--memory-limit", type=int, default=256,
+                        help="memory for cached bitsets in MB")
+    args = parser.parse_args(argv)
+    selected, size = rank(args.files, args.memory_limit * 2**20)
+    total = 0
+    for ii, (filename, gain) in enumerate(selected):
+        total += gain
+        print("%5d %10d %8.2f%% %s" % (ii + 1, gain,
+                                       100.0 * total / size if size else 100.0,
+                                       filename))
+    print("%d of %d runs selected" % (len(selected), len(args.files)))
+
+
+if __name__ == '__main__':
+    main()
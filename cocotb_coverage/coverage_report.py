@@ -0,0 +1,260 @@
+# Copyright (c) 2016-2019, TDK Electronics
+# All rights reserved.
+#
+# Author: Marek Cieplucha, https://github.com/mciepluc
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met
+# (The BSD 2-Clause License):
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL POTENTIAL VENTURES LTD BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Coverage reports written in the background.
+
+The coverage database is copied first (a snapshot: copies of the hit arrays,
+bins are shared as they never change), then the report is formatted and
+written by a worker thread, while the simulation continues. Note that the
+worker shares the interpreter lock with the simulation, so it uses the
+time when the simulation waits for the simulator. Bins of cover crosses
+larger than 2**20 cross-bins are not all listed: only the hit cross-bins
+and the number of the other ones (``unlisted``) are written.
+
+Reports are written in order of the requests. Each request returns a
+``concurrent.futures.Future`` (may be awaited in asyncio code using
+``asyncio.wrap_future``).
+
+Functions:
+
+* :func:`~.snapshot` - copies the coverage database.
+* :func:`~.write_report` - writes a report in the background.
+"""
+
+from cocotb_coverage import coverage
+from cocotb_coverage import coverage_file
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from xml.sax.saxutils import quoteattr
+import itertools
+import json
+
+FORMATS = ["text", "json", "xml"]
+
+# a single worker, so that reports are written in order of the requests
+_executor = None
+
+# crosses with more cross-bins list only cross-bins which have been hit
+_MAX_LISTED_BINS = 2**20
+
+
+def _snapshot_record(item):
+    """Return a CoverageRecord with copies of the hit counts of the item."""
+    record = coverage_file.CoverageRecord(
+        item._name, "group", getattr(item, "_weight", 1),
+        getattr(item, "_at_least", 1), item.size, item.coverage)
+    if isinstance(item, coverage.CoverPoint):
+        record.kind = "point"
+        record.bins_count = len(item._bins)
+        record.hits = item._hits[:]
+        record._bins = item._bins
+    elif isinstance(item, coverage.CoverCross):
+        record.kind = "cross"
+        record.items = list(item._items)
+        # sorted when formatting
+        record.index = list(item._hits.keys())
+        record.counts = list(item._hits.values())
+        # ignore patterns do not change
+        record._ignored = item._is_ignored
+    elif isinstance(item, coverage.CoverCheck):
+        record.kind = "check"
+        record.hits = [item._hits["PASS"], item._hits["FAIL"]]
+    return record
+
+
+def snapshot(db=None):
+    """Copy hit counts of the coverage database.
+
+    Deferred samples are flushed first (see :attr:`.CoverageDB.deferred`).
+
+    Args:
+        db (:class:`.CoverageDB`, optional): a coverage database (by default
+            :data:`~.coverage_db`).
+
+    Returns:
+        OrderedDict: :class:`~.CoverageRecord` objects by names, in order of
+        :meth:`.CoverageDB.walk`.
+    """
+    if db is None:
+        db = coverage.coverage_db
+    db.flush()
+    records = OrderedDict()
+    for name, item in db.walk():
+        record = _snapshot_record(item)
+        record._file = records
+        records[name] = record
+    return records
+
+
+def _x_size(record):
+    size = 1
+    for name in record.items:
+        size *= record._file[name].bins_count
+    return size
+
+
+def _unlisted(record):
+    """Return number of the cross-bins of a record not listed by 
+    :func:`_iter_bins` (cross-bins not hit of the crosses too large to list
+    all their cross-bins).
+    """
+    if record.kind != "cross" or _x_size(record) <= _MAX_LISTED_BINS:
+        return 0
+    total = record.size // record.weight if record.weight else _x_size(record)
+    return total - len(record.index)
+
+
+def _iter_bins(record, all_bins=True):
+    """Yield (bin, hits) pairs of a coverage record. All bins of the cover
+    crosses are listed (except ignored ones, if known), or the hit ones only.
+    Crosses larger than ``_MAX_LISTED_BINS`` list the hit cross-bins only 
+    (see :func:`_unlisted`).
+    """
+    if record.kind in ("point", "check"):
+        for pair in record.detailed_coverage.items():
+            yield pair
+    elif record.kind == "cross":
+        hits = dict(zip(record.index, record.counts))
+        items = [record._file[name] for name in record.items]
+        if not all_bins or _x_size(record) > _MAX_LISTED_BINS:
+            for index in sorted(hits):
+                yield _cross_bin(index, items), hits[index]
+            return
+        ignored = getattr(record, "_ignored", None)
+        pos_lists = [range(item.bins_count) for item in items]
+        for index, x_pos in enumerate(itertools.product(*pos_lists)):
+            if ignored is None or not ignored(index, x_pos):
+                yield (tuple(item.bins[pos] for item, pos in
+                             zip(items, x_pos)), hits.get(index, 0))
+
+
+def _cross_bin(index, items):
+    x_bins = []
+    for item in reversed(items):
+        index, pos = divmod(index, item.bins_count)
+        x_bins.append(item.bins[pos])
+    return tuple(reversed(x_bins))
+
+
+def _write_text(f, records, bins):
+    for name, record in records.items():
+        indent = "   " * name.count(".")
+        f.write(indent + "%s : %s, coverage=%d, size=%d \n" % (
+            name, record.kind, record.coverage, record.size))
+        if bins and record.kind != "group":
+            for bin_value, hits in _iter_bins(record):
+                f.write(indent + "   BIN %s : %s\n" % (bin_value, hits))
+            if _unlisted(record):
+                f.write(indent + "   ... %d cross-bins not hit\n" % 
+                        _unlisted(record))
+
+
+def _write_json(f, records, bins):
+    f.write("{")
+    for ii, (name, record) in enumerate(records.items()):
+        f.write("%s\n  %s: {\"kind\": %s, \"size\": %d, \"coverage\": %d, "
+                "\"cover_percentage\": %s" % (
+                    "," if ii else "", json.dumps(name),
+                    json.dumps(record.kind), record.size, record.coverage,
+                    json.dumps(record.cover_percentage)))
+        if bins and record.kind != "group":
+            f.write(", \"bins\": [")
+            for jj, (bin_value, hits) in enumerate(_iter_bins(record)):
+                f.write("%s[%s, %d]" % (", " if jj else "",
+                                        json.dumps(repr(bin_value)), hits))
+            f.write("]")
+            if _unlisted(record):
+                f.write(", \"unlisted\": %d" % _unlisted(record))
+        f.write("}")
+    f.write("\n}\n")
+
+
+def _write_xml(f, records, bins):
+    f.write("<?xml version=\"1.0\" encoding=\"UTF-8\"?>\n<coverage>\n")
+    for name, record in records.items():
+        f.write("  <item name=%s kind=%s size=\"%d\" coverage=\"%d\"" % (
+            quoteattr(name), quoteattr(record.kind), record.size,
+            record.coverage))
+        if not bins or record.kind == "group":
+            f.write("/>\n")
+            continue
+        if _unlisted(record):
+            f.write(" unlisted=\"%d\"" % _unlisted(record))
+        f.write(">\n")
+        for bin_value, hits in _iter_bins(record):
+            f.write("    <bin value=%s hits=\"%d\"/>\n" % (
+                quoteattr(repr(bin_value)), hits))
+        f.write("  </item>\n")
+    f.write("</coverage>\n")
+
+
+_WRITERS = {"text": _write_text, "json": _write_json, "xml": _write_xml}
+
+
+def _write(filename, records, format, bins):
+    with open(filename, "w") as f:
+        _WRITERS[format](f, records, bins)
+    return filename
+
+
+def write_report(filename, format="text", bins=False, callback=None,
+                 db=None):
+    """Write a coverage report in the background.
+
+    Args:
+        filename (str): a name of the report file.
+        format (str, optional): ``"text"``, ``"json"`` or ``"xml"`` (by
+            default ``"text"``). The text format is indented by the
+            hierarchy like :func:`~.reportCoverage`, but each line has the
+            item kind instead of the coverage object and only hit cross-bins
+            of large crosses are listed.
+        bins (bool, optional): write bins details (by default ``False``).
+        callback (func, optional): a function called with the future when
+            the report is written.
+        db (:class:`.CoverageDB`, optional): a coverage database (by default
+            :data:`~.coverage_db`).
+
+    Returns:
+        ``concurrent.futures.Future``: a future of the report file name.
+
+    Example:
+
+    >>> coverage_report.write_report("coverage.xml", format="xml", bins=True,
+    ...     callback=lambda future: log.info("written %s", future.result()))
+    """
+    global _executor
+    if format not in _WRITERS:
+        raise Exception("Report format must be one of %s" % FORMATS)
+    records = snapshot(db)
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=1)
+    future = _executor.submit(_write, filename, records, format, bins)
+    if callback is not None:
+        future.add_done_callback(callback)
+    return future
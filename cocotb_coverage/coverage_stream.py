@@ -0,0 +1,393 @@
+# Copyright (c) 2016-2019, TDK Electronics
+# All rights reserved.
+#
+# Author: Marek Cieplucha, https://github.com/mciepluc
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met
+# (The BSD 2-Clause License):
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL POTENTIAL VENTURES LTD BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Live coverage streaming.
+
+A :class:`CoverageStreamer` sends bins hit since the last push (with their
+current hit counts) to a :class:`CoverageCollector` over a Unix socket. The
+socket is non-blocking: data which cannot be sent is buffered and changes
+which do not fit into the buffer are merged and sent later, so the
+simulation never waits for the collector. The collector merges feeds of many
+simulations (runs) and may save the merged coverage to a file.
+
+Messages are JSON objects preceded by their length (4 bytes, big endian):
+
+* ``hello`` - a run identifier and description of the coverage items,
+* ``delta`` - changed bins positions and hit counts of the coverage items (
+  and description of the new items),
+* ``bye`` - the end of the run.
+
+Classes:
+
+* :class:`CoverageStreamer` - streams coverage of the simulation.
+* :class:`CoverageCollector` - collects coverage of many simulations.
+
+The collector may be started as a command line tool::
+
+    python -m cocotb_coverage.coverage_stream /tmp/coverage.sock
+"""
+
+from cocotb_coverage import coverage
+from cocotb_coverage import coverage_file
+from cocotb_coverage.coverage_merge import _update_coverage
+
+from collections import OrderedDict
+import argparse
+import json
+import logging
+import os
+import selectors
+import socket
+import struct
+import time
+
+_LENGTH = struct.Struct(">I")
+
+_log = logging.getLogger(__name__)
+
+
+def _message(**fields):
+    data = json.dumps(fields).encode()
+    return _LENGTH.pack(len(data)) + data
+
+
+class CoverageStreamer(object):
+    """Class streaming coverage changes to a collector.
+
+    Changes are pushed by :meth:`poll` (when due) or :meth:`push`. In a
+    cocotb testbench, :meth:`run` polls at each simulator timestep.
+
+    Args:
+        address (str): a path of the Unix socket of the collector.
+        run (str, optional): an identifier of the run (by default host name
+            and process id).
+        interval (float, optional): minimum time between pushes in seconds
+            (by default ``1.0``).
+        samples (int, optional): push also after a number of sampling events,
+            even if the interval has not elapsed.
+        max_buffer (int, optional): size of the send buffer in bytes, changes
+            are kept (merged) while the buffer is full (by default 16 MB).
+        db (:class:`.CoverageDB`, optional): a coverage database (by default
+            :data:`~.coverage_db`).
+
+    Example:
+
+    >>> streamer = coverage_stream.CoverageStreamer("/tmp/coverage.sock")
+    >>> cocotb.fork(streamer.run())
+    >>> ...
+    >>> streamer.close()
+    """
+
+    def __init__(self, address, run=None, interval=1.0, samples=None,
+                 max_buffer=2**24, db=None):
+        self._db = db if db is not None else coverage.coverage_db
+        self._address = address
+        self.run_id = run or "%s:%d" % (socket.gethostname(), os.getpid())
+        self.interval = interval
+        self.samples = samples
+        self.max_buffer = max_buffer
+        self._tracker = self._db.track_changes()
+        self._unsent = {}  # changes not in the buffer yet
+        self._out = bytearray()
+        self._known = set()  # items described to the collector
+        self._socket = None
+        self._last_time = time.monotonic()
+        self._last_event = coverage._sampling_event
+        self._db.flush()
+        self._connect()
+
+    def _connect(self):
+        """Try to connect (without waiting), the collector gets the full
+        state of the run after connecting.
+        """
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.setblocking(False)
+        try:
+            sock.connect(self._address)
+        except OSError:
+            sock.close()
+            return
+        self._socket = sock
+        self._known = set()
+        self._out = bytearray()
+        # the full state includes the changes tracked so far
+        self._tracker.changes()
+        self._unsent = coverage_file._hits_of(self._db)
+        self._out += _message(
+            type="hello", run=self.run_id,
+            items=[coverage_file._schema(item) for item in self._db.values()])
+        self._known.update(self._db)
+
+    def poll(self):
+        """Push changes if the interval (or number of samples) elapsed."""
+        now = time.monotonic()
+        if (now - self._last_time >= self.interval or
+                (self.samples is not None and coverage._sampling_event -
+                 self._last_event >= self.samples)):
+            self.push()
+
+    def push(self):
+        """Send changes to the collector (as much as possible without
+        blocking).
+        """
+        self._last_time = time.monotonic()
+        self._last_event = coverage._sampling_event
+        self._db.flush()
+        if self._socket is None:
+            # changes are not collected while disconnected, the state is 
+            # taken once after connecting
+            self._connect()
+            if self._socket is None:
+                return
+        else:
+            for name, hits in self._tracker.changes().items():
+                self._unsent.setdefault(name, {}).update(hits)
+        if self._unsent and len(self._out) < self.max_buffer:
+            new = [coverage_file._schema(self._db[name]) for name in 
+                   self._unsent if name not in self._known]
+            self._known.update(self._unsent)
+            self._out += _message(
+                type="delta", run=self.run_id, schema=new,
+                items={name: [[pos, count] for pos, count in hits.items()]
+                       for name, hits in self._unsent.items()})
+            self._unsent = {}
+        self._send()
+
+    def _send(self):
+        try:
+            while self._out:
+                sent = self._socket.send(self._out)
+                del self._out[:sent]
+        except (BlockingIOError, InterruptedError):
+            pass  # collector busy, try next time
+        except OSError:
+            # collector gone, reconnect later
+            self._socket.close()
+            self._socket = None
+
+    def run(self):
+        """Create a cocotb coroutine pushing changes (when due) in the
+        read-only phase of each simulator timestep.
+
+        Returns:
+            a coroutine to be forked.
+        """
+        import cocotb
+        from cocotb.triggers import ReadOnly, NextTimeStep
+
+        @cocotb.coroutine
+        def _stream_loop():
+            while self._tracker is not None:
+                yield ReadOnly()
+                self.poll()
+                yield NextTimeStep()
+
+        return _stream_loop()
+
+    def close(self):
+        """Push the remaining changes and stop streaming."""
+        if self._tracker is None:
+            return
+        self.push()
+        if self._socket is not None:
+            self._out += _message(type="bye", run=self.run_id)
+            self._send()
+            self._socket.close()
+            self._socket = None
+        self._tracker.close()
+        self._tracker = None
+
+
+class CoverageCollector(object):
+    """Class collecting coverage streamed by many simulations.
+
+    Hit counts of all the runs are summed. Coverage items with the same name
+    must be the same in all the runs (except for members of the cover 
+    groups), a connection sending a different item or a malformed message is
+    logged and closed.
+
+    Args:
+        address (str): a path of the Unix socket to listen on (removed when
+            closed).
+
+    Example:
+
+    >>> collector = coverage_stream.CoverageCollector("/tmp/coverage.sock")
+    >>> while running:
+    ...     collector.poll(timeout=1.0)
+    ...     print(collector.records()["top"].cover_percentage)
+    >>> coverage_file.write("merged.cov", collector.records().values())
+    """
+
+    def __init__(self, address):
+        self._address = address
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(address)
+        self._server.listen()
+        self._server.setblocking(False)
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self._server, selectors.EVENT_READ)
+        self._buffers = {}  # connection: received data
+        self.schema = OrderedDict()  # item name: description
+        self.runs = OrderedDict()  # run: {item name: {position: hits}}
+        self.finished = set()  # runs which said bye
+
+    def poll(self, timeout=0):
+        """Accept connections and process received messages.
+
+        Args:
+            timeout (float, optional): maximum time to wait for data in
+                seconds (by default ``0``).
+        """
+        for key, _ in self._selector.select(timeout):
+            if key.fileobj is self._server:
+                conn, _ = self._server.accept()
+                conn.setblocking(False)
+                self._selector.register(conn, selectors.EVENT_READ)
+                self._buffers[conn] = bytearray()
+                continue
+            conn = key.fileobj
+            try:
+                data = conn.recv(2**20)
+            except (BlockingIOError, InterruptedError):
+                continue
+            except OSError:
+                data = b""
+            if not data:
+                self._drop(conn)
+                continue
+            buffer = self._buffers[conn]
+            buffer += data
+            try:
+                while len(buffer) >= _LENGTH.size:
+                    length = _LENGTH.unpack_from(buffer)[0]
+                    if len(buffer) < _LENGTH.size + length:
+                        break
+                    message = json.loads(bytes(
+                        buffer[_LENGTH.size:_LENGTH.size + length]).decode())
+                    del buffer[:_LENGTH.size + length]
+                    self._handle(message)
+            except Exception as e:
+                # a broken feed must not stop collecting the other ones
+                _log.warning("Dropping coverage stream connection: %s", e)
+                self._drop(conn)
+
+    def _drop(self, conn):
+        self._selector.unregister(conn)
+        conn.close()
+        del self._buffers[conn]
+
+    def _handle(self, message):
+        run = message["run"]
+        for schema in message.get("items" if message["type"] == "hello"
+                                  else "schema", []):
+            self._add_schema(schema)
+        if message["type"] == "hello":
+            self.runs[run] = {}
+            self.finished.discard(run)
+        elif message["type"] == "delta":
+            hits = self.runs.setdefault(run, {})
+            for name, changes in message["items"].items():
+                hits.setdefault(name, {}).update(
+                    (pos, count) for pos, count in changes)
+        elif message["type"] == "bye":
+            self.finished.add(run)
+
+    def _add_schema(self, schema):
+        known = self.schema.get(schema["name"])
+        if known is None:
+            self.schema[schema["name"]] = schema
+        elif any(known.get(key) != schema.get(key) for key in
+                 ["kind", "weight", "at_least", "size", "bins"]
+                 # runs may have different members of the cover groups
+                 if key != "size" or known["kind"] != "group"):
+            raise Exception("Item %s differs between runs" % schema["name"])
+
+    def records(self):
+        """Return coverage merged over all the runs.
+
+        Returns:
+            OrderedDict: :class:`~.CoverageRecord` objects by names.
+        """
+        total = {}
+        for hits in self.runs.values():
+            for name, counts in hits.items():
+                total_counts = total.setdefault(name, {})
+                for pos, count in counts.items():
+                    total_counts[pos] = total_counts.get(pos, 0) + count
+        records = coverage_file._build_records(self.schema.values(), total)
+        _update_coverage(records)
+        return records
+
+    def close(self):
+        """Close all the connections and remove the socket."""
+        for conn in list(self._buffers):
+            conn.close()
+        self._buffers = {}
+        self._selector.close()
+        self._server.close()
+        try:
+            os.unlink(self._address)
+        except OSError:
+            pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Collect coverage streamed by cocotb simulations")
+    parser.add_argument("address", help="Unix socket path")
+    parser.add_argument("--interval", type=float, default=10.0,
+                        help="coverage summary interval in seconds")
+    parser.add_argument("-o", "--output",
+                        help="coverage file saved at each summary")
+    args = parser.parse_args(argv)
+    collector = CoverageCollector(args.address)
+    try:
+        last = time.monotonic()
+        while True:
+            collector.poll(timeout=0.1)
+            if time.monotonic() - last >= args.interval:
+                last = time.monotonic()
+                records = collector.records()
+                tops = [record for name, record in records.items()
+                        if "." not in name]
+                print("%d runs (%d finished): %s" % (
+                    len(collector.runs), len(collector.finished),
+                    ", ".join("%s %.2f%%" % (record.name,
+                                             record.cover_percentage)
+                              for record in tops)))
+                if args.output:
+                    coverage_file.write(args.output, list(records.values()))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        collector.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+'''Copyright (c) 2019, TDK Electronics
+All rights reserved.
+
+Author: Marek Cieplucha, https://github.com/mciepluc
+
+Redistribution and use in source and binary forms, with or without modification,
+are permitted provided that the following conditions are met (The BSD 2-Clause
+License):
+
+1. Redistributions of source code must retain the above copyright notice,
+this list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation and/or
+other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL POTENTIAL VENTURES LTD BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE. '''
+
+"""
+Functional coverage sampling benchmark.
+
+Builds synthetic coverage models using the public coverage API and measures
+construction time, sampling throughput, peak memory and reporting time.
+Does not need cocotb nor a simulator, just run it by:
+
+PYTHONPATH=../.. python coverage_benchmark.py
+
+Each configuration runs in a separate process, so that results do not
+depend on models of the previous configurations. Results are printed (or
+written with --output) as JSON, so they can be compared between versions
+with --compare.
+"""
+from cocotb_coverage import coverage
+
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+# variants of the cover points bins matching, range bins only if supported
+# by the installed version (so that older versions can be compared)
+VARIANTS = ["eq", "rel", "inj"]
+if hasattr(coverage, "split_range"):
+    VARIANTS.append("ranges")
+
+
+def build_model(prefix, points, bins, arity, depth, variant, checks):
+    """Create a coverage model and return a function sampling it with a tuple
+    of cover points values.
+    """
+    items = []
+    names = []
+    for ii in range(points):
+        # spread the cover points over a binary hierarchy of cover groups
+        path = [prefix] + ["g%d_%d" % (level, (ii >> level) & 1)
+                           for level in range(depth)]
+        name = ".".join(path + ["point%d" % ii])
+        names.append(name)
+        xf = lambda values, ii=ii : values[ii]
+
+        if variant == "eq":
+            item = coverage.CoverPoint(name, xf=xf, bins=list(range(bins)))
+        elif variant == "rel":
+            item = coverage.CoverPoint(name, xf=xf, bins=list(range(bins)),
+                                       rel=lambda val, b : val == b)
+        elif variant == "inj":
+            # overlapping ranges, a value hits up to two bins
+            item = coverage.CoverPoint(name, xf=xf,
+                bins=[(b, b + 1) for b in range(bins)],
+                rel=lambda val, b : b[0] <= val <= b[1], inj=True)
+        else:
+            item = coverage.CoverPoint(name, xf=xf,
+                bins=coverage.split_range(0, bins - 1, bins), ranges=True)
+        items.append(item)
+
+    if arity > 1:
+        for ii in range(0, points - arity + 1, arity):
+            items.append(coverage.CoverCross(
+                "%s.cross%d" % (prefix, ii), items=names[ii:ii + arity]))
+
+    for ii in range(checks):
+        items.append(coverage.CoverCheck(
+            "%s.check%d" % (prefix, ii),
+            f_fail=lambda values, ii=ii : values[ii % points] < 0,
+            f_pass=lambda values, ii=ii : values[ii % points] >= 0))
+
+    @coverage.coverageSection(*items)
+    def sample(values):
+        pass
+
+    return sample
+
+
+def run(args, variant):
+    """Run a single benchmark configuration, return a dict of results."""
+    prefix = "bench_%s" % variant
+    rnd = random.Random(args.seed)
+    stimulus = [tuple(rnd.randrange(args.bins) for _ in range(args.points))
+                for _ in range(args.samples)]
+
+    start = time.perf_counter()
+    sample = build_model(prefix, args.points, args.bins, args.arity,
+                         args.depth, variant, args.checks)
+    construction_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for values in stimulus:
+        sample(values)
+    sampling_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    coverage.reportCoverage(lambda line : None, bins=True)
+    report_time = time.perf_counter() - start
+
+    # memory is traced in a separate pass (with a copy of the model), as
+    # tracing slows down the sampling several times
+    tracemalloc.start()
+    sample = build_model(prefix + "_memory", args.points, args.bins,
+                         args.arity, args.depth, variant, args.checks)
+    for values in stimulus:
+        sample(values)
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "variant": variant,
+        "construction_time": construction_time,
+        "sampling_time": sampling_time,
+        "samples_per_sec": args.samples / sampling_time,
+        "peak_memory": peak_memory,
+        "report_time": report_time,
+        "coverage": coverage.coverage_db[prefix].cover_percentage,
+    }
+
+
+def run_isolated(args, variant):
+    """Run a single benchmark configuration in a new process, so that the
+    coverage database contains only models of this configuration (reporting
+    prints the whole database).
+    """
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        return executor.submit(run, args, variant).result()
+
+
+def compare(results, baseline):
+    """Print ratios of the results to the baseline results."""
+    base = {res["variant"]: res for res in baseline["results"]}
+    for res in results["results"]:
+        if res["variant"] not in base:
+            continue
+        ref = base[res["variant"]]
+        print("%-8s" % res["variant"] + "".join(
+            "  %s: %.2fx" % (key, res[key] / ref[key]) for key in
+            ["construction_time", "samples_per_sec", "peak_memory",
+             "report_time"] if ref[key]))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Functional coverage sampling benchmark")
+    parser.add_argument("--points", type=int, default=16,
+                        help="number of cover points")
+    parser.add_argument("--bins", type=int, default=64,
+                        help="number of bins per cover point")
+    parser.add_argument("--arity", type=int, default=2,
+                        help="number of cover points per cross (<2: none)")
+    parser.add_argument("--depth", type=int, default=3,
+                        help="depth of the cover groups hierarchy")
+    parser.add_argument("--checks", type=int, default=4,
+                        help="number of cover checks")
+    parser.add_argument("--samples", type=int, default=10000,
+                        help="number of sampling events")
+    parser.add_argument("--variant", choices=VARIANTS, action="append",
+                        help="bins matching variant (default: all)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write JSON results to a file")
+    parser.add_argument("--compare",
+                        help="JSON results of a baseline to compare with")
+    args = parser.parse_args(argv)
+    for key in ["points", "bins", "samples"]:
+        if getattr(args, key) < 1:
+            parser.error("--%s must be positive" % key)
+    for key in ["depth", "checks"]:
+        if getattr(args, key) < 0:
+            parser.error("--%s must not be negative" % key)
+
+    results = {
+        "python": platform.python_version(),
+        "config": {key: getattr(args, key) for key in
+                   ["points", "bins", "arity", "depth", "checks", "samples",
+                    "seed"]},
+        "results": [run_isolated(args, variant) for variant in
+                    (args.variant or VARIANTS)],
+    }
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
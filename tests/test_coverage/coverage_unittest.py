@@ -30,9 +30,23 @@ SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE. '''
 Constrained-random verification features unittest.
 """
 from cocotb_coverage import coverage
+from cocotb_coverage import coverage_file
+from cocotb_coverage import coverage_merge
+from cocotb_coverage import coverage_rank
+from cocotb_coverage import coverage_stream
+from cocotb_coverage import coverage_checkpoint
+from cocotb_coverage import coverage_report
+from cocotb_coverage import coverage_export
 
 import unittest
 import random
+import os
+import tempfile
+import socket
+import json
+import io
+import functools
+from xml.etree import ElementTree
 
 class TestCoverage(unittest.TestCase):
 
@@ -221,6 +235,1448 @@ class TestCoverage(unittest.TestCase):
         self.assertTrue(cb1_fired[0])
         self.assertTrue(cb2_fired[0])
         self.assertTrue(cb3_fired[0])
+
+    #test incrementally maintained coverage level
+    def test_coverage_counter(self):
+        print("Running test_coverage_counter")
+
+        @coverage.CoverPoint("t7.c1", vname="x", bins = list(range(20)), weight = 3, at_least = 2)
+        @coverage.CoverPoint("t7.c2", vname="y", bins = list(range(5)))
+        @coverage.CoverCross("t7.cross", items = ["t7.c1","t7.c2"], at_least = 3)
+        def sample(x, y):
+            pass
+
+        for _ in range(200):
+            sample(random.randint(0, 25), random.randint(0, 5))
+            #coverage must always be equal to the one computed from bins
+            for name in ["t7.c1", "t7.c2", "t7.cross"]:
+                item = coverage.coverage_db[name]
+                covered = [hits >= item._at_least for hits in item.detailed_coverage.values()]
+                self.assertTrue(item.coverage == item._weight * sum(covered))
+
+        self.assertTrue(coverage.coverage_db["t7"].coverage == 
+          sum(coverage.coverage_db[name].coverage for name in ["t7.c1", "t7.c2", "t7.cross"]))
+
+    #test equality bins matched by the hash lookup
+    def test_equality_bins_lookup(self):
+        print("Running test_equality_bins_lookup")
+
+        class Unhashable():
+            def __init__(self, value):
+                self.value = value
+            def __eq__(self, other):
+                return self.value == other
+
+        @coverage.CoverPoint("t8.c1", vname="x", bins = [True, False, "a", (1, 2)])
+        @coverage.CoverPoint("t8.c2", vname="x", bins = list(range(4096)), inj = True)
+        def sample(x):
+            pass
+
+        sample(1) #matches True bin (1 == True)
+        self.assertTrue(coverage.coverage_db["t8.c1"].new_hits == [True])
+        self.assertTrue(coverage.coverage_db["t8.c1"].detailed_coverage[True] == 1)
+        self.assertTrue(coverage.coverage_db["t8.c2"].new_hits == [1])
+        sample((1, 2))
+        self.assertTrue(coverage.coverage_db["t8.c1"].new_hits == [(1, 2)])
+        self.assertTrue(coverage.coverage_db["t8.c2"].new_hits == [])
+        sample(Unhashable("a")) #unhashable, matched by the linear scan
+        self.assertTrue(coverage.coverage_db["t8.c1"].new_hits == ["a"])
+        sample(Unhashable(4095))
+        self.assertTrue(coverage.coverage_db["t8.c2"].new_hits == [4095])
+        sample([1, 2]) #list not equal to any bin
+        self.assertTrue(coverage.coverage_db["t8.c1"].new_hits == [])
+        self.assertTrue(coverage.coverage_db["t8.c1"].coverage == 3)
+        self.assertTrue(coverage.coverage_db["t8.c2"].coverage == 2)
+
+    #test range bins
+    def test_range_bins(self):
+        print("Running test_range_bins")
+
+        @coverage.CoverPoint("t9.addr", vname="addr", bins = coverage.split_range(0, 2**32 - 1, 256), ranges = True)
+        @coverage.CoverPoint("t9.len", vname="length", bins = [(100, 1499), (0, 63), (64, 99)], ranges = True)
+        def sample(addr, length):
+            pass
+
+        self.assertTrue(coverage.coverage_db["t9.addr"].size == 256)
+        self.assertTrue(coverage.coverage_db["t9.len"].size == 3)
+        sample(0, 1500) #length out of range
+        self.assertTrue(coverage.coverage_db["t9.addr"].new_hits == [(0, 2**24 - 1)])
+        self.assertTrue(coverage.coverage_db["t9.len"].new_hits == [])
+        sample(2**32 - 1, 64)
+        self.assertTrue(coverage.coverage_db["t9.addr"].new_hits == [(2**32 - 2**24, 2**32 - 1)])
+        self.assertTrue(coverage.coverage_db["t9.len"].new_hits == [(64, 99)])
+        sample(2**32, 1499) #address out of range
+        self.assertTrue(coverage.coverage_db["t9.addr"].new_hits == [])
+        self.assertTrue(coverage.coverage_db["t9.len"].new_hits == [(100, 1499)])
+        sample(2**24, 0)
+        self.assertTrue(coverage.coverage_db["t9.addr"].coverage == 3)
+        self.assertTrue(coverage.coverage_db["t9.len"].coverage == 3)
+        #bins keep the order of definition
+        self.assertTrue(list(coverage.coverage_db["t9.len"].detailed_coverage) == 
+          [(100, 1499), (0, 63), (64, 99)])
+        self.assertTrue(coverage.coverage_db["t9.addr"].detailed_coverage[(2**24, 2**25 - 1)] == 1)
+
+        #uneven split, last range gets the remainder
+        self.assertTrue(coverage.split_range(1, 10, 4) == [(1, 2), (3, 4), (5, 6), (7, 10)])
+        #overlapping ranges are not allowed
+        with self.assertRaises(Exception):
+            coverage.CoverPoint("t9.overlap", bins = [(0, 10), (10, 20)], ranges = True)
+        #empty range bins are not allowed
+        with self.assertRaises(Exception):
+            coverage.CoverPoint("t9.empty", bins = [], ranges = True)
+        self.assertTrue("t9.empty" not in coverage.coverage_db)
+
+        #detailed coverage is kept up to date
+        detailed = coverage.coverage_db["t9.len"].detailed_coverage
+        sample(0, 10)
+        self.assertTrue(detailed is coverage.coverage_db["t9.len"].detailed_coverage)
+        self.assertTrue(detailed[(0, 63)] == 2)
+
+    #test sampling of values batches
+    def test_sample_many(self):
+        print("Running test_sample_many")
+
+        def is_divider(number, divider):
+            return number % divider == 0
+
+        @coverage.CoverPoint("t10.c1", vname="x", bins = list(range(16)), at_least = 3)
+        @coverage.CoverPoint("t10.c2", vname="y", bins = coverage.split_range(0, 255, 4), ranges = True)
+        @coverage.CoverPoint("t10.c3", vname="x", rel = is_divider, bins = [2, 3, 5], inj = True)
+        @coverage.CoverCross("t10.cross", items = ["t10.c1", "t10.c2"], ign_bins = [(0, None)])
+        def sample(x, y):
+            pass
+
+        @coverage.CoverPoint("t10b.c1", vname="x", bins = list(range(16)), at_least = 3)
+        @coverage.CoverPoint("t10b.c2", vname="y", bins = coverage.split_range(0, 255, 4), ranges = True)
+        @coverage.CoverPoint("t10b.c3", vname="x", rel = is_divider, bins = [2, 3, 5], inj = True)
+        @coverage.CoverCross("t10b.cross", items = ["t10b.c1", "t10b.c2"], ign_bins = [(0, None)])
+        def sample_ref(x, y):
+            pass
+
+        cb_fired = [0]
+        def bins_callback():
+            cb_fired[0] += 1
+        coverage.coverage_db["t10.c1"].add_bins_callback(bins_callback, 7)
+
+        xs = [random.randint(0, 20) for _ in range(500)]
+        ys = [random.randint(0, 300) for _ in range(500)]
+        for x, y in zip(xs, ys):
+            sample_ref(x, y)
+
+        coverage.coverage_db["t10.c1"].sample_many(xs)
+        coverage.coverage_db["t10.c2"].sample_many(ys)
+        coverage.coverage_db["t10.c3"].sample_many(xs)
+        coverage.coverage_db["t10.cross"].sample_many(list(zip(xs, ys)))
+
+        #batch sampling gives the same result as sampling one by one
+        for name in ["c1", "c2", "c3", "cross"]:
+            self.assertTrue(dict(coverage.coverage_db["t10." + name].detailed_coverage) == 
+              dict(coverage.coverage_db["t10b." + name].detailed_coverage))
+            self.assertTrue(coverage.coverage_db["t10." + name].coverage == 
+              coverage.coverage_db["t10b." + name].coverage)
+        self.assertTrue(coverage.coverage_db["t10"].coverage == coverage.coverage_db["t10b"].coverage)
+        #callback called once per batch
+        self.assertTrue(cb_fired[0] == (1 if 7 in xs else 0))
+        self.assertTrue(set(coverage.coverage_db["t10.c1"].new_hits) == set(x for x in xs if x < 16))
+
+        #values and bins not converted exactly by NumPy are matched one by one
+        wide = coverage.split_range(0, 2**64 - 1, 256)
+        @coverage.CoverPoint("t10.wide", vname="x", bins = wide, ranges = True)
+        @coverage.CoverPoint("t10.mixed", vname="x", bins = [2**53 + 1, 0.5])
+        def sample_wide(x):
+            pass
+
+        @coverage.CoverPoint("t10b.wide", vname="x", bins = wide, ranges = True)
+        @coverage.CoverPoint("t10b.mixed", vname="x", bins = [2**53 + 1, 0.5])
+        def sample_wide_ref(x):
+            pass
+
+        values = [2**56 - 1, 0, 2**63 + 5, 2**64 - 1, 2**53 + 1, 0.5]
+        for x in values:
+            sample_wide_ref(x)
+        for batch in [values[:2], values[2:4], values[4:]]:
+            coverage.coverage_db["t10.wide"].sample_many(batch)
+            coverage.coverage_db["t10.mixed"].sample_many(batch)
+        for name in ["wide", "mixed"]:
+            self.assertTrue(coverage.coverage_db["t10." + name].detailed_coverage == 
+              coverage.coverage_db["t10b." + name].detailed_coverage)
+        self.assertTrue(coverage.coverage_db["t10.wide"].detailed_coverage[wide[0]] == 4)
+        self.assertTrue(coverage.coverage_db["t10.mixed"].coverage == 2)
+
+        #values equal to each other are matched one by one with a custom relation
+        def same_repr(value, bins):
+            return repr(value) == bins
+
+        @coverage.CoverPoint("t10.repr", vname="x", rel = same_repr, bins = ["1", "1.0", "True"])
+        @coverage.CoverPoint("t10.eq", vname="x", bins = [1, 2])
+        @coverage.CoverCross("t10.repr_cross", items = ["t10.repr", "t10.eq"])
+        def sample_repr(x):
+            pass
+
+        @coverage.CoverPoint("t10b.repr", vname="x", rel = same_repr, bins = ["1", "1.0", "True"])
+        @coverage.CoverPoint("t10b.eq", vname="x", bins = [1, 2])
+        @coverage.CoverCross("t10b.repr_cross", items = ["t10b.repr", "t10b.eq"])
+        def sample_repr_ref(x):
+            pass
+
+        values = [1, 1.0, True]
+        for x in values:
+            sample_repr_ref(x)
+        coverage.coverage_db["t10.repr"].sample_many(values)
+        coverage.coverage_db["t10.eq"].sample_many(values)
+        coverage.coverage_db["t10.repr_cross"].sample_many([(x, x) for x in values])
+        for name in ["repr", "eq", "repr_cross"]:
+            self.assertTrue(dict(coverage.coverage_db["t10." + name].detailed_coverage) == 
+              dict(coverage.coverage_db["t10b." + name].detailed_coverage))
+        self.assertTrue(coverage.coverage_db["t10.repr"].detailed_coverage == {"1": 1, "1.0": 1, "True": 1})
+
+    #test cross-bins indexing
+    def test_covercross_index(self):
+        print("Running test_covercross_index")
+
+        cb_fired = [0]
+        def bins_callback():
+            cb_fired[0] += 1
+
+        @coverage.CoverPoint("t11.c1", xf = lambda x, y, z : x, bins = list(range(64)))
+        @coverage.CoverPoint("t11.c2", xf = lambda x, y, z : y, bins = ["a", "b", "c"])
+        @coverage.CoverPoint("t11.c3", xf = lambda x, y, z : z, bins = coverage.split_range(0, 1023, 64), ranges = True)
+        @coverage.CoverCross("t11.cross", items = ["t11.c1", "t11.c2", "t11.c3"], 
+          ign_bins = [(None, "b", None), (1, "a", (0, 15))])
+        def sample(x, y, z):
+            pass
+
+        coverage.coverage_db["t11.cross"].add_bins_callback(bins_callback, (63, "c", (1008, 1023)))
+
+        self.assertTrue(coverage.coverage_db["t11.cross"].size == 64 * 3 * 64 - 64 * 64 - 1)
+        sample(1, "a", 0) #ignored
+        self.assertTrue(coverage.coverage_db["t11.cross"].new_hits == [])
+        sample(1, "b", 0) #ignored
+        self.assertTrue(coverage.coverage_db["t11.cross"].new_hits == [])
+        sample(63, "c", 1023)
+        self.assertTrue(coverage.coverage_db["t11.cross"].new_hits == [(63, "c", (1008, 1023))])
+        sample(2, "a", 16)
+        self.assertTrue(coverage.coverage_db["t11.cross"].new_hits == [(2, "a", (16, 31))])
+        self.assertTrue(coverage.coverage_db["t11.cross"].coverage == 2)
+        self.assertTrue(cb_fired[0] == 1)
+        detailed_coverage = coverage.coverage_db["t11.cross"].detailed_coverage
+        self.assertTrue(len(detailed_coverage) == 64 * 3 * 64 - 64 * 64 - 1)
+        self.assertTrue(detailed_coverage[(2, "a", (16, 31))] == 1)
+        self.assertTrue((1, "a", (0, 15)) not in detailed_coverage)
+        #detailed coverage is kept up to date
+        sample(2, "a", 17)
+        sample(1, "a", 0) #ignored
+        self.assertTrue(detailed_coverage is coverage.coverage_db["t11.cross"].detailed_coverage)
+        self.assertTrue(detailed_coverage[(2, "a", (16, 31))] == 2)
+        self.assertTrue((1, "a", (0, 15)) not in detailed_coverage)
+
+        #ignore bins must have a bins per item
+        for ign_bins in [(1, "a"), (1, "a", None, None)]:
+            with self.assertRaises(Exception):
+                coverage.CoverCross("t11.bad_cross", items = ["t11.c1", "t11.c2", "t11.c3"], 
+                  ign_bins = [ign_bins])
+
+    #test large sparse cross with ignore bins patterns
+    def test_covercross_sparse(self):
+        print("Running test_covercross_sparse")
+
+        @coverage.CoverPoint("t12.c1", xf = lambda x, y, z : x, bins = list(range(256)))
+        @coverage.CoverPoint("t12.c2", xf = lambda x, y, z : y, bins = list(range(256)))
+        @coverage.CoverPoint("t12.c3", xf = lambda x, y, z : z, bins = list(range(256)))
+        @coverage.CoverCross("t12.cross", items = ["t12.c1", "t12.c2", "t12.c3"], 
+          ign_bins = [(0, None, None), (None, 0, None), (1, 1, 1), (0, 0, 0), (None, 300, None)])
+        def sample(x, y, z):
+            pass
+
+        #256^3 minus 2 planes overlapping in a line, minus single bin
+        self.assertTrue(coverage.coverage_db["t12.cross"].size == 256**3 - 2 * 256**2 + 256 - 1)
+        for ii in range(100):
+            sample(ii, ii, 255 - ii)
+        sample(5, 5, 250) #hit again
+        sample(5, 0, 250) #ignored
+        sample(1, 1, 1) #ignored
+        self.assertTrue(coverage.coverage_db["t12.cross"].coverage == 99)
+        #only hit cross-bins are stored
+        self.assertTrue(len(coverage.coverage_db["t12.cross"]._hits) == 99)
+        self.assertTrue(coverage.coverage_db["t12.cross"]._hits[
+          coverage.coverage_db["t12.cross"]._index((5, 5, 250))] == 2)
+
+    #test threshold callbacks crossed at once
+    def test_threshold_callbacks_order(self):
+        print("Running test_threshold_callbacks_order")
+
+        fired = []
+
+        @coverage.CoverPoint("t13.c1", vname="x", bins = list(range(10)))
+        def sample(x):
+            pass
+
+        for threshold in [50, 10, 90, 20]:
+            coverage.coverage_db["t13.c1"].add_threshold_callback(
+              lambda threshold=threshold: fired.append(("c1", threshold)), threshold)
+            coverage.coverage_db["t13"].add_threshold_callback(
+              lambda threshold=threshold: fired.append(("t13", threshold)), threshold)
+
+        coverage.coverage_db["t13.c1"].sample_many(list(range(6))) #60% at once
+        self.assertTrue(fired == [("t13", 10), ("t13", 20), ("t13", 50), 
+                                  ("c1", 10), ("c1", 20), ("c1", 50)])
+        sample(0)
+        sample(1)
+        self.assertTrue(len(fired) == 6) #each callback fired once
+        #threshold already exceeded is not fired
+        coverage.coverage_db["t13.c1"].add_threshold_callback(
+          lambda: fired.append(("c1", 30)), 30)
+        for x in range(10):
+            sample(x)
+        self.assertTrue(fired[6:] == [("t13", 90), ("c1", 90)])
+        coverage.coverage_db["t13"].add_threshold_callback(
+          lambda: fired.append(("t13", 30)), 30)
+        self.assertTrue(len(fired) == 8)
+
+        #thresholds crossed again after new items dilute the coverage (25%)
+        @coverage.CoverPoint("t13.c2", vname="x", bins = list(range(30)))
+        def sample_c2(x):
+            pass
+
+        for x in range(30):
+            sample_c2(x)
+        self.assertTrue(fired[8:] == [("t13", 30), ("t13", 50), ("t13", 90)])
+
+    #test lazy coverage aggregation in cover groups
+    def test_lazy_aggregation(self):
+        print("Running test_lazy_aggregation")
+
+        fired = []
+        coverage.coverage_db.lazy_aggregation = True
+        try:
+            @coverage.CoverPoint("t14.a.b.c1", vname="x", bins = list(range(10)))
+            @coverage.CoverPoint("t14.a.c2", vname="x", bins = list(range(20)))
+            @coverage.CoverCheck("t14.d.check", f_fail = lambda x : x > 100, f_pass = lambda x : True)
+            def sample(x):
+                pass
+
+            coverage.coverage_db["t14.a"].add_threshold_callback(lambda: fired.append(x), 50)
+
+            for x in range(7):
+                sample(x)
+                #group with waiting threshold callback is up to date
+                self.assertFalse(coverage.coverage_db["t14.a"]._dirty)
+            #group without callbacks is not
+            self.assertTrue(coverage.coverage_db["t14"]._dirty)
+            for x in range(7, 15):
+                sample(x)
+            #callback fired when 50% (15 of 30 bins) reached
+            self.assertTrue(fired == [7])
+            self.assertTrue(coverage.coverage_db["t14.a.b"].coverage == 10)
+            self.assertTrue(coverage.coverage_db["t14"].coverage == 26)
+            sample(1000) #check failed
+            self.assertTrue(coverage.coverage_db["t14"].coverage == 25)
+        finally:
+            coverage.coverage_db.lazy_aggregation = False
+
+        sample(16)
+        self.assertTrue(coverage.coverage_db["t14.a"].coverage == 26)
+        self.assertTrue(coverage.coverage_db["t14"].coverage == 26)
+
+    class Driver():
+        def __init__(self):
+            self.ready = True
+
+        @property
+        def handle(self):
+            raise Exception("simulator handle must not be accessed")
+
+        @coverage.CoverPoint("t15.data", vname="data", bins = list(range(4)))
+        @coverage.CoverPoint("t15.self_xf", xf = lambda self, data : self.ready and data, bins = [0, 1])
+        @coverage.CoverCheck("t15.check", f_fail = lambda data : data > 3, f_pass = lambda data : data == 3)
+        def send(self, data):
+            pass
+
+        @coverage.CoverPoint("t15.this", bins = list(range(4)))
+        def send_this(this, data):
+            pass
+
+        @coverage.CoverPoint("t15.this_outer", bins = list(range(4)))
+        @coverage.CoverPoint("t15.this_inner", bins = list(range(4)))
+        def send_this_stacked(this, data):
+            pass
+
+        @staticmethod
+        @coverage.CoverPoint("t15.static", bins = [1, 2])
+        def send_static(data):
+            pass
+
+        @staticmethod
+        @coverage.CoverPoint("t15.static_xf", xf = lambda data : data + 1, bins = [1, 2])
+        def send_static_xf(data):
+            pass
+
+    #test binding resolved when decorating
+    def test_method_binding(self):
+        print("Running test_method_binding")
+
+        drv = self.Driver()
+        for data in [0, 1, 3, 3, 3]:
+            drv.send(data)
+        self.assertTrue(coverage.coverage_db["t15.data"].coverage == 3)
+        self.assertTrue(coverage.coverage_db["t15.self_xf"].coverage == 2)
+        self.assertTrue(coverage.coverage_db["t15.check"].coverage == 1)
+        #undetermined check result does not count as failure
+        self.assertTrue(coverage.coverage_db["t15.check"].detailed_coverage["FAIL"] == 0)
+        self.assertTrue(coverage.coverage_db["t15"].coverage == 6)
+        drv.send(4)
+        self.assertTrue(coverage.coverage_db["t15.check"].coverage == 0)
+        self.assertTrue(coverage.coverage_db["t15"].coverage == 5)
+        #instance argument not named self
+        for data in [0, 2, 2]:
+            drv.send_this(data)
+        self.assertTrue(coverage.coverage_db["t15.this"].coverage == 2)
+        #stacked decorators, instance argument not named self
+        for data in [1, 3]:
+            drv.send_this_stacked(data)
+        self.assertTrue(coverage.coverage_db["t15.this_outer"].coverage == 2)
+        self.assertTrue(coverage.coverage_db["t15.this_inner"].coverage == 2)
+        #static methods called on the class and on the instance
+        self.Driver.send_static(1)
+        drv.send_static(2)
+        self.assertTrue(coverage.coverage_db["t15.static"].coverage == 2)
+        self.Driver.send_static_xf(0)
+        self.assertTrue(coverage.coverage_db["t15.static_xf"].coverage == 1)
+        self.assertTrue(coverage.coverage_db["t15.static_xf"].detailed_coverage[1] == 1)
+
+    #test coverage section
+    def test_coverage_section(self):
+        print("Running test_coverage_section")
+
+        section = coverage.coverageSection(
+          coverage.CoverPoint("t16.c1", xf = lambda x, y : x, bins = list(range(4))),
+          coverage.CoverPoint("t16.c2", vname = "y", bins = list(range(4))),
+          coverage.CoverCross("t16.cross", items = ["t16.c1", "t16.c2"]),
+          coverage.CoverCheck("t16.check", f_fail = lambda x, y : x > 10),
+        )
+
+        @section
+        def sample(x, y):
+            return x + y
+
+        self.assertTrue(sample(1, 2) == 3)
+        self.assertTrue(sample.__name__ == "sample")
+        self.assertTrue(coverage.coverage_db["t16.cross"].new_hits == [(1, 2)])
+
+        #cross listed before its items is sampled after them
+        cross_first = coverage.coverageSection(
+          coverage.CoverCross("t16.cross", items = ["t16.c1", "t16.c2"]),
+          coverage.CoverPoint("t16.c1", xf = lambda x, y : x, bins = list(range(4))),
+          coverage.CoverPoint("t16.c2", vname = "y", bins = list(range(4))),
+        )
+
+        @cross_first
+        def sample2(x, y):
+            pass
+
+        sample2(3, 3)
+        self.assertTrue(coverage.coverage_db["t16.cross"].new_hits == [(3, 3)])
+        self.assertTrue(coverage.coverage_db["t16.c1"].coverage == 2)
+        self.assertTrue(coverage.coverage_db["t16.c2"].coverage == 2)
+        self.assertTrue(coverage.coverage_db["t16.cross"].coverage == 2)
+        self.assertTrue(coverage.coverage_db["t16.check"].detailed_coverage["PASS"] == 1)
+
+    #test transformation shared in coverage section
+    def test_shared_transform(self):
+        print("Running test_shared_transform")
+
+        decoded = []
+        def decode(data, rw):
+            decoded.append(data)
+            return (data >> 4, data & 0xF)
+
+        shared = coverage.SharedTransform("decode", decode)
+
+        @coverage.coverageSection(
+          coverage.CoverPoint("t17.raw", xf = shared, bins = [(1, 2), (3, 4)]),
+          coverage.CoverPoint("t17.high", xf = lambda data, rw : shared(data, rw)[0], bins = list(range(16))),
+          coverage.CoverPoint("t17.low", xf = lambda data, rw : shared(data, rw)[1], bins = list(range(16))),
+          coverage.CoverCheck("t17.check", f_fail = lambda data, rw : shared(data, rw)[0] > 8),
+        )
+        def sample(data, rw):
+            pass
+
+        sample(0x12, True)
+        sample(0x34, False)
+        sample(0x34, False)
+        #transformation computed once per call
+        self.assertTrue(decoded == [0x12, 0x34, 0x34])
+        self.assertTrue(coverage.coverage_db["t17.raw"].coverage == 2)
+        self.assertTrue(coverage.coverage_db["t17.high"].coverage == 2)
+        self.assertTrue(coverage.coverage_db["t17.low"].coverage == 2)
+        sample(0x90, True)
+        self.assertTrue(coverage.coverage_db["t17.check"].coverage == 0)
+
+        #different arguments within one event and out of sampling
+        @coverage.CoverPoint("t17.next.high", 
+          xf = lambda data, rw : (shared(data, rw)[0], 
+                                  shared(data + 0x10, rw)[0]),
+          bins = [(1, 2)])
+        def sample_next(data, rw):
+            pass
+
+        sample_next(0x12, True)
+        self.assertTrue(coverage.coverage_db["t17.next.high"].coverage == 1)
+        self.assertTrue(shared(0x56, True) == (5, 6))
+        self.assertTrue(shared(0x78, True) == (7, 8))
+
+        #stacked decorators share the result
+        del decoded[:]
+        @coverage.CoverPoint("t17.stacked.high", 
+          xf = lambda data, rw : shared(data, rw)[0], bins = list(range(16)))
+        @coverage.CoverPoint("t17.stacked.low", 
+          xf = lambda data, rw : shared(data, rw)[1], bins = list(range(16)))
+        def sample_stacked(data, rw):
+            return data
+
+        self.assertTrue(sample_stacked(0xAB, False) == 0xAB)
+        self.assertTrue(decoded == [0xAB])
+        self.assertTrue(coverage.coverage_db["t17.stacked"].coverage == 2)
+
+        #other decorators between coverage decorators are kept
+        calls = []
+        def logged(f):
+            @functools.wraps(f)
+            def wrapper(*args):
+                calls.append(args)
+                return f(*args)
+            return wrapper
+
+        @coverage.CoverPoint("t17.logged.outer", vname = "data", bins = list(range(4)))
+        @logged
+        @coverage.CoverPoint("t17.logged.inner", vname = "data", bins = list(range(4)))
+        def sample_logged(data):
+            return data
+
+        self.assertTrue(sample_logged(1) == 1)
+        self.assertTrue(calls == [(1,)])
+        self.assertTrue(coverage.coverage_db["t17.logged.outer"].detailed_coverage[1] == 1)
+        self.assertTrue(coverage.coverage_db["t17.logged.inner"].detailed_coverage[1] == 1)
+
+    #test saturated coverage primitives sampling
+    def test_saturation(self):
+        print("Running test_saturation")
+
+        xf_calls = []
+        def xf(x, y):
+            xf_calls.append(x)
+            return x
+
+        @coverage.CoverPoint("t18.c1", xf = xf, bins = list(range(4)))
+        @coverage.CoverPoint("t18.c2", vname = "x", bins = list(range(2)))
+        @coverage.CoverPoint("t18.c3", vname = "y", bins = list(range(4)))
+        @coverage.CoverCross("t18.cross", items = ["t18.c2", "t18.c3"])
+        @coverage.CoverCheck("t18.check", f_fail = lambda x, y : x == 5)
+        def sample(x, y):
+            pass
+
+        coverage.coverage_db.saturation = "stop"
+        try:
+            for x in range(4):
+                sample(x, 0)
+            self.assertTrue(coverage.coverage_db["t18.c1"]._saturated)
+            #fully covered, but crossed with not covered cross
+            self.assertFalse(coverage.coverage_db["t18.c2"]._saturated)
+            sample(0, 1)
+            sample(5, 1) #check failed
+            self.assertTrue(coverage.coverage_db["t18.check"]._saturated)
+            #transformation not called for saturated point
+            self.assertTrue(xf_calls == [0, 1, 2, 3])
+            self.assertTrue(coverage.coverage_db["t18.c2"].detailed_coverage[0] == 2)
+            for y in range(4):
+                sample(0, y)
+            #cross of 2x4 not covered yet
+            self.assertFalse(coverage.coverage_db["t18.c2"]._saturated)
+            for y in range(4):
+                sample(1, y)
+            self.assertTrue(coverage.coverage_db["t18.cross"]._saturated)
+            self.assertTrue(coverage.coverage_db["t18.c2"]._saturated)
+            self.assertTrue(coverage.coverage_db["t18.c3"]._saturated)
+            hits = dict(coverage.coverage_db["t18.c3"].detailed_coverage)
+            passed = coverage.coverage_db["t18.check"].detailed_coverage["PASS"]
+            sample(0, 0)
+            self.assertTrue(hits == dict(coverage.coverage_db["t18.c3"].detailed_coverage))
+
+            #statistical sampling, one of 10 samples counted 10 times
+            coverage.coverage_db.saturation = "sample"
+            coverage.coverage_db.saturation_rate = 10
+            for _ in range(1000):
+                sample(1, 3)
+            self.assertTrue(coverage.coverage_db["t18.c3"].detailed_coverage[3] == hits[3] + 1000)
+            self.assertTrue(coverage.coverage_db["t18.check"].detailed_coverage["PASS"] == passed + 1000)
+
+            #cross created after its items got saturated
+            for mode in ["stop", "sample"]:
+                coverage.coverage_db.saturation = mode
+                x_name, y_name = "t18.%s.x" % mode, "t18.%s.y" % mode
+
+                @coverage.CoverPoint(x_name, vname = "x", bins = [0, 1])
+                @coverage.CoverPoint(y_name, vname = "y", bins = [0, 1])
+                def sample_points(x, y):
+                    pass
+
+                sample_points(0, 0)
+                sample_points(1, 1)
+                self.assertTrue(coverage.coverage_db[x_name]._saturated)
+
+                @coverage.CoverPoint(x_name, vname = "x", bins = [0, 1])
+                @coverage.CoverPoint(y_name, vname = "y", bins = [0, 1])
+                @coverage.CoverCross("t18.%s.cross" % mode, items = [x_name, y_name])
+                def sample_cross(x, y):
+                    pass
+
+                self.assertFalse(coverage.coverage_db[x_name]._saturated)
+                sample_cross(0, 1)
+                sample_cross(1, 0)
+                cross = coverage.coverage_db["t18.%s.cross" % mode]
+                self.assertTrue(cross.coverage == 2)
+                self.assertTrue(cross.detailed_coverage[(0, 1)] == 1)
+                self.assertTrue(cross.detailed_coverage[(1, 0)] == 1)
+        finally:
+            coverage.coverage_db.saturation = None
+            coverage.coverage_db.saturation_rate = 100
+
+        sample(0, 0)
+        self.assertTrue(xf_calls[-1] == 0)
+
+    #test iff guard functions
+    def test_guard(self):
+        print("Running test_guard")
+
+        calls = []
+        def xf(x, y):
+            calls.append(x)
+            return x
+
+        def enabled(x, y):
+            return y
+
+        @coverage.coverageSection(
+          coverage.CoverPoint("t19.x", xf=xf, bins=list(range(4)), iff=enabled),
+          coverage.CoverPoint("t19.y", vname="y", bins=[True, False]),
+          coverage.CoverCross("t19.cross", items=["t19.x", "t19.y"],
+            iff=lambda x, y: y),
+          coverage.CoverCheck("t19.check", f_fail=lambda x, y: x > 2,
+            f_pass=lambda x, y: x < 2, iff=enabled)
+        )
+        def sample(x, y):
+            pass
+
+        for x in range(4):
+            sample(x, False)
+
+        self.assertTrue(calls == [])
+        self.assertTrue(coverage.coverage_db["t19.x"].coverage == 0)
+        self.assertTrue(coverage.coverage_db["t19.y"].coverage == 1)
+        self.assertTrue(coverage.coverage_db["t19.cross"].coverage == 0)
+        self.assertTrue(coverage.coverage_db["t19.check"].detailed_coverage["FAIL"] == 0)
+
+        sample(1, True)
+        self.assertTrue(calls == [1])
+        self.assertTrue(coverage.coverage_db["t19.x"].coverage == 1)
+        self.assertTrue(coverage.coverage_db["t19.cross"].coverage == 1)
+        self.assertTrue(coverage.coverage_db["t19.check"].detailed_coverage["PASS"] == 1)
+        self.assertTrue(coverage.coverage_db["t19.x"].new_hits == [1])
+
+        sample(3, False)
+        self.assertTrue(coverage.coverage_db["t19.x"].new_hits == [])
+        self.assertTrue(coverage.coverage_db["t19.check"].detailed_coverage["FAIL"] == 0)
+
+    #test deferred sampling
+    def test_deferred(self):
+        print("Running test_deferred")
+
+        shift = coverage.SharedTransform("t20.shift", lambda x, y : x + 1)
+        for name in ["t20.inline", "t20.deferred"]:
+            @coverage.coverageSection(
+              coverage.CoverPoint(name + ".x", xf=shift, bins=list(range(8))),
+              coverage.CoverPoint(name + ".y", vname="y", bins=[0, 1]),
+              coverage.CoverCross(name + ".cross", items=[name + ".x", name + ".y"])
+            )
+            def sample(x, y):
+                return x
+
+            if name == "t20.deferred":
+                coverage.coverage_db.deferred_size = 4
+                coverage.coverage_db.deferred = True
+            buffers = [coverage.coverage_db._buffer, 
+                       coverage.coverage_db._spare_buffer]
+            try:
+                for x in range(3):
+                    self.assertTrue(sample(x, x % 2) == x)
+                # nothing sampled yet
+                self.assertTrue(coverage.coverage_db[name].coverage == 
+                    (8 if name == "t20.inline" else 0))
+                for x in range(3, 7):
+                    sample(x, x % 2)
+                # full buffer already flushed
+                self.assertTrue(coverage.coverage_db[name].coverage > 0)
+                coverage.coverage_db.flush()
+                # preallocated buffers are swapped
+                self.assertTrue(
+                  {id(coverage.coverage_db._buffer), 
+                   id(coverage.coverage_db._spare_buffer)} == 
+                  {id(buffer) for buffer in buffers})
+            finally:
+                coverage.coverage_db.deferred = False
+
+        inline = coverage.coverage_db["t20.inline"]
+        deferred = coverage.coverage_db["t20.deferred"]
+        self.assertTrue(deferred.coverage == inline.coverage == 16)
+        for item in ["x", "y", "cross"]:
+            self.assertTrue(
+              coverage.coverage_db["t20.deferred." + item].detailed_coverage ==
+              coverage.coverage_db["t20.inline." + item].detailed_coverage)
+
+        # a callback sampling while the buffer is flushed
+        @coverage.CoverPoint("t20.nested.x", vname="x", bins=list(range(8)))
+        def sample_nested(x):
+            pass
+
+        @coverage.CoverPoint("t20.outer.x", vname="x", bins=list(range(8)))
+        def sample_outer(x):
+            pass
+
+        for x in range(8):
+            coverage.coverage_db["t20.outer.x"].add_bins_callback(
+                lambda x=x : sample_nested(x), x)
+        coverage.coverage_db.deferred = True
+        try:
+            for x in range(8):
+                sample_outer(x)
+            coverage.coverage_db.flush()
+            self.assertTrue(coverage.coverage_db["t20.nested"].coverage == 8)
+            self.assertTrue(coverage.coverage_db["t20.outer"].coverage == 8)
+        finally:
+            coverage.coverage_db.deferred = False
+        coverage.coverage_db.deferred_size = 1024
+
+    #test sampling profiler
+    def test_profiling(self):
+        print("Running test_profiling")
+
+        xf = lambda x, y : x
+        @coverage.coverageSection(
+          coverage.CoverPoint("t21.eq", xf=xf, bins=list(range(10))),
+          coverage.CoverPoint("t21.rel", vname="y", bins=list(range(10)),
+            rel=lambda val, b : val == b),
+          coverage.CoverCross("t21.cross", items=["t21.eq", "t21.rel"]),
+          coverage.CoverCheck("t21.check", f_fail=lambda x, y : x > 10)
+        )
+        def sample(x, y):
+            pass
+
+        called = []
+        coverage.coverage_db["t21.eq"].add_bins_callback(
+            lambda : called.append(3), 3)
+
+        #user callback wrapping another function, added while profiling
+        def notify():
+            called.append(4)
+        @functools.wraps(notify)
+        def wrapped_notify():
+            called.append("wrapped")
+            notify()
+
+        coverage.coverage_db.profiling = True
+        try:
+            coverage.coverage_db["t21.eq"].add_bins_callback(wrapped_notify, 4)
+            for x in range(5):
+                sample(x, 9)
+        finally:
+            coverage.coverage_db.profiling = False
+
+        self.assertTrue(called == [3, "wrapped", 4])
+        self.assertTrue(coverage.coverage_db["t21.eq"]._bins_callbacks[4] is wrapped_notify)
+        eq = coverage.coverage_db["t21.eq"]._profile
+        rel = coverage.coverage_db["t21.rel"]._profile
+        self.assertTrue(eq.samples == rel.samples == 5)
+        self.assertTrue(eq.bins_per_sample == 1)  # hash lookup
+        self.assertTrue(rel.bins_per_sample == 10)  # linear scan
+        self.assertTrue(rel.rel_calls == 50)
+        self.assertTrue(coverage.coverage_db["t21.cross"]._profile.samples == 5)
+        self.assertTrue(coverage.coverage_db["t21.check"]._profile.rel_calls == 5)
+
+        # instrumentation removed
+        point = coverage.coverage_db["t21.eq"]
+        self.assertTrue("_sample" not in point.__dict__)
+        self.assertTrue(point._transformation is xf)
+        sample(5, 9)
+        self.assertTrue(eq.samples == 5)
+        self.assertTrue(point.coverage == 6)
+
+        lines = []
+        coverage.reportProfile(lines.append, top=2)
+        self.assertTrue(len(lines) == 3)
+
+    #test binary coverage database file
+    def test_coverage_file(self):
+        print("Running test_coverage_file")
+
+        @coverage.coverageSection(
+          coverage.CoverPoint("t22.x", vname="x", bins=list(range(10))),
+          coverage.CoverPoint("t22.y", vname="y", bins=["a", "b", (1, 2)]),
+          coverage.CoverPoint("t22.z", vname="x", bins=[(0, 4), (5, 9)],
+            ranges=True),
+          coverage.CoverCross("t22.cross", items=["t22.x", "t22.y"]),
+          coverage.CoverCheck("t22.check", f_fail=lambda x, y : x > 10)
+        )
+        def sample(x, y):
+            pass
+
+        for x in range(7):
+            sample(x, ["a", "b", (1, 2)][x % 3])
+
+        with tempfile.TemporaryDirectory() as tmp:
+            filename = os.path.join(tmp, "t22.cov")
+            coverage_file.save(filename)
+            for memory_map in [False, True]:
+                with coverage_file.load(filename, memory_map) as cov:
+                    for name in ["t22", "t22.x", "t22.y", "t22.z",
+                                 "t22.cross", "t22.check"]:
+                        item = coverage.coverage_db[name]
+                        self.assertTrue(cov[name].size == item.size)
+                        self.assertTrue(cov[name].coverage == item.coverage)
+                    for name in ["t22.x", "t22.y", "t22.z", "t22.check"]:
+                        self.assertTrue(cov[name].detailed_coverage == 
+                            coverage.coverage_db[name].detailed_coverage)
+                    cross = coverage.coverage_db["t22.cross"].detailed_coverage
+                    self.assertTrue(cov["t22.cross"].detailed_coverage == 
+                        {x_bins: hits for x_bins, hits in cross.items() if hits})
+                    self.assertTrue(len(cov["t22.cross"].index) == 7)
+
+    #test merging of coverage files
+    def test_coverage_merge(self):
+        print("Running test_coverage_merge")
+
+        @coverage.coverageSection(
+          coverage.CoverPoint("t23.x", vname="x", bins=list(range(10)), 
+            at_least=2),
+          coverage.CoverPoint("t23.y", vname="y", bins=list(range(3))),
+          coverage.CoverCross("t23.cross", items=["t23.x", "t23.y"]),
+          coverage.CoverCheck("t23.check", f_fail=lambda x, y : x > 10)
+        )
+        def sample(x, y):
+            pass
+
+        with tempfile.TemporaryDirectory() as tmp:
+            filenames = []
+            for run in range(3):
+                for x in range(run, run + 3):
+                    sample(x, x % 3)
+                filenames.append(os.path.join(tmp, "run%d.cov" % run))
+                coverage_file.save(filenames[-1])
+
+            expected = {}
+            for run, filename in enumerate(filenames):
+                with coverage_file.load(filename) as cov:
+                    for name in ["t23.x", "t23.y", "t23.cross", "t23.check"]:
+                        for bins, hits in cov[name].detailed_coverage.items():
+                            key = (name, bins)
+                            expected[key] = expected.get(key, 0) + hits
+
+            merged = coverage_merge.merge_files(filenames)
+            output = os.path.join(tmp, "merged.cov")
+            coverage_merge.merge(filenames, output, processes=2, fan_in=2)
+            with coverage_file.load(output) as cov:
+                for records in [merged, cov]:
+                    for name in ["t23.x", "t23.y", "t23.cross", "t23.check"]:
+                        for bins, hits in records[name].detailed_coverage.items():
+                            self.assertTrue(expected[(name, bins)] == hits)
+                    # x: 0..3 hit at least twice, y: all, cross: 5 cross-bins
+                    self.assertTrue(records["t23.x"].coverage == 4)
+                    self.assertTrue(records["t23.cross"].coverage == 5)
+                    self.assertTrue(records["t23.check"].coverage == 1)
+                    self.assertTrue(records["t23"].coverage == 4 + 3 + 5 + 1)
+                    self.assertTrue(records["t23"].size == 10 + 3 + 30 + 1)
+
+            # incompatible bins
+            record = merged["t23.y"]
+            record._bins_blob = coverage_file._encode_bins(["a", "b", "c"])
+            coverage_file.write(output, [record])
+            with self.assertRaises(Exception):
+                coverage_merge.merge_files([filenames[0], output])
+
+            # files with different items of the same cover group
+            partial = os.path.join(tmp, "partial.cov")
+            group = coverage_file.CoverageRecord("t23", "group", 1, 1, 10, 4)
+            coverage_file.write(partial, [group, merged["t23.x"]])
+            for files in [[partial, filenames[0]], [filenames[0], partial]]:
+                records = coverage_merge.merge_files(files)
+                self.assertTrue(records["t23"].size == 10 + 3 + 30 + 1)
+                self.assertTrue(records["t23.x"].detailed_coverage[0] == 
+                                merged["t23.x"].detailed_coverage[0] + 1)
+            coverage_merge.merge([partial, filenames[0]], output)
+            with coverage_file.load(output) as cov:
+                self.assertTrue(cov["t23"].size == 10 + 3 + 30 + 1)
+
+    #test ranking of coverage files
+    def test_coverage_rank(self):
+        print("Running test_coverage_rank")
+
+        @coverage.coverageSection(
+          coverage.CoverPoint("t24.x", vname="x", bins=list(range(8))),
+          coverage.CoverPoint("t24.y", vname="y", bins=list(range(2)), 
+            weight=3),
+          coverage.CoverCross("t24.cross", items=["t24.x", "t24.y"])
+        )
+        def sample(x, y):
+            pass
+
+        with tempfile.TemporaryDirectory() as tmp:
+            filenames = []
+            for xs in [[0, 1], [2, 3, 4, 5], [0, 2], [6, 7], [1, 3]]:
+                for cp in ["t24.x", "t24.y"]:
+                    hits = coverage.coverage_db[cp]._hits
+                    for ii in range(len(hits)):
+                        hits[ii] = 0
+                coverage.coverage_db["t24.cross"]._hits.clear()
+                for x in xs:
+                    sample(x, x % 2)
+                filenames.append(os.path.join(tmp, "run%d.cov" % len(filenames)))
+                coverage_file.write(filenames[-1], [
+                  coverage_file._record(coverage.coverage_db[name]) for name in
+                  ["t24", "t24.x", "t24.y", "t24.cross"]])
+
+            selected, size = coverage_rank.rank(filenames)
+            self.assertTrue(size == 8 + 6 + 16)
+            # 4 x bins, 2 y bins (weight 3), 4 cross-bins
+            self.assertTrue(selected[0] == (filenames[1], 4 + 6 + 4))
+            self.assertTrue(set(name for name, _ in selected) == 
+                            set(filenames[ii] for ii in [1, 3, 0]))
+            self.assertTrue(sum(gain for _, gain in selected) == 8 + 6 + 8)
+
+            # bitsets rebuilt from files give the same result
+            self.assertTrue(
+                coverage_rank.rank(filenames, memory_limit=0)[0] == selected)
+
+            # only covered cross-bins take bitset positions
+            layout = coverage_rank._BinsLayout()
+            coverage_rank._run_bitsets(filenames[1], layout)
+            self.assertTrue(layout.sizes == {1: 8 + 4, 3: 2})
+
+            # cross records before records of the items
+            reordered = os.path.join(tmp, "reordered.cov")
+            with coverage_file.load(filenames[1]) as cov:
+                coverage_file.write(reordered, [cov[name] for name in
+                  ["t24.cross", "t24", "t24.y", "t24.x"]])
+            self.assertTrue(coverage_rank.rank([reordered])[0] == 
+                            [(reordered, 4 + 6 + 4)])
+
+    #test live coverage streaming
+    def test_coverage_stream(self):
+        print("Running test_coverage_stream")
+
+        @coverage.coverageSection(
+          coverage.CoverPoint("t25.x", vname="x", bins=list(range(8))),
+          coverage.CoverPoint("t25.y", vname="y", bins=list(range(2))),
+          coverage.CoverCross("t25.cross", items=["t25.x", "t25.y"]),
+          coverage.CoverCheck("t25.check", f_fail=lambda x, y : x > 10)
+        )
+        def sample(x, y):
+            pass
+
+        with tempfile.TemporaryDirectory() as tmp:
+            address = os.path.join(tmp, "t25.sock")
+            # collector not running yet, changes are kept
+            streamer1 = coverage_stream.CoverageStreamer(address, run="run1",
+                                                         samples=2)
+            sample(0, 0)
+            streamer1.push()
+            collector = coverage_stream.CoverageCollector(address)
+            try:
+                streamer2 = coverage_stream.CoverageStreamer(address, run="run2")
+                sample(1, 1)
+                streamer1.poll()  # not due yet
+                sample(2, 0)
+                streamer1.poll()
+                streamer2.close()
+                for _ in range(10):
+                    collector.poll(timeout=0.01)
+
+                self.assertTrue(set(collector.runs) == {"run1", "run2"})
+                self.assertTrue(collector.finished == {"run2"})
+                records = collector.records()
+                # x = 0 hit once per run, the other x twice in total
+                self.assertTrue(list(records["t25.x"].hits[:4]) == [2, 2, 2, 0])
+                self.assertTrue(records["t25.cross"].detailed_coverage == 
+                                {(0, 0): 2, (1, 1): 2, (2, 0): 2})
+                self.assertTrue(records["t25.check"].hits[0] == 6)
+                self.assertTrue(records["t25"].coverage == 3 + 2 + 3 + 1)
+
+                # only changes are sent
+                changes = streamer1._tracker.changes()
+                self.assertTrue(changes == {})
+                sample(3, 1)
+                self.assertTrue(set(streamer1._tracker.changes()) == 
+                                {"t25.x", "t25.y", "t25.cross", "t25.check"})
+                streamer1.close()
+
+                # samples deferred until the push are sent
+                streamer3 = coverage_stream.CoverageStreamer(address, run="run5")
+                coverage.coverage_db.deferred = True
+                try:
+                    sample(4, 0)
+                    streamer3.push()
+                    for _ in range(10):
+                        collector.poll(timeout=0.01)
+                    self.assertTrue(collector.runs["run5"]["t25.x"][4] == 1)
+                finally:
+                    coverage.coverage_db.deferred = False
+                    streamer3.close()
+
+                # a run with different members of the cover group is 
+                # collected, a run with different bins is dropped
+                schema = coverage_file._schema(
+                    coverage.coverage_db["t25.y"])
+                group = dict(coverage_file._schema(coverage.coverage_db["t25"]),
+                             size=2)
+                feeds = []
+                for run, bins in [("run3", schema["bins"]), 
+                                  ("run4", ["5", "6"])]:
+                    feed = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                    feed.connect(address)
+                    feed.sendall(coverage_stream._message(
+                        type="hello", run=run, 
+                        items=[group, dict(schema, bins=bins)]))
+                    feeds.append(feed)
+                for _ in range(10):
+                    collector.poll(timeout=0.01)
+                self.assertTrue("run3" in collector.runs)
+                self.assertTrue("run4" not in collector.runs)
+                self.assertTrue(len(collector._buffers) == 1)
+                for feed in feeds:
+                    feed.close()
+            finally:
+                collector.close()
+            self.assertTrue(coverage.coverage_db._trackers == [])
+            self.assertTrue(coverage.coverage_db["t25.x"]._changed_bins is None)
+
+    #test checkpoint log
+    def test_coverage_checkpoint(self):
+        print("Running test_coverage_checkpoint")
+
+        @coverage.coverageSection(
+          coverage.CoverPoint("t26.x", vname="x", bins=list(range(1000))),
+          coverage.CoverPoint("t26.y", vname="y", bins=list(range(2))),
+          coverage.CoverCross("t26.cross", items=["t26.x", "t26.y"])
+        )
+        def sample(x, y):
+            pass
+
+        with tempfile.TemporaryDirectory() as tmp:
+            filename = os.path.join(tmp, "t26.log")
+            log = coverage_checkpoint.CoverageCheckpoint(filename, 
+                                                         samples=3, sync=False)
+            for x in range(5):
+                sample(x, x % 2)
+                log.poll()
+            size = os.path.getsize(filename)
+            sample(7, 1)
+            log.checkpoint()
+            # only the changed bins are written
+            self.assertTrue(os.path.getsize(filename) - size < 1000)
+
+            records = coverage_checkpoint.load(filename)
+            for name in ["t26.x", "t26.y", "t26.cross"]:
+                item = coverage.coverage_db[name]
+                self.assertTrue(records[name].coverage == item.coverage)
+                self.assertTrue(records[name].size == item.size)
+            self.assertTrue(list(records["t26.x"].hits[:8]) == 
+                            [1, 1, 1, 1, 1, 0, 0, 1])
+            self.assertTrue(records["t26.cross"].detailed_coverage[(7, 1)] == 1)
+
+            # items created after the log are described in the next checkpoint
+            @coverage.CoverPoint("t26.z", vname="z", bins=list(range(4)))
+            def sample_new(z):
+                pass
+
+            sample_new(2)
+            log.checkpoint()
+            log.checkpoint()
+            records = coverage_checkpoint.load(filename)
+            self.assertTrue(records["t26.z"].detailed_coverage[2] == 1)
+            self.assertTrue(records["t26.z"].size == 4)
+
+            # last checkpoint interrupted
+            sample(8, 0)
+            log.close()
+            with open(filename, "r+b") as f:
+                f.truncate(os.path.getsize(filename) - 3)
+            records = coverage_checkpoint.load(filename)
+            self.assertTrue(records["t26.x"].hits[7] == 1)
+            self.assertTrue(records["t26.x"].hits[8] == 0)
+            self.assertTrue(records["t26.x"].coverage == 6)
+
+    #test background reports
+    def test_coverage_report(self):
+        print("Running test_coverage_report")
+
+        @coverage.coverageSection(
+          coverage.CoverPoint("t27.x", vname="x", bins=list(range(4))),
+          coverage.CoverPoint("t27.y", vname="y", bins=["a", "b"]),
+          coverage.CoverCross("t27.cross", items=["t27.x", "t27.y"],
+            ign_bins=[(3, None)]),
+          coverage.CoverCheck("t27.check", f_fail=lambda x, y : x > 10)
+        )
+        def sample(x, y):
+            pass
+
+        sample(0, "a")
+        sample(1, "b")
+        done = []
+        with tempfile.TemporaryDirectory() as tmp:
+            futures = [coverage_report.write_report(
+                         os.path.join(tmp, "t27." + fmt), format=fmt, bins=True,
+                         callback=done.append)
+                       for fmt in ["json", "xml", "text"]]
+            # not in the report
+            sample(2, "a")
+            for future in futures:
+                future.result()
+            self.assertTrue(done == futures)
+
+            with open(futures[0].result()) as f:
+                report = json.load(f)
+            self.assertTrue(report["t27.x"]["coverage"] == 2)
+            self.assertTrue(report["t27.x"]["bins"] == 
+                            [["0", 1], ["1", 1], ["2", 0], ["3", 0]])
+            self.assertTrue(len(report["t27.cross"]["bins"]) == 6)
+            self.assertTrue(report["t27.cross"]["bins"][0] == ["(0, 'a')", 1])
+            self.assertTrue(report["t27"]["coverage"] == 2 + 2 + 2 + 1)
+
+            root = ElementTree.parse(futures[1].result()).getroot()
+            items = {item.get("name"): item for item in root}
+            self.assertTrue(items["t27.check"].find("bin").get("hits") == "2")
+            self.assertTrue(len(items["t27.cross"]) == 6)
+
+            with open(futures[2].result()) as f:
+                lines = f.read().splitlines()
+            self.assertTrue(
+                any(line.endswith("BIN (1, 'b') : 1") for line in lines))
+
+            # large crosses list only the hit cross-bins
+            max_listed = coverage_report._MAX_LISTED_BINS
+            coverage_report._MAX_LISTED_BINS = 4
+            try:
+                filename = coverage_report.write_report(
+                  os.path.join(tmp, "t27.large.json"), format="json", 
+                  bins=True).result()
+                out = io.StringIO()
+                coverage_export.export(out, format="xml", prefix="t27.cross",
+                                       uncovered_only=True)
+            finally:
+                coverage_report._MAX_LISTED_BINS = max_listed
+            with open(filename) as f:
+                report = json.load(f)
+            self.assertTrue(report["t27.cross"]["bins"] == 
+              [["(0, 'a')", 1], ["(1, 'b')", 1], ["(2, 'a')", 1]])
+            self.assertTrue(report["t27.cross"]["unlisted"] == 3)
+            cross = ElementTree.fromstring(out.getvalue()).find("cross")
+            self.assertTrue(len(cross) == 0 and cross.get("unlisted") == "3")
+
+    #test streaming export
+    def test_coverage_export(self):
+        print("Running test_coverage_export")
+
+        @coverage.coverageSection(
+          coverage.CoverPoint("t28.a.x", vname="x", bins=list(range(4))),
+          coverage.CoverPoint("t28.a.y", vname="y", bins=["a", "b"]),
+          coverage.CoverCross("t28.a.cross", items=["t28.a.x", "t28.a.y"],
+            ign_bins=[(3, None)]),
+          coverage.CoverCheck("t28.b.check", f_fail=lambda x, y : x > 10)
+        )
+        def sample(x, y):
+            pass
+
+        sample(0, "a")
+        sample(0, "a")
+        sample(1, "b")
+
+        out = io.StringIO()
+        coverage_export.export(out, prefix="t28")
+        report = json.loads(out.getvalue())
+        self.assertTrue(len(report) == 1 and report[0]["name"] == "t28")
+        group_a = report[0]["children"][0]
+        self.assertTrue([child["name"] for child in group_a["children"]] == 
+                        ["t28.a.cross", "t28.a.x", "t28.a.y"])
+        self.assertTrue(group_a["children"][0]["bins"][0] == ["(0, 'a')", 2])
+        self.assertTrue(len(group_a["children"][0]["bins"]) == 6)
+
+        out = io.StringIO()
+        coverage_export.export(out, format="xml", prefix="t28.a", 
+                               uncovered_only=True)
+        root = ElementTree.fromstring(out.getvalue())
+        x = root.find("group/point[@name='t28.a.x']")
+        self.assertTrue([b.get("value") for b in x] == ["2", "3"])
+        cross = root.find("group/cross")
+        self.assertTrue(len(cross) == 4)
+
+        out = io.StringIO()
+        coverage_export.export(out, format="ucis-like", prefix="t28", min_hits=2)
+        root = ElementTree.fromstring(out.getvalue())
+        points = root.findall(".//coverpoint")
+        self.assertTrue([p.get("name") for p in points] == ["x", "y", "check"])
+        self.assertTrue([b.get("name") for b in points[0]
+                         .findall("coverpointBin")] == ["0"])
+        cross_bins = root.findall(".//crossBin")
+        self.assertTrue(len(cross_bins) == 1)
+        self.assertTrue([i.text for i in cross_bins[0].findall("index")] == 
+                        ["0", "'a'"])
+        self.assertTrue(points[2].find("coverpointBin/contents")
+                        .get("coverageCount") == "3")
+
+        # export saved coverage
+        with tempfile.TemporaryDirectory() as tmp:
+            filename = os.path.join(tmp, "t28.cov")
+            coverage_file.save(filename)
+            with coverage_file.load(filename) as cov:
+                saved = io.StringIO()
+                coverage_export.export(saved, source=cov, prefix="t28.a.x")
+        self.assertTrue(json.loads(saved.getvalue())[0]["bins"] == 
+                        [["0", 2], ["1", 1], ["2", 0], ["3", 0]])
+
+    #test prefix tree queries of the coverage database
+    def test_prefix_tree(self):
+        print("Running test_prefix_tree")
+
+        @coverage.coverageSection(
+          coverage.CoverPoint("t29.top.dsp.b", vname="x", bins=[1, 2]),
+          coverage.CoverPoint("t29.top.dma.x", vname="x", bins=[1, 2]),
+          coverage.CoverPoint("t29.top.DMA2.x", vname="x", bins=[1, 2, 3]),
+          coverage.CoverPoint("t29.top.dma.A", vname="x", bins=[1, 2]),
+          coverage.CoverPoint("t29.top.uart.x", vname="x", bins=[1, 2])
+        )
+        def sample(x):
+            pass
+
+        sample(1)
+        sample(2)
+
+        names = [name for name, _ in coverage.coverage_db.walk("t29")]
+        self.assertTrue(names == ["t29", "t29.top", "t29.top.dma", 
+          "t29.top.dma.A", "t29.top.dma.x", "t29.top.DMA2", "t29.top.DMA2.x",
+          "t29.top.dsp", "t29.top.dsp.b", "t29.top.uart", "t29.top.uart.x"])
+        self.assertTrue([item._name for item in 
+                         coverage.coverage_db.find("t29.top.d")] == 
+                        ["t29.top.dma", "t29.top.dsp"])
+        self.assertTrue([name for name, _ in 
+                         coverage.coverage_db.walk("t29.top.u")] == 
+                        ["t29.top.uart", "t29.top.uart.x"])
+        self.assertTrue(coverage.coverage_db.find("t29.none.x") == [])
+        self.assertTrue(coverage.coverage_db.subtree_coverage("t29.top.d") 
+                        == (6, 6))
+        self.assertTrue(coverage.coverage_db.subtree_coverage("t29.top.DMA") 
+                        == (2, 3))
+        self.assertTrue(coverage.coverage_db.subtree_coverage("t29") == 
+                        (10, 11))
+        self.assertTrue(coverage.coverage_db["t29"] in 
+                        coverage.coverage_db.find(None))
+        # walking the whole database gives every item once
+        self.assertTrue(sorted(name for name, _ in 
+                               coverage.coverage_db.walk()) == 
+                        sorted(coverage.coverage_db))
+
+    #test uncovered bins sets
+    def test_holes(self):
+        print("Running test_holes")
+
+        @coverage.coverageSection(
+          coverage.CoverPoint("t30.x", vname="x", bins=list(range(4)), 
+            at_least=2),
+          coverage.CoverPoint("t30.y", vname="y", bins=["a", "b", "c"]),
+          coverage.CoverCross("t30.cross", items=["t30.x", "t30.y"],
+            ign_bins=[(3, None)], at_least=2)
+        )
+        def sample(x, y):
+            pass
+
+        x_holes = coverage.coverage_db["t30.x"].holes
+        cross_holes = coverage.coverage_db["t30.cross"].holes
+        self.assertTrue(len(x_holes) == 4)
+        self.assertTrue(len(cross_holes) == 9)
+
+        sample(0, "a")
+        sample(1, "b")
+        self.assertTrue(len(x_holes) == 4)  # at_least not reached yet
+        sample(0, "a")
+        self.assertTrue(sorted(x_holes) == [1, 2, 3])
+        self.assertTrue(len(cross_holes) == 8)
+        self.assertTrue((0, "a") not in list(cross_holes))
+        self.assertTrue(list(coverage.coverage_db["t30.y"].holes) == ["c"])
+
+        # holes of the cross exclude ignored cross-bins
+        self.assertTrue(all(x_bin[0] != 3 for x_bin in cross_holes))
+
+        # generator targeting holes
+        rng = random.Random(30)
+        while len(x_holes) > 0:
+            x = x_holes.random(rng)
+            self.assertTrue(coverage.coverage_db["t30.x"]
+                            .detailed_coverage[x] < 2)
+            sample(x, "c")
+        self.assertTrue(coverage.coverage_db["t30.x"].coverage == 4)
+        self.assertTrue(list(x_holes) == [])
+        self.assertRaises(IndexError, x_holes.random)
+
+        # same results if holes are built for a large cross
+        holes_limit = coverage._DENSE_HOLES_LIMIT
+        coverage._DENSE_HOLES_LIMIT = 0
+        try:
+            cross = coverage.coverage_db["t30.cross"]
+            cross._holes = None
+            sparse = cross.holes
+            self.assertTrue(len(sparse) == len(cross_holes))
+            self.assertTrue(sorted(sparse) == sorted(cross_holes))
+            sample(2, "a")
+            sample(2, "a")
+            self.assertTrue((2, "a") not in list(sparse))
+            self.assertTrue(len(sparse) == len(cross_holes) - 1)
+            for _ in range(20):
+                self.assertTrue(sparse.random(rng) in list(sparse))
+            # scan when no uncovered cross-bin is drawn
+            sparse._attempts = 0
+            for _ in range(20):
+                self.assertTrue(sparse.random(rng) in list(sparse))
+        finally:
+            coverage._DENSE_HOLES_LIMIT = holes_limit
+
+    #test dict methods keeping the prefix tree up to date
+    def test_prefix_tree_dict(self):
+        print("Running test_prefix_tree_dict")
+
+        @coverage.CoverPoint("t31.a.x", vname="x", bins=[1, 2])
+        @coverage.CoverPoint("t31.b.x", vname="x", bins=[1, 2])
+        def sample(x):
+            pass
+
+        sample(1)
+        db = coverage.coverage_db
+        saved = dict(db)
+        try:
+            db.clear()
+            self.assertTrue(list(db.walk()) == [])
+            coverage.reportCoverage(lambda line : None)
+
+            @coverage.CoverPoint("t31.a.x", vname="x", bins=[1, 2, 3])
+            def sample_again(x):
+                pass
+
+            sample_again(3)
+            self.assertTrue([name for name, _ in db.walk()] == 
+                            ["t31", "t31.a", "t31.a.x"])
+            self.assertTrue(db.subtree_coverage("t31") == (1, 3))
+
+            popped = db.pop("t31.a.x")
+            self.assertTrue(popped._name == "t31.a.x")
+            self.assertTrue(db.pop("t31.a.x", None) is None)
+            self.assertTrue([name for name, _ in db.walk()] == 
+                            ["t31", "t31.a"])
+            self.assertTrue(db.setdefault("t31.a.x", popped) is popped)
+            self.assertTrue([name for name, _ in db.walk("t31.a")] == 
+                            ["t31.a", "t31.a.x"])
+            coverage.CoverItem("t31.b.y")
+            item = db.pop("t31.b.y")
+            self.assertTrue("t31.b.y" not in db)
+            db |= {"t31.b.y": item}
+            self.assertTrue([name for name, _ in db.walk("t31.b")] == 
+                            ["t31.b", "t31.b.y"])
+            with self.assertRaises(TypeError):
+                coverage.CoverageDB.fromkeys(["t31.c"])
+            #deleting a cover group deletes its members
+            del db["t31.a"]
+            self.assertTrue("t31.a.x" not in db)
+            self.assertTrue([name for name, _ in db.walk()] == 
+                            ["t31", "t31.b", "t31.b.y"])
+            while db:
+                db.popitem()
+            self.assertTrue(list(db.walk()) == [])
+        finally:
+            db.clear()
+            db.update(saved)
+        self.assertTrue([name for name, _ in db.walk("t31")] == 
+                        ["t31", "t31.a", "t31.a.x", "t31.b", "t31.b.x"])
+        self.assertTrue(sorted(name for name, _ in db.walk()) == sorted(db))
+        self.assertTrue(db.subtree_coverage("t31") == (2, 4))
+
+    #test exporting the database snapshots each item once per walk step
+    def test_export_snapshots(self):
+        print("Running test_export_snapshots")
+
+        @coverage.CoverPoint("t32.a.x", vname="x", bins=list(range(4)))
+        @coverage.CoverPoint("t32.a.y", vname="x", bins=list(range(4)))
+        @coverage.CoverCross("t32.a.c", items=["t32.a.x", "t32.a.y"])
+        def sample(x):
+            pass
+
+        sample(1)
+        snapshots = []
+        snapshot_record = coverage_export._snapshot_record
+        def counting_snapshot(item):
+            snapshots.append(item._name)
+            return snapshot_record(item)
+        coverage_export._snapshot_record = counting_snapshot
+        try:
+            for format in coverage_export.FORMATS:
+                del snapshots[:]
+                coverage_export.export(io.StringIO(), format=format,
+                                       prefix="t32")
+                # points are snapshotted again for the cross bins
+                self.assertTrue(sorted(snapshots) == 
+                                ["t32", "t32.a", "t32.a.c", "t32.a.x", 
+                                 "t32.a.x", "t32.a.y", "t32.a.y"])
+        finally:
+            coverage_export._snapshot_record = snapshot_record
+
+    #test ranking of cover checks failed in some of the runs
+    def test_coverage_rank_checks(self):
+        print("Running test_coverage_rank_checks")
+
+        @coverage.coverageSection(
+          coverage.CoverPoint("t33.x", vname="x", bins=list(range(8))),
+          coverage.CoverCheck("t33.check", f_fail=lambda x : x > 5, 
+            f_pass=lambda x : x > 0, at_least=0)
+        )
+        def sample(x):
+            pass
+
+        with tempfile.TemporaryDirectory() as tmp:
+            filenames = []
+            for xs in [[1, 2], [6], [3]]:
+                hits = coverage.coverage_db["t33.x"]._hits
+                for ii in range(len(hits)):
+                    hits[ii] = 0
+                coverage.coverage_db["t33.check"]._hits.update(PASS=0, FAIL=0)
+                for x in xs:
+                    sample(x)
+                filenames.append(os.path.join(tmp, "run%d.cov" % len(filenames)))
+                coverage_file.write(filenames[-1], [
+                  coverage_file._record(coverage.coverage_db[name]) for name in
+                  ["t33", "t33.x", "t33.check"]])
+
+            # the check passed in the first run fails in the second one
+            selected, size = coverage_rank.rank(filenames)
+            self.assertTrue(size == 8 + 1)
+            self.assertTrue(selected[0] == (filenames[0], 2))
+            self.assertTrue(sum(gain for _, gain in selected) == 4)
+            self.assertTrue(
+                coverage_rank.rank(filenames, memory_limit=0)[0] == selected)
+
+            # the same coverage as merged
+            output = os.path.join(tmp, "merged.cov")
+            coverage_merge.merge(filenames, output)
+            with coverage_file.load(output) as cov:
+                self.assertTrue(cov["t33"].coverage == 4)
+                self.assertTrue(cov["t33.check"].coverage == 0)
+
+            self.assertTrue(coverage_rank.rank([filenames[0], filenames[2]])[0]
+                            == [(filenames[0], 3), (filenames[2], 1)])
+
         
 if __name__ == '__main__':
     import sys